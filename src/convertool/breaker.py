@@ -0,0 +1,77 @@
+from collections import Counter
+
+from acacore.utils.helpers import ExceptionManager
+
+from .convert import ConvertFailure
+from .convert import ConvertInstructions
+
+
+def breaker_keys(instructions: ConvertInstructions) -> list[str]:
+    """
+    Get the names the failures of a conversion are counted under.
+
+    :param instructions: The instructions of the conversion.
+    :return: The dependencies of the converter, or the name of the converter if it has none.
+    """
+    return list(instructions.converter_cls.dependencies or {}) or [instructions.converter_cls.__name__]
+
+
+class CircuitBreaker:
+    """
+    Stop using dependencies that keep failing.
+
+    Failures are counted for each dependency of the converters (or for the converter itself if it has no
+    dependencies). When a dependency fails ``threshold`` times in a row with the same error, the breaker opens and no
+    further conversions using that dependency are allowed for the rest of the run. A successful conversion resets the
+    count of its dependencies.
+    """
+
+    def __init__(self, threshold: int) -> None:
+        self.threshold: int = threshold
+        self.failures: dict[str, tuple[str, int]] = {}
+        self.opened: dict[str, str] = {}
+        self.skipped: Counter[str] = Counter()
+
+    def allow(self, instructions: ConvertInstructions) -> bool:
+        """
+        Check whether a conversion can be started, and count it as skipped if it cannot.
+
+        :param instructions: The instructions of the conversion.
+        :return: ``True`` if none of the dependencies of the converter is open, ``False`` otherwise.
+        """
+        if opened := [k for k in breaker_keys(instructions) if k in self.opened]:
+            self.skipped.update(opened)
+            return False
+        return True
+
+    def record(
+        self,
+        instructions: ConvertInstructions,
+        error: ExceptionManager | ConvertFailure | None,
+    ) -> list[str]:
+        """
+        Record the outcome of a conversion.
+
+        :param instructions: The instructions of the conversion.
+        :param error: The error of the conversion, if any.
+        :return: The dependencies whose breaker was opened by this failure.
+        """
+        keys: list[str] = breaker_keys(instructions)
+
+        if error is None or error.exception is None:
+            for key in keys:
+                self.failures.pop(key, None)
+            return []
+
+        error_name: str = error.exception.__class__.__name__
+        opened: list[str] = []
+
+        for key in keys:
+            last_error, count = self.failures.get(key, (error_name, 0))
+            count = count + 1 if last_error == error_name else 1
+            self.failures[key] = (error_name, count)
+            if count >= self.threshold and key not in self.opened:
+                self.opened[key] = error_name
+                opened.append(key)
+
+        return opened
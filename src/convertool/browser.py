@@ -0,0 +1,321 @@
+from base64 import b64decode
+from contextlib import suppress
+from json import dumps
+from json import loads
+from multiprocessing.util import Finalize
+from os import close
+from os import environ
+from os import getpid
+from os import pipe
+from os import read
+from os import write
+from pathlib import Path
+from select import select
+from shutil import rmtree
+from subprocess import DEVNULL
+from subprocess import Popen
+from subprocess import TimeoutExpired
+from sys import platform
+from tempfile import mkdtemp
+from threading import Lock
+from time import monotonic
+from typing import Any
+from typing import BinaryIO
+
+from .util import _kill_process_group
+
+BROWSER_SERVER_ENV: str = "CONVERTOOL_BROWSER_SERVER"
+_servers: dict[tuple[int, str], "BrowserServer"] = {}
+
+
+class BrowserServerError(Exception): ...
+
+
+class BrowserServer:
+    """
+    A long-running headless chromium instance that prints pages to PDF over the DevTools protocol.
+
+    The instance is started on the first conversion and driven through the pipe opened with
+    ``--remote-debugging-pipe``. Each page is loaded in a new tab of a new browser context, so that pages do not share
+    cookies, storage, or cache, and the context is disposed after the page is printed.
+
+    The instance is checked before each conversion and restarted if it exited or does not respond. It is also
+    restarted after ``max_jobs`` conversions, and when a conversion times out.
+    """
+
+    def __init__(self, command: str, max_jobs: int, startup_timeout: float = 30.0) -> None:
+        self.command: str = command
+        self.max_jobs: int = max_jobs
+        self.startup_timeout: float = startup_timeout
+        self.jobs: int = 0
+        self.profile_dir: Path = Path(mkdtemp(prefix="convertool-browser-"))
+        self.process: Popen | None = None
+        self._reader: int | None = None
+        self._writer: int | None = None
+        self._buffer: bytes = b""
+        self._events: list[dict[str, Any]] = []
+        self._message_id: int = 0
+        self._lock: Lock = Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """
+        Start the instance and wait until it responds.
+
+        :raise BrowserServerError: If the instance exits or does not respond before ``startup_timeout``.
+        """
+        # Chromium reads commands from file descriptor 3 and writes responses to file descriptor 4
+        browser_reader, self._writer = pipe()
+        self._reader, browser_writer = pipe()
+        self._buffer = b""
+        self._events.clear()
+
+        try:
+            self.process = Popen(
+                [
+                    "/bin/sh",
+                    "-c",
+                    f'exec "$0" "$@" 3<&{browser_reader} 4>&{browser_writer}',
+                    self.command,
+                    "--headless",
+                    "--no-sandbox",
+                    "--no-first-run",
+                    "--no-default-browser-check",
+                    f"--user-data-dir={self.profile_dir}",
+                    "--remote-debugging-pipe",
+                ],
+                pass_fds=(browser_reader, browser_writer),
+                stdin=DEVNULL,
+                stdout=DEVNULL,
+                stderr=DEVNULL,
+                start_new_session=True,
+            )
+        finally:
+            close(browser_reader)
+            close(browser_writer)
+
+        try:
+            self.call("Browser.getVersion", deadline=monotonic() + self.startup_timeout)
+        except (BrowserServerError, TimeoutExpired, OSError):
+            self.stop()
+            raise BrowserServerError(f"{self.command} could not be started")
+
+        self.jobs = 0
+
+    def stop(self):
+        """Stop the instance."""
+        if self.running:
+            with suppress(BrowserServerError, TimeoutExpired, OSError):
+                self.call("Browser.close", deadline=monotonic() + 5)
+                self.process.wait(5)
+        if self.process is not None and self.process.poll() is None:
+            _kill_process_group(self.process)
+            self.process.wait()
+        for fd in (self._reader, self._writer):
+            if fd is not None:
+                close(fd)
+        self.process = None
+        self._reader = None
+        self._writer = None
+
+    def close(self):
+        """Stop the instance and remove its profile."""
+        self.stop()
+        rmtree(self.profile_dir, ignore_errors=True)
+
+    def healthy(self) -> bool:
+        """
+        Check whether the instance is running and responds.
+
+        :return: ``True`` if the instance responded, ``False`` otherwise.
+        """
+        if not self.running:
+            return False
+        try:
+            self.call("Browser.getVersion", deadline=monotonic() + 5)
+            return True
+        except (BrowserServerError, TimeoutExpired, OSError):
+            return False
+
+    def _receive(self, deadline: float | None) -> dict[str, Any]:
+        while b"\0" not in self._buffer:
+            timeout: float | None = max(deadline - monotonic(), 0) if deadline is not None else None
+            if not select([self._reader], [], [], timeout)[0]:
+                raise TimeoutExpired(self.command, timeout)
+            if not (chunk := read(self._reader, 1024 * 1024)):
+                raise BrowserServerError(f"{self.command} closed the connection")
+            self._buffer += chunk
+        message, _, self._buffer = self._buffer.partition(b"\0")
+        return loads(message)
+
+    def call(
+        self,
+        method: str,
+        params: dict[str, Any] | None = None,
+        session_id: str | None = None,
+        deadline: float | None = None,
+    ) -> dict[str, Any]:
+        """
+        Send a command and wait for its result.
+
+        Events received in the meantime are kept for ``wait_event``.
+
+        :param method: The method of the command.
+        :param params: The parameters of the command.
+        :param session_id: The session of the target the command is sent to, or ``None`` for the browser.
+        :param deadline: The ``time.monotonic`` value after which the command times out.
+        :raise BrowserServerError: If the command fails or the connection is closed.
+        :raise TimeoutExpired: If the deadline passes.
+        :return: The result of the command.
+        """
+        self._message_id += 1
+        message: dict[str, Any] = {"id": self._message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+
+        data: bytes = dumps(message).encode("utf-8") + b"\0"
+        while data:
+            data = data[write(self._writer, data) :]
+
+        while True:
+            response = self._receive(deadline)
+            if response.get("id") == message["id"]:
+                if error := response.get("error"):
+                    raise BrowserServerError(error.get("message") or f"{method} failed")
+                return response.get("result", {})
+            if "method" in response:
+                self._events.append(response)
+
+    def wait_event(self, method: str, session_id: str, deadline: float | None = None) -> dict[str, Any]:
+        """
+        Wait for an event of a target.
+
+        :param method: The method of the event.
+        :param session_id: The session of the target.
+        :param deadline: The ``time.monotonic`` value after which waiting times out.
+        :raise BrowserServerError: If the connection is closed.
+        :raise TimeoutExpired: If the deadline passes.
+        :return: The parameters of the event.
+        """
+        while True:
+            events, self._events = self._events, []
+            for event in events:
+                if event["method"] == method and event.get("sessionId") == session_id:
+                    return event.get("params", {})
+            self._events.append(self._receive(deadline))
+
+    def print_to_pdf(self, src: Path, dest: BinaryIO, timeout: float | None = None):
+        """
+        Print a page to PDF.
+
+        :param src: The path to the page.
+        :param dest: The binary stream the PDF is written to.
+        :param timeout: The maximum number of seconds the conversion can take.
+        :raise BrowserServerError: If the conversion fails.
+        :raise TimeoutExpired: If the conversion times out.
+        """
+        with self._lock:
+            if self.running and self.jobs >= self.max_jobs:
+                self.stop()
+            if not self.healthy():
+                self.stop()
+                self.start()
+
+            self.jobs += 1
+            self._events.clear()
+            deadline: float | None = monotonic() + timeout if timeout else None
+
+            try:
+                context_id: str = self.call("Target.createBrowserContext", deadline=deadline)["browserContextId"]
+                try:
+                    self._print_to_pdf(context_id, src, dest, deadline)
+                finally:
+                    self.call("Target.disposeBrowserContext", {"browserContextId": context_id}, deadline=deadline)
+            except TimeoutExpired:
+                # The pending page cannot be interrupted, so the instance is replaced
+                self.stop()
+                raise TimeoutExpired(self.command, timeout)
+            except OSError as err:
+                self.stop()
+                raise BrowserServerError(repr(err))
+            except BrowserServerError:
+                if not self.running:
+                    self.stop()
+                raise
+
+    def _print_to_pdf(self, context_id: str, src: Path, dest: BinaryIO, deadline: float | None):
+        target_id: str = self.call(
+            "Target.createTarget",
+            {"url": "about:blank", "browserContextId": context_id},
+            deadline=deadline,
+        )["targetId"]
+        session_id: str = self.call(
+            "Target.attachToTarget",
+            {"targetId": target_id, "flatten": True},
+            deadline=deadline,
+        )["sessionId"]
+
+        self.call("Page.enable", session_id=session_id, deadline=deadline)
+        if error := self.call("Page.navigate", {"url": src.as_uri()}, session_id, deadline).get("errorText"):
+            raise BrowserServerError(error)
+        self.wait_event("Page.loadEventFired", session_id, deadline)
+
+        stream: str = self.call(
+            "Page.printToPDF",
+            {"displayHeaderFooter": False, "transferMode": "ReturnAsStream"},
+            session_id,
+            deadline,
+        )["stream"]
+
+        while True:
+            chunk: dict[str, Any] = self.call("IO.read", {"handle": stream, "size": 1024 * 1024}, session_id, deadline)
+            dest.write(b64decode(chunk["data"]) if chunk.get("base64Encoded") else chunk["data"].encode("utf-8"))
+            if chunk.get("eof"):
+                break
+
+        self.call("IO.close", {"handle": stream}, session_id, deadline)
+
+
+def _close_servers():
+    # Servers inherited from the parent process belong to it
+    for key in [k for k in _servers if k[0] == getpid()]:
+        _servers.pop(key).close()
+
+
+def browser_server_available() -> bool:
+    # Chromium is given the pipes through a shell
+    return platform != "win32"
+
+
+def enable_browser_server(max_jobs: int):
+    """
+    Enable the chromium servers in the current process and in the processes it starts.
+
+    :param max_jobs: The number of conversions after which a server is restarted. Use 0 to disable the servers.
+    """
+    environ[BROWSER_SERVER_ENV] = str(max_jobs)
+
+
+def browser_server(command: str) -> BrowserServer | None:
+    """
+    Get the chromium server of the current process.
+
+    Each process, and so each slot of the worker pool, has its own server for each chromium command. Servers are
+    closed when the process exits.
+
+    :param command: The chromium command.
+    :return: The server, or ``None`` if the servers are not enabled or not available on this platform.
+    """
+    if not browser_server_available() or not (max_jobs := int(environ.get(BROWSER_SERVER_ENV) or 0)):
+        return None
+
+    if (server := _servers.get((getpid(), command))) is None:
+        if not any(pid == getpid() for pid, _ in _servers):
+            # Worker processes exit without running atexit handlers, but they do run multiprocessing finalizers
+            Finalize(None, _close_servers, exitpriority=10)
+        server = _servers[(getpid(), command)] = BrowserServer(command, max_jobs)
+
+    return server
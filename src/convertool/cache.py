@@ -0,0 +1,339 @@
+from contextlib import suppress
+from functools import lru_cache
+from hashlib import sha256
+from json import dumps
+from json import loads
+from os import PathLike
+from pathlib import Path
+from shutil import rmtree
+from sqlite3 import connect
+from sqlite3 import Connection
+from threading import Lock
+from time import time
+from typing import Any
+from typing import NamedTuple
+from uuid import uuid4
+
+from .__version__ import __version__
+from .converters import ConverterABC
+from .converters.exceptions import MissingDependency
+from .util import link_or_copy
+
+_PRUNE_BATCH: int = 100
+
+
+class CacheStats(NamedTuple):
+    entries: int
+    files: int
+    size: int
+    hits: int
+
+
+@lru_cache
+def tool_version(converter_cls: type[ConverterABC]) -> str:
+    """
+    Get a fingerprint of the version of the tools used by a converter.
+
+    The fingerprint contains the version of convertool and the path, size, and modification time of the executables
+    of the converter's dependencies, so that it changes when any of them is upgraded.
+
+    :param converter_cls: The converter class.
+    :return: The fingerprint.
+    """
+    with suppress(MissingDependency):
+        converter_cls.test_dependencies()
+
+    parts: list[str] = [__version__, converter_cls.__name__]
+
+    for command in sorted(c for cs in (converter_cls.dependencies or {}).values() for c in cs):
+        try:
+            stat = Path(command).stat()
+            parts.append(f"{command}:{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append(command)
+
+    return "\n".join(parts)
+
+
+def tool_version_hash(converter_cls: type[ConverterABC]) -> str:
+    """
+    Get a short hash of the fingerprint returned by ``tool_version``.
+
+    :param converter_cls: The converter class.
+    :return: The hash.
+    """
+    return sha256(tool_version(converter_cls).encode("utf-8")).hexdigest()[:16]
+
+
+def output_names(
+    converter: ConverterABC,
+    output_dir: Path,
+    output: str,
+    output_paths: list[Path],
+) -> list[tuple[bool, str]] | None:
+    """
+    Get the names of the outputs of a conversion independently of the name of the source file.
+
+    The names are relative to the output directory of the conversion. Names that start with the stem of the output
+    file the converter derives from the source file are marked as prefixed, and the stem is removed from them.
+
+    :param converter: The converter instance used for the conversion.
+    :param output_dir: The output directory of the conversion.
+    :param output: The output of the conversion.
+    :param output_paths: The paths of the outputs.
+    :return: A list of tuples with the prefixed flag and the name of each output, or ``None`` if some of the outputs
+        are not inside the output directory of the conversion.
+    """
+    dest_dir: Path = converter.output_dir(output_dir)
+    stem: str = converter.output_file(dest_dir, output).stem
+
+    if not all(p.is_relative_to(dest_dir) for p in output_paths):
+        return None
+
+    return [
+        (True, name.removeprefix(stem)) if name.startswith(stem) else (False, name)
+        for name in (p.relative_to(dest_dir).as_posix() for p in output_paths)
+    ]
+
+
+def resolve_output_names(
+    converter: ConverterABC,
+    output_dir: Path,
+    output: str,
+    names: list[tuple[bool, str]],
+) -> list[Path]:
+    """
+    Get the paths of the outputs of a conversion from the names returned by ``output_names``.
+
+    :param converter: The converter instance used for the conversion.
+    :param output_dir: The output directory of the conversion.
+    :param output: The output of the conversion.
+    :param names: The names of the outputs.
+    :return: The paths of the outputs.
+    """
+    dest_dir: Path = converter.output_dir(output_dir)
+    stem: str = converter.output_file(dest_dir, output).stem
+    return [dest_dir.joinpath(stem + name if prefixed else name) for prefixed, name in names]
+
+
+class ConvertCache:
+    """
+    Content-addressed cache of conversion outputs shared across AVIDs.
+
+    Outputs are stored under a key computed from the checksum of the source file, the tool, output, and options of the
+    conversion, and the version of the tools used by the converter. The names of the outputs are stored relative to the
+    output directory of the conversion, with the part derived from the name of the source file replaced, so that they
+    can be restored for the same content found under a different name.
+
+    Outputs are hard-linked into and out of the cache when possible, and copied otherwise. When the total size of the
+    cache exceeds ``max_size`` bytes, the least recently used entries are evicted.
+
+    The index of the cache is a SQLite database in the cache directory, so the cache can be used by multiple processes
+    at the same time.
+    """
+
+    def __init__(self, path: str | PathLike[str], max_size: int | None = None) -> None:
+        self.path: Path = Path(path)
+        self.max_size: int | None = max_size
+        self._conn: Connection | None = None
+        self._lock: Lock = Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"path": self.path, "max_size": self.max_size}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(state["path"], state["max_size"])
+
+    @property
+    def conn(self) -> Connection:
+        with self._lock:
+            return self._connect()
+
+    def _connect(self) -> Connection:
+        if self._conn is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            # Conversions run from an event loop record their outputs in other threads
+            self._conn = connect(
+                self.path.joinpath("index.db"),
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self._conn.execute("pragma journal_mode = wal")
+            self._conn.execute(
+                "create table if not exists entries ("
+                "key text primary key, files text not null, size integer not null, "
+                "created real not null, accessed real not null, hits integer not null default 0)"
+            )
+            self._conn.execute("create index if not exists entries_accessed on entries (accessed)")
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def entry_dir(self, key: str) -> Path:
+        return self.path.joinpath("objects", key[:2], key)
+
+    # noinspection PyMethodMayBeStatic
+    def key(self, converter: ConverterABC, tool: str, output: str, options: dict[str, Any] | None) -> str | None:
+        """
+        Compute the key of a conversion.
+
+        :param converter: The converter instance used for the conversion.
+        :param tool: The tool of the conversion.
+        :param output: The output of the conversion.
+        :param options: The options of the conversion.
+        :return: The key, or ``None`` if the conversion cannot be cached.
+        """
+        if not converter.file.checksum or not converter.cacheable:
+            return None
+
+        return sha256(
+            dumps(
+                [converter.file.checksum, tool, output, options, tool_version(type(converter))],
+                sort_keys=True,
+                default=str,
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def contains(self, key: str) -> bool:
+        """
+        Check whether a conversion is in the cache.
+
+        :param key: The key of the conversion.
+        :return: ``True`` if the cache has an entry for the key, ``False`` otherwise.
+        """
+        return self.conn.execute("select 1 from entries where key = ?", [key]).fetchone() is not None
+
+    def restore(self, key: str, converter: ConverterABC, output_dir: Path, output: str) -> list[Path] | None:
+        """
+        Place the cached outputs of a conversion in the output directory.
+
+        :param key: The key of the conversion.
+        :param converter: The converter instance used for the conversion.
+        :param output_dir: The output directory of the conversion.
+        :param output: The output of the conversion.
+        :return: The paths of the restored outputs, or ``None`` if the conversion is not in the cache.
+        """
+        row = self.conn.execute("select files from entries where key = ?", [key]).fetchone()
+
+        if row is None:
+            return None
+
+        entry_dir: Path = self.entry_dir(key)
+        files: list[tuple[bool, str, int]] = loads(row[0])
+
+        if not all(
+            (p := entry_dir.joinpath(str(n))).is_file() and p.stat().st_size == s for n, (_, _, s) in enumerate(files)
+        ):
+            self.evict(key)
+            return None
+
+        output_paths: list[Path] = resolve_output_names(converter, output_dir, output, [(p, n) for p, n, _ in files])
+
+        for n, path in enumerate(output_paths):
+            link_or_copy(entry_dir.joinpath(str(n)), path)
+
+        self.conn.execute("update entries set accessed = ?, hits = hits + 1 where key = ?", [time(), key])
+
+        return output_paths
+
+    def store(self, key: str, converter: ConverterABC, output_dir: Path, output: str, output_paths: list[Path]):
+        """
+        Store the outputs of a conversion.
+
+        Outputs that are not inside the output directory of the conversion cannot be restored, so conversions that
+        produce them are not stored.
+
+        :param key: The key of the conversion.
+        :param converter: The converter instance used for the conversion.
+        :param output_dir: The output directory of the conversion.
+        :param output: The output of the conversion.
+        :param output_paths: The paths of the outputs.
+        """
+        if (names := output_names(converter, output_dir, output, output_paths)) is None:
+            return
+
+        files: list[tuple[bool, str, int]] = []
+        entry_dir: Path = self.entry_dir(key)
+        tmp_dir: Path = entry_dir.with_name(f".{key}-{uuid4().hex[:8]}")
+
+        try:
+            for n, (path, (prefixed, name)) in enumerate(zip(output_paths, names, strict=True)):
+                files.append((prefixed, name, path.stat().st_size))
+                link_or_copy(path, tmp_dir.joinpath(str(n)))
+            rmtree(entry_dir, ignore_errors=True)
+            tmp_dir.rename(entry_dir)
+        finally:
+            rmtree(tmp_dir, ignore_errors=True)
+
+        now: float = time()
+        self.conn.execute(
+            "insert or replace into entries (key, files, size, created, accessed) values (?, ?, ?, ?, ?)",
+            [key, dumps(files), sum(s for _, _, s in files), now, now],
+        )
+
+        if self.max_size is not None:
+            self.prune(self.max_size)
+
+    def evict(self, key: str):
+        """
+        Remove an entry from the cache.
+
+        :param key: The key of the entry.
+        """
+        self.conn.execute("delete from entries where key = ?", [key])
+        rmtree(self.entry_dir(key), ignore_errors=True)
+
+    def prune(self, max_size: int | None = None, max_age: float | None = None) -> int:
+        """
+        Evict the least recently used entries until the cache fits in the given size.
+
+        Entries are read in batches, oldest first, and only while the cache is too large.
+
+        :param max_size: The maximum total size of the cache in bytes.
+        :param max_age: The maximum number of seconds since an entry was last used.
+        :return: The number of evicted entries.
+        """
+        evicted: int = 0
+
+        if max_age is not None:
+            oldest: float = time() - max_age
+            while keys := self.conn.execute(
+                "select key from entries where accessed < ? limit ?",
+                [oldest, _PRUNE_BATCH],
+            ).fetchall():
+                for (key,) in keys:
+                    self.evict(key)
+                    evicted += 1
+
+        if max_size is not None:
+            total: int = self.conn.execute("select coalesce(sum(size), 0) from entries").fetchone()[0]
+            while total > max_size and (
+                entries := self.conn.execute(
+                    "select key, size from entries order by accessed limit ?",
+                    [_PRUNE_BATCH],
+                ).fetchall()
+            ):
+                for key, size in entries:
+                    if total <= max_size:
+                        break
+                    self.evict(key)
+                    total -= size
+                    evicted += 1
+
+        return evicted
+
+    def stats(self) -> CacheStats:
+        """
+        Get the statistics of the cache.
+
+        :return: The number of entries, output files, total size in bytes, and hits.
+        """
+        entries, files, size, hits = self.conn.execute(
+            "select count(*), coalesce(sum(json_array_length(files)), 0), coalesce(sum(size), 0), "
+            "coalesce(sum(hits), 0) from entries"
+        ).fetchone()
+        return CacheStats(entries, files, size, hits)
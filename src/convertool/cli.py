@@ -1,11 +1,15 @@
 from collections.abc import Callable
+from collections.abc import Generator
+from collections.abc import Iterable
+from collections.abc import Iterator
+from contextlib import nullcontext
 from datetime import datetime
-from itertools import batched
 from logging import ERROR
 from logging import INFO
+from logging import WARNING
+from multiprocessing import Pool
 from pathlib import Path
 from shutil import copy2
-from traceback import format_tb
 from typing import Literal
 
 import structlog
@@ -20,6 +24,7 @@ from acacore.models.file import OriginalFile
 from acacore.models.file import StatutoryFile
 from acacore.models.reference_files import ActionData
 from acacore.models.reference_files import ConvertAction
+from acacore.utils.click import context_commands
 from acacore.utils.click import end_program
 from acacore.utils.click import param_callback_query
 from acacore.utils.click import start_program
@@ -28,94 +33,156 @@ from click import argument
 from click import BadParameter
 from click import Choice
 from click import Context
+from click import FloatRange
 from click import group
 from click import IntRange
 from click import option
 from click import pass_context
 from click import Path as ClickPath
 from click import version_option
+from structlog.stdlib import BoundLogger
 
+from . import converters
 from .__version__ import __version__
-from .convert import convert_async_queue
-from .convert import convert_queue
+from .breaker import CircuitBreaker
+from .browser import browser_server_available
+from .browser import enable_browser_server
+from .cache import ConvertCache
+from .cache import tool_version_hash
+from .controller import ConcurrencyController
+from .convert import ConvertFailure
 from .convert import ConvertInstructions
-from .convert import file_queues
+from .convert import ConvertResult
+from .convert import duplicate
+from .convert import format_traceback
 from .convert import master_file_converter
 from .convert import original_file_converter
 from .converters.exceptions import ConverterNotFound
 from .converters.exceptions import ConvertError
+from .converters.exceptions import ConvertTimeoutError
 from .converters.exceptions import MissingDependency
 from .converters.exceptions import UnsupportedPlatform
+from .costs import CostModel
+from .costs import rank_files
+from .dedup import Deduplicator
+from .distributed import coordinate_instructions
+from .distributed import run_worker
+from .distributed import TCPTransport
+from .failures import FailureCache
+from .journal import RunJournal
+from .leases import RowLeases
+from .office import enable_office_server
+from .office import office_server_available
+from .scheduler import convert_instructions
+from .sink import ResultSink
 from .util import AVID
 from .util import ctx_params
 from .util import get_avid
 from .util import open_database
+from .util import param_callback_address
+from .util import read_config
 
 
 def handle_results(
     ctx: Context,
-    database: FilesDB,
+    sink: ResultSink,
+    journal: RunJournal,
     src_table: Table,
     out_table: Table,
+    log_table: Table[Event],
     instruction: ConvertInstructions[OriginalFile | MasterFile, ConvertedFile],
     output_files: list[ConvertedFile],
-    error: ExceptionManager | None,
+    error: ExceptionManager | ConvertFailure | None,
+    duration: float,
     set_processed: Callable[[OriginalFile | MasterFile], bool],
     commit_index: int,
-    committer: Callable[[FilesDB, int], None],
+    committer: Callable[[ResultSink, int], None],
 ) -> int:
     if error and isinstance(error.exception, ConvertError):
         event = Event.from_command(
             ctx,
             "error",
             instruction.file,
-            {"tool": instruction.tool, "output": instruction.output, "converter": instruction.converter_cls.__name__},
+            {
+                "tool": instruction.tool,
+                "output": instruction.output,
+                "converter": instruction.converter_cls.__name__,
+                "version": tool_version_hash(instruction.converter_cls),
+                "error": error.exception.__class__.__name__,
+            },
             (error.exception.process.stderr or error.exception.process.stdout or None)
             if error.exception.process
-            else "".join(format_tb(error.traceback)),
+            else format_traceback(error),
         )
-        database.log.insert(event)
+        sink.insert(log_table, event)
         return commit_index
     elif error and isinstance(error.exception, Exception):
         event = Event.from_command(
             ctx,
             "error",
             instruction.file,
-            {"tool": instruction.tool, "output": instruction.output, "converter": instruction.converter_cls.__name__},
-            "".join(format_tb(error.traceback)),
+            {
+                "tool": instruction.tool,
+                "output": instruction.output,
+                "converter": instruction.converter_cls.__name__,
+                "version": tool_version_hash(instruction.converter_cls),
+                "error": error.exception.__class__.__name__,
+            },
+            format_traceback(error),
         )
-        database.log.insert(event)
+        sink.insert(log_table, event)
         return commit_index
     elif error and isinstance(error.exception, BaseException):
         raise error.exception
 
     commit_index += 1
 
-    for output_file in output_files:
-        out_table.insert(output_file)
-
     instruction.file.processed = set_processed(instruction.file)
-    src_table.update(instruction.file)
-
-    database.log.insert(
-        Event.from_command(
-            ctx,
-            "converted",
-            instruction.file,
-            {
-                "tool": instruction.tool,
-                "output": instruction.output,
-                "converter": instruction.converter_cls.__name__,
-                "files": len(output_files),
-            },
-        )
+    event = Event.from_command(
+        ctx,
+        "converted",
+        instruction.file,
+        {
+            "tool": instruction.tool,
+            "output": instruction.output,
+            "converter": instruction.converter_cls.__name__,
+            "version": tool_version_hash(instruction.converter_cls),
+            "files": len(output_files),
+            "duration": round(duration, 3),
+        },
     )
 
-    committer(database, commit_index)
+    journal.write(instruction.file, output_files, event)
+
+    sink.insert(out_table, *output_files)
+    sink.update(src_table, instruction.file)
+    sink.insert(log_table, event)
+
+    committer(sink, commit_index)
 
     return commit_index
 
 
+def handle_breaker(
+    ctx: Context,
+    logger: BoundLogger,
+    breaker: CircuitBreaker | None,
+    instruction: ConvertInstructions,
+    error: ExceptionManager | ConvertFailure | None,
+):
+    if breaker is None:
+        return
+
+    for dependency in breaker.record(instruction, error):
+        Event.from_command(ctx, "breaker:open").log(
+            WARNING,
+            logger,
+            dependency=dependency,
+            error=breaker.opened[dependency],
+            failures=breaker.threshold,
+        )
+
+
 def compile_convert_targets(
     avid: AVID,
     database: FilesDB,
@@ -190,6 +257,124 @@ def compile_convert_targets(
     return src_table, out_table, to_process_table, is_processed, set_processed, out_dir, src_dir
 
 
+def compile_instruction(
+    ctx: Context,
+    logger: BoundLogger,
+    file: OriginalFile | MasterFile,
+    target: Literal["original:master", "master:access", "master:statutory"],
+    tool_ignore: tuple[str, ...],
+    tool_include: tuple[str, ...],
+    timeout: int | None,
+) -> ConvertInstructions[OriginalFile | MasterFile, MasterFile | AccessFile | StatutoryFile] | None:
+    instruction: ConvertInstructions | None = None
+
+    try:
+        if isinstance(file, OriginalFile):
+            instruction = original_file_converter(file)
+        else:
+            # noinspection PyTypeChecker
+            # dest_type cannot be anything but "access" or "statutory" when file is a MasterFile
+            instruction = master_file_converter(file, target.split(":")[1])
+        if instruction.tool in tool_ignore:
+            return None
+        if tool_include and instruction.tool not in tool_include:
+            return None
+        instruction.converter_cls.test()
+        if timeout is not None:
+            instruction.converter_cls.process_timeout = None if timeout == 0 else float(timeout)
+        return instruction
+    except ConverterNotFound as error:
+        if error.tool in tool_ignore:
+            return None
+        if tool_include and error.tool not in tool_include:
+            return None
+        Event.from_command(ctx, "error", file).log(
+            ERROR,
+            logger,
+            converter=error.tool_output,
+            error=error.__class__.__name__,
+            reason=" ".join(map(str, error.args)),
+        )
+    except UnsupportedPlatform as error:
+        Event.from_command(ctx, "error", file).log(
+            ERROR,
+            logger,
+            converter=f"{instruction.tool}:{instruction.output}",
+            error=error.__class__.__name__,
+            platform=error.platform,
+            reason=" ".join(map(str, error.args)),
+        )
+    except MissingDependency as error:
+        Event.from_command(ctx, "error", file).log(
+            ERROR,
+            logger,
+            converter=f"{instruction.tool}:{instruction.output}",
+            error=error.__class__.__name__,
+            depedencies=error.dependencies,
+            reason=" ".join(map(str, error.args)),
+        )
+
+    return None
+
+
+def compile_order(
+    database: FilesDB,
+    src_table: Table[OriginalFile | MasterFile],
+    to_process_table: Table[OriginalFile | MasterFile],
+    is_processed: Callable[[OriginalFile | MasterFile], bool],
+    target: Literal["original:master", "master:access", "master:statutory"],
+    cost_model: CostModel,
+) -> list[tuple[str, str]]:
+    def cost(file: OriginalFile | MasterFile) -> float:
+        if is_processed(file):
+            return 0.0
+        try:
+            if isinstance(file, OriginalFile):
+                return cost_model.estimate(original_file_converter(file))
+            # noinspection PyTypeChecker
+            return cost_model.estimate(master_file_converter(file, target.split(":")[1]))
+        except (ConverterNotFound, ValueError):
+            return 0.0
+
+    return rank_files(database, to_process_table, cost)
+
+
+def compile_quotas(
+    ctx: Context,
+    config: str | None,
+    quota: tuple[tuple[str, int], ...],
+) -> dict[str, int]:
+    dependencies: set[str] = {
+        dep
+        for name in converters.__all__
+        if isinstance(cls := getattr(converters, name), type) and issubclass(cls, converters.ConverterABC)
+        for dep in cls.dependencies or {}
+    }
+    quotas: dict[str, int] = {}
+
+    if config:
+        try:
+            quotas_config = read_config(config).get("quotas", {})
+        except ValueError as err:
+            raise BadParameter(str(err), ctx, ctx_params(ctx)["config"])
+        if not isinstance(quotas_config, dict) or not all(
+            isinstance(v, int) and not isinstance(v, bool) and v >= 1 for v in quotas_config.values()
+        ):
+            raise BadParameter("quotas must be a table of integers >= 1.", ctx, ctx_params(ctx)["config"])
+        quotas.update(quotas_config)
+
+    quotas.update(dict(quota))
+
+    if unknown := sorted(set(quotas) - dependencies):
+        raise BadParameter(
+            f"unknown dependencies {', '.join(unknown)}. Choose from {', '.join(sorted(dependencies))}.",
+            ctx,
+            ctx_params(ctx)["quota"],
+        )
+
+    return quotas
+
+
 @group("convertool", no_args_is_help=True)
 @version_option(__version__, message=f"%(prog)s, version %(version)s\nacacore, version {__acacore_version__}")
 def app():
@@ -230,7 +415,154 @@ def app():
 @option("--tool-ignore", metavar="TOOL", type=str, multiple=True, help="Exclude specific tools.  [multiple]")
 @option("--tool-include", metavar="TOOL", type=str, multiple=True, help="Include only specific tools.  [multiple]")
 @option("--timeout", metavar="SECONDS", type=IntRange(min=0), default=None, help="Override converters' timeout.")
+@option(
+    "--timeout-factor",
+    metavar="FACTOR",
+    type=FloatRange(min=0),
+    default=10.0,
+    show_default=True,
+    help="Scale timeouts with the expected duration of each file, 0 to disable.",
+)
 @option("--threads", type=IntRange(min=1), default=4, help="Set number of threads for async conversion.")
+@option(
+    "--async-jobs",
+    metavar="INTEGER",
+    type=IntRange(min=0),
+    default=0,
+    help="Run up to INTEGER audio and video conversions at once from an event loop.",
+)
+@option(
+    "--min-threads",
+    type=IntRange(min=1),
+    default=None,
+    help="Adjust the number of threads to the system load, down to this minimum.",
+)
+@option(
+    "--quota",
+    metavar="<DEPENDENCY INTEGER>",
+    type=(str, IntRange(min=1)),
+    multiple=True,
+    help="Limit concurrent conversions using a dependency.  [multiple]",
+)
+@option(
+    "--quarantine-threads",
+    type=IntRange(min=0),
+    default=1,
+    show_default=True,
+    help="Set number of threads for retrying timed out files, 0 to disable.",
+)
+@option(
+    "--quarantine-timeout",
+    metavar="FACTOR",
+    type=FloatRange(min=1),
+    default=4.0,
+    show_default=True,
+    help="Multiply the timeout of retried files.",
+)
+@option(
+    "--max-failures",
+    metavar="INTEGER",
+    type=IntRange(min=0),
+    default=25,
+    show_default=True,
+    help="Stop using a dependency after consecutive failures with the same error, 0 to disable.",
+)
+@option(
+    "--memory-budget",
+    metavar="MEGABYTES",
+    type=IntRange(min=1),
+    default=None,
+    help="Limit the estimated memory of concurrent conversions.",
+)
+@option(
+    "--config",
+    type=ClickPath(exists=True, dir_okay=False, readable=True, resolve_path=True),
+    default=None,
+    help="Read quotas from a TOML file.",
+)
+@option(
+    "--cache",
+    "cache_dir",
+    metavar="DIRECTORY",
+    type=ClickPath(file_okay=False, writable=True, resolve_path=True),
+    default=None,
+    envvar="CONVERTOOL_CACHE",
+    help="Reuse outputs of identical conversions stored in a cache directory.",
+)
+@option(
+    "--cache-size",
+    metavar="MEGABYTES",
+    type=IntRange(min=1),
+    default=None,
+    help="Evict the least recently used outputs when the cache grows larger.",
+)
+@option(
+    "--office-server",
+    metavar="JOBS",
+    type=IntRange(min=0),
+    default=0,
+    envvar="CONVERTOOL_OFFICE_SERVER",
+    help="Convert LibreOffice documents with long-running instances restarted after JOBS conversions.",
+)
+@option(
+    "--office-batch",
+    metavar="FILES",
+    type=IntRange(min=0),
+    default=0,
+    envvar="CONVERTOOL_OFFICE_BATCH",
+    help="Convert up to FILES LibreOffice documents with a single instance.",
+)
+@option(
+    "--browser-server",
+    metavar="JOBS",
+    type=IntRange(min=0),
+    default=0,
+    envvar="CONVERTOOL_BROWSER_SERVER",
+    help="Print HTML files with long-running chromium instances restarted after JOBS conversions.",
+)
+@option(
+    "--coordinator",
+    metavar="HOST:PORT",
+    type=str,
+    default=None,
+    callback=param_callback_address,
+    help="Hand out conversions to remote workers.",
+)
+@option(
+    "--lease-timeout",
+    metavar="SECONDS",
+    type=IntRange(min=1),
+    default=60,
+    show_default=True,
+    help="Reassign conversions of workers or runs that have been silent for longer.",
+)
+@option("--authkey", type=str, default=None, envvar="CONVERTOOL_AUTHKEY", help="Key shared with the workers.")
+@option(
+    "--cooperative",
+    is_flag=True,
+    default=False,
+    help="Lease files so that concurrent runs on the same AVID skip them.",
+)
+@option(
+    "--order",
+    type=Choice(["cost", "path"]),
+    default="cost",
+    show_default=True,
+    help="Order in which files are converted.",
+)
+@option(
+    "--deduplicate/--no-deduplicate",
+    is_flag=True,
+    default=True,
+    show_default=True,
+    help="Convert files with the same content only once.",
+)
+@option(
+    "--retry-failed",
+    is_flag=True,
+    default=False,
+    help="Convert files that failed in previous runs.",
+)
 @option(
     "--commit",
     metavar="INTEGER",
@@ -258,7 +590,28 @@ def cmd_digiarch(
     tool_ignore: tuple[str, ...],
     tool_include: tuple[str, ...],
     timeout: int | None,
+    timeout_factor: float,
     threads: int,
+    async_jobs: int,
+    min_threads: int | None,
+    quarantine_threads: int,
+    quarantine_timeout: float,
+    max_failures: int,
+    quota: tuple[tuple[str, int], ...],
+    memory_budget: int | None,
+    config: str | None,
+    cache_dir: str | None,
+    cache_size: int | None,
+    office_server: int,
+    office_batch: int,
+    browser_server: int,
+    coordinator: tuple[str, int] | None,
+    lease_timeout: int,
+    authkey: str | None,
+    cooperative: bool,
+    order: Literal["cost", "path"],
+    deduplicate: bool,
+    retry_failed: bool,
     commit: int,
     hashed_names: bool,
     dry_run: bool,
@@ -284,9 +637,97 @@ def cmd_digiarch(
     The former will skip files whose tools are in the list, the second will skip files whose tools are not in the list.
 
     Use the --timeout option to override the converters' timeout, set to 0 to disable timeouts altogether.
+    Otherwise, the timeout of each file is its expected duration multiplied by the --timeout-factor, so that small
+    files that hang fail early and large files are given more time. The timeout is kept between 30 seconds (or the
+    timeout of the converter, if shorter) and four times the timeout of the converter. The expected duration is based
+    on the size of the file and on the durations of previous conversions recorded in the event log. Use
+    "--timeout-factor 0" to use the timeout of the converters for all files.
+
+    Use the --threads option to set the maximum number of files converted at the same time. To limit how many of them
+    can use a given dependency (e.g. "libreoffice" or "ffmpeg"), use the --quota option with the name of the
+    dependency and the maximum number of concurrent conversions. Quotas can also be read from the [quotas] table of a
+    TOML file given with the --config option, in which case the --quota options take precedence.
+
+    Use the --async-jobs option to run audio and video conversions, which only wait on ffmpeg, from an event loop in
+    the main process instead of in the worker processes. Up to the given number of them run at the same time, in
+    addition to the --threads conversions, without needing a worker process each.
+
+    Use the --min-threads option to let the number of files converted at the same time follow the load of the
+    system. The run starts with the minimum and adds a thread when the load average, available memory, and I/O wait
+    leave room for it, up to the --threads value. Threads are removed again, down to the minimum, when the system is
+    under pressure. Each change is recorded in the log.
+
+    Files that time out are moved to a quarantine and retried once all other files have been converted, using the
+    number of threads set with --quarantine-threads and their timeout multiplied by the --quarantine-timeout factor.
+    A summary of the retried files is logged at the end. Use "--quarantine-threads 0" to record timed out files as
+    errors straight away.
+
+    If the same dependency (e.g. "chromium" or "libreoffice") fails --max-failures times in a row with the same error,
+    the files that use it are skipped for the rest of the run and left unprocessed, so they can be converted by a
+    later run once the problem is fixed. Files using other dependencies keep being converted.
+
+    Use the --memory-budget option to limit the memory, in megabytes, that the files converted at the same time are
+    expected to use. The memory of each conversion is estimated from the converter and the size of the file. Files that
+    do not fit in the budget wait until enough memory is freed, while smaller files keep being converted. A file whose
+    estimate exceeds the whole budget is converted when no other file is.
+
+    Use the --cache option (or the CONVERTOOL_CACHE environment variable) to keep the outputs of the conversions in a
+    directory shared between runs and AVIDs. Files with the same checksum, converted with the same tool, output,
+    options, and version of the tools, reuse the cached outputs instead of being converted again. Outputs are
+    hard-linked to the cache when it is on the same filesystem. Use the --cache-size option to limit the size of the
+    cache, and the "convertool cache" commands to inspect and prune it.
+
+    Use the --office-server option (or the CONVERTOOL_OFFICE_SERVER environment variable) to convert documents,
+    spreadsheets, and presentations with a long-running LibreOffice instance in each worker, instead of starting a new
+    instance with a new profile for every file. Each instance is restarted after the given number of conversions, and
+    when it crashes or times out. The Python bindings of LibreOffice (the "uno" module) must be importable.
+
+    Where the Python bindings of LibreOffice are not available, use the --office-batch option (or the
+    CONVERTOOL_OFFICE_BATCH environment variable) to convert documents, spreadsheets, and presentations to PDF or to
+    the OpenDocument formats in groups of up to the given number of files, each group with a single LibreOffice
+    instance. Files are grouped by tool, output, and options, and files with the same name are converted on their own.
+    If the conversion of a group fails, or some of its outputs are missing, the files concerned are converted on their
+    own. This option cannot be used together with --office-server.
+
+    Likewise, use the --browser-server option (or the CONVERTOOL_BROWSER_SERVER environment variable) to print HTML
+    files, including e-mails and XML files converted to HTML, with a long-running chromium instance in each worker,
+    driven through the DevTools protocol. Each page is printed in a new browser context. The instance is checked before
+    each conversion, and restarted when it does not respond, after the given number of conversions, and when a
+    conversion times out. This option is not available on Windows.
+
+    To spread the conversions over multiple hosts, use the --coordinator option with the address to listen on, and
+    start "convertool worker" on each host with the same address. Workers must have access to the AVID directory
+    through a shared filesystem, and use the same --authkey (or CONVERTOOL_AUTHKEY environment variable) as the
+    coordinator. Converters that do not support multithreading are still run by the coordinator. If a worker is
+    silent for longer than the --lease-timeout, its conversions are handed out to other workers. The --cache, --quota,
+    --config, --memory-budget, --min-threads, --office-batch, and --async-jobs options only apply to local runs and
+    cannot be used together with --coordinator.
+
+    To run multiple instances of the command on the same AVID at the same time, e.g. with different --tool-include
+    options, use the --cooperative option with all of them. Each run leases the files it converts, and skips those
+    leased by the others. The leases of a run that stopped unexpectedly expire after --lease-timeout seconds.
+
+    By default, the files that are expected to take the longest to convert are started first, so that the shorter
+    conversions can fill the gaps at the end of the run. The estimates are based on the size of the files and on the
+    durations of previous conversions recorded in the event log. Use "--order path" to convert the files in order of
+    their relative path instead.
+
+    Files with the same checksum that are converted with the same tool, output, and options are only converted once.
+    The outputs of the first file are hard-linked (or copied) for the others, using the names the converter would have
+    given them. The time spent converting and copying these files is logged at the end. If the conversion of the first
+    file fails, its error is recorded for the others, which are left unprocessed. Use the --no-deduplicate option to
+    convert each file separately.
+
+    Conversions that failed in previous runs are skipped if the file has the same checksum and the converter uses the
+    same tools, tool versions, and output, since they would fail again in the same way. The number of skipped files is
+    logged at the end. Use the --retry-failed option to convert them anyway.
 
     Use the --commit option to change the number of files to be processed for each commit.
     To avoid committing changes until all files have been processed, use 0 as value.
+    Completed conversions are also written to a journal in the _metadata folder before they are sent to the
+    database. If a run is interrupted before its changes are committed, the next run records the conversions found in
+    the journal whose output files are still present, instead of converting those files again. With the --cooperative
+    option, each run has its own journal, and only the journals of runs that are no longer active are reconciled.
 
     Use the --verbose option to print the standard output from the converters. The output (standard or error) is always
     printed in case of an error.
@@ -297,7 +738,37 @@ def cmd_digiarch(
     same stem with the current date and time as suffix.
     """
     avid = get_avid(ctx, avid_dir, "avid_dir")
-    committer: Callable[[FilesDB, int], None]
+    if coordinator and not authkey:
+        raise BadParameter("an authentication key is required to run as coordinator.", ctx, ctx_params(ctx)["authkey"])
+    if coordinator:
+        for name, value in (
+            ("cache_dir", cache_dir),
+            ("quota", quota),
+            ("config", config),
+            ("memory_budget", memory_budget),
+            ("min_threads", min_threads),
+            ("office_batch", office_batch),
+            ("async_jobs", async_jobs),
+        ):
+            if value:
+                raise BadParameter("cannot be used with --coordinator.", ctx, ctx_params(ctx)[name])
+    if min_threads and min_threads > threads:
+        raise BadParameter("cannot be greater than --threads.", ctx, ctx_params(ctx)["min_threads"])
+    if office_server and not office_server_available():
+        raise BadParameter(
+            "the Python bindings of LibreOffice (uno) are not available.",
+            ctx,
+            ctx_params(ctx)["office_server"],
+        )
+    if office_batch and office_server:
+        raise BadParameter("cannot be used with --office-server.", ctx, ctx_params(ctx)["office_batch"])
+    if browser_server and not browser_server_available():
+        raise BadParameter("not available on this platform.", ctx, ctx_params(ctx)["browser_server"])
+    quotas: dict[str, int] = compile_quotas(ctx, config, quota)
+    committer: Callable[[ResultSink, int], None]
+
+    enable_office_server(office_server)
+    enable_browser_server(browser_server)
 
     with open_database(ctx, avid, "avid_dir") as database:
         logger, _ = start_program(ctx, database, __version__, dry_run)
@@ -315,9 +786,9 @@ def cmd_digiarch(
             if commit <= 0:
                 committer = lambda _, __: None  # noqa: E731
             elif commit == 1:
-                committer = lambda _db, _: _db.commit()  # noqa: E731
+                committer = lambda _sink, _: _sink.commit()  # noqa: E731
             else:
-                committer = lambda _db, _n: _db.commit() if _n % commit == 0 else None  # noqa: E731
+                committer = lambda _sink, _n: _sink.commit() if _n % commit == 0 else None  # noqa: E731
 
             (
                 src_table,
@@ -331,133 +802,411 @@ def cmd_digiarch(
 
             output_dir.mkdir(parents=True, exist_ok=True)
 
+            leases: RowLeases | None = (
+                RowLeases(avid.metadata_dir.joinpath("convertool-leases.db"), target, lease_timeout)
+                if cooperative and not dry_run
+                else None
+            )
+            journal = RunJournal.for_run(avid.metadata_dir, target, leases.owner if leases else None)
+
+            if not dry_run:
+                recorded: list[str] = []
+                discarded: int = 0
+                # Cooperative runs only reconcile the journals of the runs that stopped
+                for orphan in (
+                    RunJournal.orphans(avid.metadata_dir, target, leases.active_owners) if leases else [journal]
+                ):
+                    orphan_recorded, orphan_discarded = orphan.reconcile(
+                        database,
+                        src_table,
+                        out_table,
+                        avid.path,
+                        is_processed,
+                        set_processed,
+                    )
+                    recorded.extend(orphan_recorded)
+                    discarded += orphan_discarded
+                for uuid in recorded:
+                    database.execute(f"delete from {to_process_table.name} where uuid = ?", [uuid])
+                database.commit()
+                if recorded or discarded:
+                    Event.from_command(ctx, "journal").log(INFO, logger, recorded=len(recorded), discarded=discarded)
+
+            cost_model: CostModel = CostModel.from_events(
+                database,
+                src_table,
+                f"{'.'.join(context_commands(ctx))}:converted",
+            )
+            order_by: list[tuple[str, str]] = (
+                compile_order(database, src_table, to_process_table, is_processed, target, cost_model)
+                if order == "cost"
+                else [("lower(relative_path)", "asc")]
+            )
+
             Event.from_command(ctx, "compiling:end").log(INFO, logger)
 
-            batch: tuple[OriginalFile | MasterFile, ...]
-            commit_index: int = 0
-            for batch in batched(
-                (f for f in to_process_table.select(order_by=[("lower(relative_path)", "asc")]) if not is_processed(f)),
-                threads * 2,
-            ):
-                instructions: list[
-                    ConvertInstructions[
-                        OriginalFile | MasterFile,
-                        MasterFile | AccessFile | StatutoryFile,
-                    ]
-                ] = []
-
-                for file in batch:
-                    instruction: ConvertInstructions | None = None
-                    try:
-                        if isinstance(file, OriginalFile):
-                            instruction = original_file_converter(file)
-                        else:
-                            # noinspection PyTypeChecker
-                            # dest_type cannot be anything but "access" or "statutory" when file is a MasterFile
-                            instruction = master_file_converter(file, target.split(":")[1])
-                        if instruction.tool in tool_ignore:
-                            continue
-                        if tool_include and instruction.tool not in tool_include:
-                            continue
-                        instruction.converter_cls.test()
-                        if timeout is not None:
-                            instruction.converter_cls.process_timeout = None if timeout == 0 else float(timeout)
-                        instructions.append(instruction)
-                    except ConverterNotFound as error:
-                        if error.tool in tool_ignore:
-                            continue
-                        if tool_include and error.tool not in tool_include:
-                            continue
-                        Event.from_command(ctx, "error", file).log(
-                            ERROR,
-                            logger,
-                            converter=error.tool_output,
-                            error=error.__class__.__name__,
-                            reason=" ".join(map(str, error.args)),
-                        )
-                    except UnsupportedPlatform as error:
-                        Event.from_command(ctx, "error", file).log(
-                            ERROR,
-                            logger,
-                            converter=f"{instruction.tool}:{instruction.output}",
-                            error=error.__class__.__name__,
-                            platform=error.platform,
-                            reason=" ".join(map(str, error.args)),
-                        )
-                    except MissingDependency as error:
-                        Event.from_command(ctx, "error", file).log(
-                            ERROR,
-                            logger,
-                            converter=f"{instruction.tool}:{instruction.output}",
-                            error=error.__class__.__name__,
-                            depedencies=error.dependencies,
-                            reason=" ".join(map(str, error.args)),
-                        )
+            instructions: Iterator[ConvertInstructions] = filter(
+                None,
+                (
+                    compile_instruction(ctx, logger, file, target, tool_ignore, tool_include, timeout)
+                    for file in to_process_table.select(order_by=order_by)
+                    if not is_processed(file)
+                ),
+            )
 
-                if dry_run:
-                    for instruction in instructions:
-                        Event.from_command(ctx, "convert", instruction.file).log(
-                            INFO,
-                            logger,
-                            tool=[instruction.tool, instruction.output],
-                        )
-                    continue
+            if timeout is None and timeout_factor:
+                instructions = (i._replace(timeout=cost_model.timeout(i, timeout_factor)) for i in instructions)
 
-                sync_queue, async_queues = file_queues(instructions, threads)
+            cache: ConvertCache | None = (
+                ConvertCache(cache_dir, cache_size * 1_000_000 if cache_size else None) if cache_dir else None
+            )
 
-                for async_queue in async_queues:
-                    for instruction, output_files, error in convert_async_queue(
-                        ctx,
-                        database,
-                        output_dir,
-                        avid.path,
-                        src_dir,
-                        async_queue,
-                        threads,
-                        verbose,
-                        hashed_names,
+            failures: FailureCache | None = (
+                FailureCache.from_events(
+                    database,
+                    src_table,
+                    f"{'.'.join(context_commands(ctx))}:error",
+                    f"{'.'.join(context_commands(ctx))}:converted",
+                )
+                if not retry_failed and not dry_run
+                else None
+            )
+
+            if failures:
+                instructions = filter(failures.allow, instructions)
+
+            breaker: CircuitBreaker | None = CircuitBreaker(max_failures) if max_failures and not dry_run else None
+
+            if breaker:
+                instructions = filter(breaker.allow, instructions)
+
+            if leases:
+                instructions = (i for i in instructions if leases.claim(i.file, src_table, is_processed))
+
+            dedup: Deduplicator | None = Deduplicator() if deduplicate and not dry_run else None
+
+            if dedup:
+                instructions = dedup.filter(instructions)
+
+            if dry_run:
+                for instruction in instructions:
+                    Event.from_command(ctx, "convert", instruction.file).log(
+                        INFO,
                         logger,
-                    ):
-                        handle_results(
-                            ctx,
-                            database,
-                            src_table,
-                            out_table,
-                            instruction,
-                            output_files,
-                            error,
-                            set_processed,
-                            commit_index,
-                            committer,
+                        tool=[instruction.tool, instruction.output],
+                    )
+            else:
+                commit_index: int = 0
+                # Release the write lock of the main connection before the sink starts writing with its own
+                database.commit()
+                with leases or nullcontext(), journal:
+                    with ResultSink(avid.database_path) as sink:
+                        results: Iterator[ConvertResult] = (
+                            coordinate_instructions(
+                                ctx,
+                                database,
+                                output_dir,
+                                avid.path,
+                                src_dir,
+                                instructions,
+                                verbose,
+                                hashed_names,
+                                timeout,
+                                logger,
+                                TCPTransport(authkey.encode()),
+                                coordinator,
+                                lease_timeout,
+                            )
+                            if coordinator
+                            else convert_instructions(
+                                ctx,
+                                database,
+                                output_dir,
+                                avid.path,
+                                src_dir,
+                                instructions,
+                                threads,
+                                verbose,
+                                hashed_names,
+                                timeout,
+                                logger,
+                                quotas,
+                                ConcurrencyController(min_threads, threads)
+                                if min_threads and min_threads < threads
+                                else None,
+                                memory_budget,
+                                cache,
+                                office_batch,
+                                async_jobs,
+                            )
                         )
+                        quarantine: list[ConvertInstructions] = []
+                        duplicates_stats: dict[str, float] = {"files": 0, "copies": 0, "convert": 0.0, "copy": 0.0}
 
-                for instruction, output_files, error in convert_queue(
-                    ctx,
-                    database,
-                    output_dir,
-                    avid.path,
-                    src_dir,
-                    sync_queue,
-                    verbose,
-                    hashed_names,
-                    logger,
-                ):
-                    handle_results(
-                        ctx,
-                        database,
-                        src_table,
-                        out_table,
-                        instruction,
-                        output_files,
-                        error,
-                        set_processed,
-                        commit_index,
-                        committer,
-                    )
+                        def record(
+                            _results: Iterable[ConvertResult],
+                            lane: list[ConvertInstructions] | None,
+                        ) -> Generator[ConvertResult, None, None]:
+                            nonlocal commit_index
+                            for result in _results:
+                                handle_breaker(ctx, logger, breaker, result.instructions, result.error)
+                                if (
+                                    lane is not None
+                                    and quarantine_threads
+                                    and result.error
+                                    and isinstance(result.error.exception, ConvertTimeoutError)
+                                ):
+                                    lane.append(
+                                        result.instructions._replace(
+                                            timeout=(
+                                                result.instructions.timeout
+                                                or result.instructions.converter_cls.process_timeout
+                                                or 0
+                                            )
+                                            * quarantine_timeout
+                                        )
+                                    )
+                                    Event.from_command(ctx, "quarantine", result.instructions.file).log(
+                                        INFO,
+                                        logger,
+                                        timeout=lane[-1].timeout,
+                                    )
+                                    continue
+
+                                duplicates: list[ConvertInstructions] = (
+                                    dedup.duplicates(result.instructions) if dedup else []
+                                )
+                                results_: list[ConvertResult] = [result]
+
+                                if duplicates and not result.error:
+                                    duplicates_stats["files"] += 1
+                                    duplicates_stats["convert"] += result.duration
+                                for dup in duplicates:
+                                    results_.append(
+                                        duplicate(
+                                            ctx,
+                                            result,
+                                            output_dir,
+                                            avid.path,
+                                            src_dir,
+                                            dup,
+                                            hashed_names,
+                                            logger,
+                                        )
+                                    )
+                                    if not result.error:
+                                        duplicates_stats["copies"] += 1
+                                        duplicates_stats["copy"] += results_[-1].duration
+
+                                for instruction, output_files, error, duration in results_:
+                                    commit_index = handle_results(
+                                        ctx,
+                                        sink,
+                                        journal,
+                                        src_table,
+                                        out_table,
+                                        database.log,
+                                        instruction,
+                                        output_files,
+                                        error,
+                                        duration,
+                                        set_processed,
+                                        commit_index,
+                                        committer,
+                                    )
+
+                                yield result
+
+                        for _ in record(results, quarantine):
+                            pass
+
+                        if quarantine:
+                            Event.from_command(ctx, "quarantine:start").log(INFO, logger, files=len(quarantine))
+                            converted: int = 0
+                            failed: int = 0
+                            for result in record(
+                                convert_instructions(
+                                    ctx,
+                                    database,
+                                    output_dir,
+                                    avid.path,
+                                    src_dir,
+                                    filter(breaker.allow, quarantine) if breaker else quarantine,
+                                    quarantine_threads,
+                                    verbose,
+                                    hashed_names,
+                                    timeout,
+                                    logger,
+                                    quotas,
+                                    None,
+                                    memory_budget,
+                                    cache,
+                                ),
+                                None,
+                            ):
+                                converted += result.error is None
+                                failed += result.error is not None
+                            Event.from_command(ctx, "quarantine:end").log(
+                                INFO,
+                                logger,
+                                files=len(quarantine),
+                                converted=converted,
+                                failed=failed,
+                            )
+
+                        # Duplicates whose original file was skipped are converted on their own
+                        if dedup and (leftovers := dedup.remaining()):
+                            for _ in record(
+                                convert_instructions(
+                                    ctx,
+                                    database,
+                                    output_dir,
+                                    avid.path,
+                                    src_dir,
+                                    filter(breaker.allow, leftovers) if breaker else leftovers,
+                                    threads,
+                                    verbose,
+                                    hashed_names,
+                                    timeout,
+                                    logger,
+                                    quotas,
+                                    None,
+                                    memory_budget,
+                                    cache,
+                                ),
+                                None,
+                            ):
+                                pass
+
+                        if duplicates_stats["copies"]:
+                            Event.from_command(ctx, "duplicates").log(
+                                INFO,
+                                logger,
+                                files=int(duplicates_stats["files"]),
+                                copies=int(duplicates_stats["copies"]),
+                                convert_time=round(duplicates_stats["convert"], 3),
+                                copy_time=round(duplicates_stats["copy"], 3),
+                            )
+
+                        if failures and failures.skipped:
+                            Event.from_command(ctx, "failures:skipped").log(INFO, logger, files=failures.skipped)
+
+                        for dependency, error_name in (breaker.opened if breaker else {}).items():
+                            Event.from_command(ctx, "breaker:skipped").log(
+                                WARNING,
+                                logger,
+                                dependency=dependency,
+                                error=error_name,
+                                files=breaker.skipped[dependency],
+                            )
+                    journal.clear()
 
         end_program(ctx, database, exception, dry_run, logger)
 
 
+@app.command("worker", no_args_is_help=True, short_help="Convert files for a coordinator.")
+@argument("address", metavar="HOST:PORT", nargs=1, callback=param_callback_address)
+@argument(
+    "avid_dir",
+    type=ClickPath(exists=True, file_okay=False, writable=True, resolve_path=True),
+    required=True,
+)
+@option("--threads", type=IntRange(min=1), default=1, show_default=True, help="Set number of parallel conversions.")
+@option("--name", type=str, default=None, help="Name of the worker.  [default: hostname]")
+@option("--authkey", type=str, required=True, envvar="CONVERTOOL_AUTHKEY", help="Key shared with the coordinator.")
+@option(
+    "--connect-timeout",
+    metavar="SECONDS",
+    type=IntRange(min=0),
+    default=60,
+    show_default=True,
+    help="Keep trying to connect to the coordinator for this long.",
+)
+@pass_context
+def cmd_worker(
+    ctx: Context,
+    address: tuple[str, int],
+    avid_dir: str,
+    threads: int,
+    name: str | None,
+    authkey: str,
+    connect_timeout: int,
+):
+    """
+    Convert files handed out by a "convertool digiarch" coordinator listening on HOST:PORT.
+
+    AVID_DIR is the path to the AVID directory on this host. It must be the same directory used by the coordinator,
+    shared over a filesystem, but it can be mounted at a different path.
+
+    Use the --threads option to set the number of files converted at the same time.
+
+    The worker stops when the coordinator has no more files to convert.
+    """
+    avid = get_avid(ctx, avid_dir, "avid_dir")
+    logger = structlog.stdlib.get_logger()
+    transport = TCPTransport(authkey.encode())
+
+    if threads <= 1:
+        converted = run_worker(transport, address, avid.path, logger, name, connect_timeout)
+    else:
+        with Pool(threads) as pool:
+            converted = sum(
+                pool.starmap(
+                    run_worker,
+                    [(transport, address, avid.path, logger, name, connect_timeout)] * threads,
+                )
+            )
+
+    logger.info(f"Converted {converted} files")
+
+
+@app.group("cache", no_args_is_help=True, short_help="Manage the conversion cache.")
+def grp_cache():
+    """Inspect and prune the cache of conversion outputs used by the --cache option of the "digiarch" command."""
+
+
+@grp_cache.command("stats", no_args_is_help=True, short_help="Show cache statistics.")
+@argument("cache_dir", metavar="DIRECTORY", type=ClickPath(exists=True, file_okay=False, resolve_path=True))
+def cmd_cache_stats(cache_dir: str):
+    """
+    Show statistics of the cache in DIRECTORY.
+
+    The statistics include the number of cached conversions and output files, the total size of the cache, and the
+    number of times conversions were reused from it.
+    """
+    logger = structlog.stdlib.get_logger()
+    cache = ConvertCache(cache_dir)
+    stats = cache.stats()
+    cache.close()
+    logger.info(f"Entries: {stats.entries}")
+    logger.info(f"Files: {stats.files}")
+    logger.info(f"Size: {stats.size / 1_000_000:.1f} MB")
+    logger.info(f"Hits: {stats.hits}")
+
+
+@grp_cache.command("prune", no_args_is_help=True, short_help="Remove entries from the cache.")
+@argument(
+    "cache_dir", metavar="DIRECTORY", type=ClickPath(exists=True, file_okay=False, writable=True, resolve_path=True)
+)
+@option("--max-size", metavar="MEGABYTES", type=IntRange(min=0), default=None, help="Shrink the cache to this size.")
+@option("--max-age", metavar="DAYS", type=IntRange(min=0), default=None, help="Remove entries unused for longer.")
+def cmd_cache_prune(cache_dir: str, max_size: int | None, max_age: int | None):
+    """
+    Remove entries from the cache in DIRECTORY.
+
+    Use the --max-size option to remove the least recently used entries until the cache fits in the given size, and
+    the --max-age option to remove the entries that have not been used for the given number of days.
+    """
+    logger = structlog.stdlib.get_logger()
+    cache = ConvertCache(cache_dir)
+    evicted = cache.prune(
+        max_size * 1_000_000 if max_size is not None else None,
+        max_age * 86400 if max_age is not None else None,
+    )
+    cache.close()
+    logger.info(f"Removed {evicted} entries")
+
+
 @app.command("standalone", no_args_is_help=True, short_help="Convert single files.")
 @argument("tool", nargs=1)
 @argument("output", nargs=1)
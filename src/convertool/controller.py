@@ -0,0 +1,106 @@
+from os import cpu_count
+from pathlib import Path
+from time import monotonic
+from typing import NamedTuple
+
+
+class SystemLoad(NamedTuple):
+    load: float
+    memory: float
+    iowait: float
+
+
+def _read_cpu_times(proc: Path) -> tuple[int, int]:
+    fields: list[int] = [int(f) for f in proc.joinpath("stat").read_text().splitlines()[0].split()[1:]]
+    return fields[4] if len(fields) > 4 else 0, sum(fields)
+
+
+def _read_memory(proc: Path) -> float:
+    meminfo: dict[str, int] = {}
+    for line in proc.joinpath("meminfo").read_text().splitlines():
+        key, _, value = line.partition(":")
+        if value.strip():
+            meminfo[key] = int(value.split()[0])
+    return meminfo.get("MemAvailable", meminfo.get("MemFree", 0)) / (meminfo.get("MemTotal") or 1)
+
+
+class ConcurrencyController:
+    """
+    Adjust the number of concurrent conversions to the load of the system.
+
+    The controller samples the load average (per CPU), the fraction of available memory, and the fraction of CPU time
+    spent waiting for I/O from ``/proc``. When the system is under pressure, the limit is decreased by one slot; when
+    it has spare capacity, the limit is increased by one slot. The limit starts from the minimum and is kept within the
+    given bounds.
+
+    On systems without ``/proc``, the limit is fixed at the maximum.
+    """
+
+    def __init__(
+        self,
+        minimum: int,
+        maximum: int,
+        interval: float = 5.0,
+        proc: Path = Path("/proc"),
+    ) -> None:
+        self.minimum: int = minimum
+        self.maximum: int = maximum
+        self.interval: float = interval
+        self.proc: Path = proc
+        self.limit: int = minimum if proc.is_dir() else maximum
+        self.cpus: int = cpu_count() or 1
+        self.high_load: float = 1.25
+        self.low_load: float = 0.75
+        self.low_memory: float = 0.1
+        self.high_memory: float = 0.25
+        self.high_iowait: float = 0.25
+        self.low_iowait: float = 0.1
+        self._last_sample: float = 0
+        self._cpu_times: tuple[int, int] | None = None
+
+    def sample(self) -> SystemLoad | None:
+        """
+        Read the current load of the system.
+
+        :return: The load, or ``None`` if it cannot be read.
+        """
+        try:
+            load: float = float(self.proc.joinpath("loadavg").read_text().split()[0]) / self.cpus
+            memory: float = _read_memory(self.proc)
+            iowait_time, total_time = _read_cpu_times(self.proc)
+        except (OSError, ValueError, IndexError):
+            return None
+
+        iowait: float = 0.0
+        if self._cpu_times and total_time > self._cpu_times[1]:
+            iowait = (iowait_time - self._cpu_times[0]) / (total_time - self._cpu_times[1])
+        self._cpu_times = (iowait_time, total_time)
+
+        return SystemLoad(load, memory, iowait)
+
+    def update(self) -> SystemLoad | None:
+        """
+        Sample the load of the system and adjust the limit, at most once every ``interval`` seconds.
+
+        :return: The sampled load if the limit was changed, ``None`` otherwise.
+        """
+        if monotonic() - self._last_sample < self.interval:
+            return None
+
+        self._last_sample = monotonic()
+
+        if (load := self.sample()) is None:
+            return None
+
+        limit: int = self.limit
+
+        if load.memory < self.low_memory or load.load > self.high_load or load.iowait > self.high_iowait:
+            limit = max(self.minimum, self.limit - 1)
+        elif load.memory > self.high_memory and load.load < self.low_load and load.iowait < self.low_iowait:
+            limit = min(self.maximum, self.limit + 1)
+
+        if limit == self.limit:
+            return None
+
+        self.limit = limit
+        return load
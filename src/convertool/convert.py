@@ -1,10 +1,18 @@
+from asyncio import to_thread
+from concurrent.futures import Future
+from concurrent.futures import wait
 from logging import ERROR
 from logging import INFO
-from multiprocessing import Pool
+from logging import WARNING
 from pathlib import Path
+from sqlite3 import Error as SQLiteError
+from time import perf_counter
+from traceback import format_tb
+from types import TracebackType
 from typing import Any
 from typing import Literal
 from typing import NamedTuple
+from uuid import uuid4
 
 from acacore.database import FilesDB
 from acacore.models.event import Event
@@ -13,17 +21,24 @@ from acacore.models.file import ConvertedFile
 from acacore.models.file import MasterFile
 from acacore.models.file import OriginalFile
 from acacore.models.file import StatutoryFile
-from acacore.utils.click import context_commands
 from acacore.utils.helpers import ExceptionManager
 from click import Context
 from structlog.stdlib import BoundLogger
 
 from . import converters
+from .cache import ConvertCache
+from .cache import output_names
+from .cache import resolve_output_names
 from .converters.exceptions import ConverterNotFound
 from .converters.exceptions import ConvertError
+from .converters.exceptions import ConvertStalledError
 from .converters.exceptions import ConvertTimeoutError
 from .converters.exceptions import OutputDirError
 from .converters.exceptions import OutputTargetError
+from .digest import digest_files
+from .digest import file_record
+from .digest import FileDigest
+from .util import link_or_copy
 
 
 class ConvertInstructions[M: OriginalFile | MasterFile, O: ConvertedFile](NamedTuple):
@@ -35,6 +50,33 @@ class ConvertInstructions[M: OriginalFile | MasterFile, O: ConvertedFile](NamedT
     output: str
     options: dict[str, Any] | None
     output_cls: type[O]
+    timeout: float | None = None
+
+
+class ConvertFailure(NamedTuple):
+    """Picklable stand-in for ``ExceptionManager`` used to return errors from worker processes."""
+
+    exception: BaseException
+    traceback: str
+
+
+class ConvertResult[M: OriginalFile | MasterFile, O: ConvertedFile](NamedTuple):
+    instructions: ConvertInstructions[M, O]
+    output_files: list[ConvertedFile]
+    error: ExceptionManager | ConvertFailure | None
+    duration: float
+
+
+def format_traceback(error: ExceptionManager | ConvertFailure) -> str:
+    """
+    Format the traceback of a conversion error.
+
+    :param error: The error returned by a conversion.
+    :return: The formatted traceback.
+    """
+    if isinstance(error.traceback, TracebackType):
+        return "".join(format_tb(error.traceback))
+    return error.traceback or ""
 
 
 def find_converter(tool: str, output: str) -> type[converters.ConverterABC] | None:
@@ -148,30 +190,26 @@ def master_file_converter(
     return ConvertInstructions(file, "master", dest_type, converter_cls, tool, output, options, output_cls)
 
 
-def file_queues[M: OriginalFile | MasterFile, O: ConvertedFile](
-    instructions: list[ConvertInstructions[M, O]],
-    threads: int,
-) -> tuple[list[ConvertInstructions[M, O]], list[list[ConvertInstructions[M, O]]]]:
-    """
-    Create conversion queues.
-
-    :param instructions:
-    :param threads:
-    :return: synchronous queue, asynchronous queue
-    """
-    sync_queue: list[ConvertInstructions[M, O]] = []
-    async_queues: list[list[ConvertInstructions[M, O]]] = [[]]
-
-    for inst in instructions:
-        if threads <= 1 or not inst.converter_cls.multithreading:
-            sync_queue.append(inst)
-        elif len(async_queues[-1]) < threads:
-            async_queues[-1].append(inst)
-        else:
-            async_queues.append([])
-            async_queues[-1].append(inst)
-
-    return sync_queue, async_queues
+def _converter(
+    database: FilesDB | None,
+    root_dir: Path,
+    relative_root_dir: Path,
+    instructions: ConvertInstructions,
+    verbose: bool,
+    hashed_output_name: bool,
+) -> converters.ConverterABC:
+    converter = instructions.converter_cls(
+        file=instructions.file.model_copy(deep=True),
+        database=database,
+        options=instructions.options,
+        capture_output=not verbose,
+        hashed_putput_name=hashed_output_name,
+    )
+    converter.file.relative_path = converter.file.get_absolute_path(root_dir).relative_to(relative_root_dir)
+    converter.file.root = relative_root_dir
+    if instructions.timeout is not None:
+        converter.process_timeout = instructions.timeout or None
+    return converter
 
 
 def convert[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | StatutoryFile](
@@ -184,19 +222,16 @@ def convert[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | Statutory
     verbose: bool,
     hashed_output_name: bool,
     logger: BoundLogger,
-) -> tuple[ConvertInstructions[M, O], list[ConvertedFile], ExceptionManager | None]:
+    cache: ConvertCache | None = None,
+    converted: list[Path] | BaseException | None = None,
+) -> ConvertResult[M, O]:
     output_paths: list[Path] = []
+    digests: list[Future[FileDigest]] = []
+    start: float = perf_counter()
+    cache_key: str | None = None
 
     with ExceptionManager(BaseException) as exception:
-        converter = instructions.converter_cls(
-            file=instructions.file.model_copy(deep=True),
-            database=database,
-            options=instructions.options,
-            capture_output=not verbose,
-            hashed_putput_name=hashed_output_name,
-        )
-        converter.file.relative_path = converter.file.get_absolute_path(root_dir).relative_to(relative_root_dir)
-        converter.file.root = relative_root_dir
+        converter = _converter(database, root_dir, relative_root_dir, instructions, verbose, hashed_output_name)
 
         Event.from_command(context, "run", instructions.file).log(
             INFO,
@@ -205,10 +240,46 @@ def convert[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | Statutory
             name=instructions.file.name,
         )
 
-        output_paths = converter.convert(output_dir, instructions.output, keep_relative_path=True)
+        if cache:
+            cache_key = cache.key(converter, instructions.tool, instructions.output, instructions.options)
+
+        if (
+            cache_key
+            and converted is None
+            and (output_paths := cache.restore(cache_key, converter, output_dir, instructions.output))
+        ):
+            Event.from_command(context, "cache:hit", instructions.file).log(INFO, logger, key=cache_key)
+            digests = digest_files(output_paths)
+        else:
+            if isinstance(converted, BaseException):
+                raise converted
+            output_paths = (
+                converted
+                if converted is not None
+                else converter.convert(output_dir, instructions.output, keep_relative_path=True)
+            )
+            # Hash the outputs in the background while they are stored in the cache
+            digests = digest_files(output_paths, converter.output_digests)
+            if cache_key:
+                try:
+                    cache.store(cache_key, converter, output_dir, instructions.output, output_paths)
+                except (OSError, SQLiteError) as err:
+                    Event.from_command(context, "cache:error", instructions.file).log(
+                        WARNING,
+                        logger,
+                        key=cache_key,
+                        error=err.__class__.__name__,
+                        msg=str(err),
+                    )
         output_files = [
-            instructions.output_cls.from_file(p, root_dir, {"original_uuid": instructions.file.uuid, "sequence": n})
-            for n, p in enumerate(output_paths)
+            file_record(
+                instructions.output_cls,
+                p,
+                root_dir,
+                d.result(),
+                {"original_uuid": instructions.file.uuid, "sequence": n},
+            )
+            for n, (p, d) in enumerate(zip(output_paths, digests, strict=True))
         ]
 
         for file in output_files:
@@ -220,14 +291,17 @@ def convert[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | Statutory
                 name=file.name,
             )
 
-        return instructions, output_files, None
+        return ConvertResult(instructions, output_files, None, perf_counter() - start)
 
     if exception.exception is not None:
+        wait(digests)
         for p in output_paths:
             p.unlink(missing_ok=True)
         log_args: dict[str, Any] = {}
         if isinstance(exception.exception, ConvertTimeoutError):
             log_args["timeout"] = converter.process_timeout
+        elif isinstance(exception.exception, ConvertStalledError):
+            log_args["stall_timeout"] = converter.process_stall_timeout
         elif isinstance(exception.exception, OutputDirError | OutputTargetError):
             log_args["reason"] = exception.exception.msg
         elif isinstance(exception.exception, ConvertError):
@@ -250,57 +324,265 @@ def convert[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | Statutory
             **log_args,
         )
 
-    return instructions, [], exception
+    return ConvertResult(instructions, [], exception, perf_counter() - start)
 
 
-def convert_async_queue[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | StatutoryFile](
+async def convert_async[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | StatutoryFile](
     context: Context | str,
     database: FilesDB | None,
     output_dir: Path,
     root_dir: Path,
     relative_root_dir: Path,
-    instructions: list[ConvertInstructions[M, O]],
-    threads: int,
+    instructions: ConvertInstructions[M, O],
     verbose: bool,
-    hashed_output_names: bool,
+    hashed_output_name: bool,
     logger: BoundLogger,
-) -> list[tuple[ConvertInstructions[M, O], list[ConvertedFile], ExceptionManager | None]]:
-    context_str: str = ".".join(context_commands(context)) if isinstance(context, Context) else context
-    with Pool(threads) as pool:
-        args = [
-            (context_str, database, output_dir, root_dir, relative_root_dir, inst, verbose, hashed_output_names, logger)
-            for inst in instructions
-        ]
-        results = pool.starmap(convert, args)
-        pool.close()
-        pool.join()
-
-    return results
-
+    cache: ConvertCache | None = None,
+) -> ConvertResult[M, O]:
+    """
+    Convert a file with the ``convert_async`` method of its converter.
+
+    The conversion is awaited, so that many conversions can wait on their processes from a single event loop. The
+    outputs, or the error, are then recorded by ``convert`` in a separate thread. Files found in the cache are
+    restored by ``convert`` instead of being converted.
+
+    :param context: The click context or the name of the command.
+    :param database: The database.
+    :param output_dir: The output directory.
+    :param root_dir: The root directory of the files.
+    :param relative_root_dir: The directory the converted files should be relative to.
+    :param instructions: The instructions of the file.
+    :param verbose: Whether to show the output of the converter.
+    :param hashed_output_name: Whether to use hashed names for the output files.
+    :param logger: The logger to use.
+    :param cache: The cache of conversion outputs.
+    :return: The result of the conversion.
+    """
+    start: float = perf_counter()
+    converted: list[Path] | BaseException | None = None
 
-def convert_queue[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | StatutoryFile](
+    try:
+        converter = _converter(database, root_dir, relative_root_dir, instructions, verbose, hashed_output_name)
+        cache_key: str | None = (
+            cache.key(converter, instructions.tool, instructions.output, instructions.options) if cache else None
+        )
+        if not cache_key or not cache.contains(cache_key):
+            converted = await converter.convert_async(output_dir, instructions.output, keep_relative_path=True)
+    except Exception as err:
+        converted = err
+
+    result: ConvertResult[M, O] = await to_thread(
+        convert,
+        context,
+        database,
+        output_dir,
+        root_dir,
+        relative_root_dir,
+        instructions,
+        verbose,
+        hashed_output_name,
+        logger,
+        cache,
+        converted,
+    )
+
+    return result._replace(duration=perf_counter() - start)
+
+
+def convert_batch[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | StatutoryFile](
     context: Context | str,
     database: FilesDB | None,
     output_dir: Path,
     root_dir: Path,
     relative_root_dir: Path,
-    queue: list[ConvertInstructions[M, O]],
+    batch: list[ConvertInstructions[M, O]],
     verbose: bool,
-    hashed_output_names: bool,
+    hashed_output_name: bool,
     logger: BoundLogger,
-) -> list[tuple[ConvertInstructions[M, O], list[ConvertedFile], ExceptionManager | None]]:
-    context_str: str = ".".join(context_commands(context)) if isinstance(context, Context) else context
-    return [
+    cache: ConvertCache | None = None,
+) -> list[ConvertResult[M, O]]:
+    """
+    Convert multiple files with the same converter, tool, output, and options at once.
+
+    The files are converted together with the ``convert_batch`` method of the converter, then each file is recorded
+    like in ``convert``. Files found in the cache are left out of the batch. Files the batch did not convert, and all
+    the files if the batch fails, are converted on their own.
+
+    :param context: The click context or the name of the command.
+    :param database: The database.
+    :param output_dir: The output directory.
+    :param root_dir: The root directory of the files.
+    :param relative_root_dir: The directory the converted files should be relative to.
+    :param batch: The instructions of the files.
+    :param verbose: Whether to show the output of the converter.
+    :param hashed_output_name: Whether to use hashed names for the output files.
+    :param logger: The logger to use.
+    :param cache: The cache of conversion outputs.
+    :return: The result of the conversion of each file.
+    """
+    outputs: list[list[Path] | None] = [None] * len(batch)
+    start: float = perf_counter()
+    share: float = 0.0
+
+    with ExceptionManager(Exception) as exception:
+        selected: list[int] = []
+        batch_converters: list[converters.ConverterABC] = []
+
+        for n, inst in enumerate(batch):
+            converter = _converter(database, root_dir, relative_root_dir, inst, verbose, hashed_output_name)
+            if cache and (key := cache.key(converter, inst.tool, inst.output, inst.options)) and cache.contains(key):
+                continue
+            selected.append(n)
+            batch_converters.append(converter)
+
+        if len(selected) > 1:
+            for n, paths in zip(
+                selected,
+                batch[0].converter_cls.convert_batch(batch_converters, output_dir, batch[0].output),
+                strict=True,
+            ):
+                outputs[n] = paths
+
+    if exception.exception is not None:
+        Event.from_command(context, "batch:error").log(
+            WARNING,
+            logger,
+            converter=f"{batch[0].tool}:{batch[0].output}",
+            files=len(batch),
+            error=exception.exception.__class__.__name__,
+        )
+    elif converted_files := sum(p is not None for p in outputs):
+        # The time of the batch is shared between its files, so that their durations can still be compared
+        share = (perf_counter() - start) / converted_files
+        Event.from_command(context, "batch").log(
+            INFO,
+            logger,
+            converter=f"{batch[0].tool}:{batch[0].output}",
+            files=len(batch),
+            converted=converted_files,
+            duration=round(perf_counter() - start, 3),
+        )
+
+    results: list[ConvertResult[M, O]] = [
         convert(
-            context_str,
+            context,
             database,
             output_dir,
             root_dir,
             relative_root_dir,
             inst,
             verbose,
-            hashed_output_names,
+            hashed_output_name,
             logger,
+            cache,
+            paths,
         )
-        for inst in queue
+        for inst, paths in zip(batch, outputs, strict=True)
     ]
+
+    return [
+        r._replace(duration=r.duration + share) if paths is not None else r
+        for r, paths in zip(results, outputs, strict=True)
+    ]
+
+
+def duplicate[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | StatutoryFile](
+    context: Context | str,
+    source: ConvertResult[M, O],
+    output_dir: Path,
+    root_dir: Path,
+    relative_root_dir: Path,
+    instructions: ConvertInstructions[M, O],
+    hashed_output_name: bool,
+    logger: BoundLogger,
+) -> ConvertResult[M, O]:
+    """
+    Reuse the outputs of a conversion for a file with the same content.
+
+    The outputs are hard-linked, or copied, to the paths the converter would have used for the duplicate file, and
+    their records are copied from those of the original outputs. If the conversion of the original file failed, its
+    error is returned for the duplicate file instead.
+
+    :param context: The click context or the name of the command.
+    :param source: The result of the conversion of the original file.
+    :param output_dir: The output directory.
+    :param root_dir: The root directory of the files.
+    :param relative_root_dir: The directory the converted files should be relative to.
+    :param instructions: The instructions for the duplicate file.
+    :param hashed_output_name: Whether to use hashed names for the output files.
+    :param logger: The logger to use.
+    :return: The result of the conversion of the duplicate file.
+    """
+    if source.error:
+        if not isinstance(source.error.exception, Exception):
+            raise source.error.exception
+        Event.from_command(context, "error", instructions.file).log(
+            ERROR,
+            logger,
+            converter=f"{instructions.tool}:{instructions.output}",
+            error=source.error.exception.__class__.__name__,
+            duplicate=source.instructions.file.name,
+        )
+        return ConvertResult(instructions, [], source.error, 0.0)
+
+    output_paths: list[Path] = []
+    start: float = perf_counter()
+
+    with ExceptionManager(BaseException) as exception:
+        source_paths: list[Path] = [f.get_absolute_path(root_dir) for f in source.output_files]
+        names = output_names(
+            _converter(None, root_dir, relative_root_dir, source.instructions, False, hashed_output_name),
+            output_dir,
+            instructions.output,
+            source_paths,
+        )
+        if names is None:
+            raise ConvertError(instructions.file, "Outputs are not inside the output directory")
+        output_paths = resolve_output_names(
+            _converter(None, root_dir, relative_root_dir, instructions, False, hashed_output_name),
+            output_dir,
+            instructions.output,
+            names,
+        )
+        for src, dst in zip(source_paths, output_paths, strict=True):
+            link_or_copy(src, dst)
+
+        output_files = [
+            f.model_copy(
+                update={
+                    "uuid": uuid4(),
+                    "relative_path": p.relative_to(root_dir),
+                    "original_uuid": instructions.file.uuid,
+                    "sequence": n,
+                }
+            )
+            for n, (f, p) in enumerate(zip(source.output_files, output_paths, strict=True))
+        ]
+
+        for file in output_files:
+            Event.from_command(context, "out", file).log(
+                INFO,
+                logger,
+                converter=f"{instructions.tool}:{instructions.output}",
+                original=instructions.file.name,
+                duplicate=source.instructions.file.name,
+                name=file.name,
+            )
+
+        return ConvertResult(instructions, output_files, None, perf_counter() - start)
+
+    for p in output_paths:
+        p.unlink(missing_ok=True)
+
+    if not isinstance(exception.exception, Exception):
+        raise exception.exception
+
+    Event.from_command(context, "error", instructions.file).log(
+        ERROR,
+        logger,
+        converter=f"{instructions.tool}:{instructions.output}",
+        error=exception.exception.__class__.__name__,
+        msg=" ".join(map(str, exception.exception.args)) or "",
+    )
+
+    return ConvertResult(instructions, [], exception, perf_counter() - start)
@@ -1,8 +1,14 @@
 from abc import ABC
 from abc import abstractmethod
+from asyncio import to_thread
+from collections import Counter
+from collections.abc import Generator
+from contextlib import contextmanager
 from functools import lru_cache
 from functools import reduce
 from hashlib import md5
+from io import BufferedWriter
+from io import TextIOWrapper
 from os import PathLike
 from pathlib import Path
 from shutil import which
@@ -11,13 +17,25 @@ from subprocess import TimeoutExpired
 from sys import platform
 from typing import Any
 from typing import ClassVar
+from typing import IO
+from typing import Literal
 
 from acacore.database import FilesDB
 from acacore.models.file import BaseFile
 
+from convertool.browser import BrowserServer
+from convertool.browser import BrowserServerError
+from convertool.digest import DigestWriter
+from convertool.digest import FileDigest
+from convertool.office import OfficeServer
+from convertool.office import OfficeServerError
+from convertool.util import ProcessStalled
 from convertool.util import run_process
+from convertool.util import run_process_async
+from convertool.util import TempDir
 
 from .exceptions import ConvertError
+from .exceptions import ConvertStalledError
 from .exceptions import ConvertTimeoutError
 from .exceptions import MissingDependency
 from .exceptions import OutputDirError
@@ -57,6 +75,14 @@ def _shared_process_timeout(*converters: type["ConverterABC"]) -> float | None:
     return max([c.process_timeout or 0.0 for c in converters], default=0.0) or None
 
 
+def _shared_process_cost(*converters: type["ConverterABC"]) -> tuple[float, float]:
+    return sum(c.process_cost[0] for c in converters), sum(c.process_cost[1] for c in converters)
+
+
+def _shared_memory_cost(*converters: type["ConverterABC"]) -> tuple[float, float]:
+    return max(c.memory_cost[0] for c in converters), max(c.memory_cost[1] for c in converters)
+
+
 def _hashed_file_name(path: str | PathLike[str]) -> str:
     return md5(str(path).encode("utf-8")).hexdigest() + dummy_base_file(path).suffixes
 
@@ -78,9 +104,14 @@ class ConverterABC(ABC):
     tool_names: ClassVar[list[str]]
     outputs: ClassVar[list[str]]
     process_timeout: ClassVar[float | None] = None
+    process_stall_timeout: ClassVar[float | None] = None
+    process_cost: ClassVar[tuple[float, float]] = (1.0, 0.0)
+    memory_cost: ClassVar[tuple[float, float]] = (100.0, 1.0)
     platforms: ClassVar[list[str] | None] = None
     dependencies: ClassVar[dict[str, list[str]] | None] = None
     multithreading: ClassVar[bool] = False
+    cacheable: ClassVar[bool] = True
+    batch_outputs: ClassVar[list[str]] = []
 
     def __init__(
         self,
@@ -100,6 +131,7 @@ class ConverterABC(ABC):
         self.options: dict[str, Any] = options or {}
         self.capture_output: bool = capture_output
         self.hashed_putput_name: bool = hashed_putput_name
+        self.output_digests: dict[Path, FileDigest] = {}
 
         self.test_options()
 
@@ -107,6 +139,32 @@ class ConverterABC(ABC):
     def match_tool(cls, tool: str, output: str) -> bool:
         return tool in cls.tool_names and output in cls.outputs
 
+    @classmethod
+    def estimate_cost(cls, file: BaseFile) -> float:
+        """
+        Estimate the time needed to convert a file.
+
+        The default estimate uses the ``process_cost`` of the converter, a tuple with the fixed cost in seconds of each
+        conversion and the cost in seconds for each megabyte of input.
+
+        :param file: The file to convert.
+        :return: The estimated duration of the conversion in seconds.
+        """
+        return cls.process_cost[0] + cls.process_cost[1] * (file.size or 0) / 1_000_000
+
+    @classmethod
+    def estimate_memory(cls, file: BaseFile) -> float:
+        """
+        Estimate the peak memory needed to convert a file.
+
+        The default estimate uses the ``memory_cost`` of the converter, a tuple with the fixed memory in megabytes of
+        each conversion and the memory in megabytes for each megabyte of input.
+
+        :param file: The file to convert.
+        :return: The estimated peak memory of the conversion in megabytes.
+        """
+        return cls.memory_cost[0] + cls.memory_cost[1] * (file.size or 0) / 1_000_000
+
     @classmethod
     @lru_cache
     def test(cls):
@@ -149,7 +207,12 @@ class ConverterABC(ABC):
         :raise BadOption: If the given options are invalid.
         """
 
-    def run_process(self, *args: str | int | PathLike, cwd: str | PathLike | None = None) -> tuple[str, str]:
+    def run_process(
+        self,
+        *args: str | int | PathLike,
+        cwd: str | PathLike | None = None,
+        environment: dict[str, str] | None = None,
+    ) -> tuple[str, str]:
         """
         Run process and capture output.
 
@@ -157,12 +220,23 @@ class ConverterABC(ABC):
 
         :param args: The arguments for ``subprocess.run``. Non-string arguments are cast to string.
         :param cwd: Optionally, the working directory to use.
+        :param environment: Optionally, extra environment variables for the process.
         :raise ConvertError: If the process exists with a non-zero code.
+        :raise ConvertStalledError: If the process stops making progress.
         :raise ConvertTimeoutError: If the process times out.
         :return: A tuple with the captured stdout and stderr outputs in string format.
         """
         try:
-            return run_process(*args, cwd=cwd, capture_output=self.capture_output, timeout=self.process_timeout)
+            return run_process(
+                *args,
+                cwd=cwd,
+                capture_output=self.capture_output,
+                timeout=self.process_timeout,
+                environment=environment,
+                stall_timeout=self.process_stall_timeout,
+            )
+        except ProcessStalled as err:
+            raise ConvertStalledError(self.file, f"The process made no progress for {err.timeout}s", err)
         except TimeoutExpired as err:
             raise ConvertTimeoutError(self.file, f"The process timed out after {err.timeout}s", err)
         except CalledProcessError as err:
@@ -172,6 +246,177 @@ class ConverterABC(ABC):
                 err,
             )
 
+    async def run_process_async(
+        self,
+        *args: str | int | PathLike,
+        cwd: str | PathLike | None = None,
+        environment: dict[str, str] | None = None,
+    ) -> tuple[str, str]:
+        """
+        Run process asynchronously and capture output.
+
+        If a ``CalledProcessError`` is raised, it is converted to ``ConvertError``.
+
+        :param args: The arguments of the process. Non-string arguments are cast to string.
+        :param cwd: Optionally, the working directory to use.
+        :param environment: Optionally, extra environment variables for the process.
+        :raise ConvertError: If the process exists with a non-zero code.
+        :raise ConvertStalledError: If the process stops making progress.
+        :raise ConvertTimeoutError: If the process times out.
+        :return: A tuple with the captured stdout and stderr outputs in string format.
+        """
+        try:
+            return await run_process_async(
+                *args,
+                cwd=cwd,
+                capture_output=self.capture_output,
+                timeout=self.process_timeout,
+                environment=environment,
+                stall_timeout=self.process_stall_timeout,
+            )
+        except ProcessStalled as err:
+            raise ConvertStalledError(self.file, f"The process made no progress for {err.timeout}s", err)
+        except TimeoutExpired as err:
+            raise ConvertTimeoutError(self.file, f"The process timed out after {err.timeout}s", err)
+        except CalledProcessError as err:
+            raise ConvertError(
+                self.file,
+                err.stderr or err.stdout or f"An unknown error occurred. Return code {err.returncode}",
+                err,
+            )
+
+    def run_office_server(self, server: OfficeServer, dest_dir: Path, output: str, output_filter: str) -> Path:
+        """
+        Convert the file with a running LibreOffice instance.
+
+        Errors are converted to ``ConvertError`` like in ``run_process``.
+
+        :param server: The LibreOffice server.
+        :param dest_dir: The directory where the output is saved.
+        :param output: The extension of the output.
+        :param output_filter: The name of the export filter, optionally followed by its options.
+        :raise ConvertError: If the conversion fails.
+        :raise ConvertTimeoutError: If the conversion times out.
+        :return: The path to the output.
+        """
+        try:
+            return server.convert(self.file.get_absolute_path(), dest_dir, output, output_filter, self.process_timeout)
+        except TimeoutExpired as err:
+            raise ConvertTimeoutError(self.file, f"The process timed out after {err.timeout}s", err)
+        except OfficeServerError as err:
+            raise ConvertError(self.file, str(err) or f"An unknown error occurred in {server.command}")
+
+    # noinspection PyUnusedLocal
+    @classmethod
+    def convert_batch(
+        cls,
+        converters: list["ConverterABC"],
+        output_dir: Path,  # noqa: ARG003
+        output: str,  # noqa: ARG003
+        *,
+        keep_relative_path: bool = True,  # noqa: ARG003
+    ) -> list[list[Path] | None]:
+        """
+        Convert multiple files at once.
+
+        Only outputs listed in ``batch_outputs`` can be converted in batches. The default implementation converts
+        nothing, so that each file is converted on its own.
+
+        :param converters: The converter instances of the files, all with the same options.
+        :param output_dir: The output directory.
+        :param output: The output extension.
+        :param keep_relative_path: Whether to keep the relative path of the files in the output directory.
+        :return: The paths to the outputs of each file, or ``None`` for the files that were not converted.
+        """
+        return [None] * len(converters)
+
+    @classmethod
+    def run_office_batch(
+        cls,
+        converters: list["ConverterABC"],
+        output_dir: Path,
+        output: str,
+        output_filter: str,
+        *,
+        keep_relative_path: bool = True,
+    ) -> list[list[Path] | None]:
+        """
+        Convert multiple files with a single LibreOffice process.
+
+        LibreOffice names the outputs after the files, so files with the same name are left to be converted on their
+        own. The timeout of the process is the sum of the timeouts of the files. Files whose output is missing after
+        the process exits are not converted.
+
+        :param converters: The converter instances of the files.
+        :param output_dir: The output directory.
+        :param output: The extension of the output.
+        :param output_filter: The export filter and its options, or an empty string for the default filter.
+        :param keep_relative_path: Whether to keep the relative path of the files in the output directory.
+        :raise ConvertError: If the process fails.
+        :raise ConvertStalledError: If the process stops making progress.
+        :raise ConvertTimeoutError: If the process times out.
+        :return: The paths to the outputs of each file, or ``None`` for the files that were not converted.
+        """
+        results: list[list[Path] | None] = [None] * len(converters)
+        stems: Counter[str] = Counter(c.file.get_absolute_path().stem for c in converters)
+        batch: list[tuple[int, ConverterABC]] = [
+            (n, c) for n, c in enumerate(converters) if stems[c.file.get_absolute_path().stem] == 1
+        ]
+
+        if len(batch) < 2:
+            return results
+
+        runner: ConverterABC = batch[0][1]
+        process_timeout: float | None = runner.process_timeout
+
+        with TempDir(output_dir) as tmp_dir:
+            try:
+                runner.process_timeout = (
+                    sum(c.process_timeout for _, c in batch) if all(c.process_timeout for _, c in batch) else None
+                )
+                runner.run_process(
+                    cls.dependencies["libreoffice"][0],
+                    "--headless",
+                    "--convert-to",
+                    f"{output}:{output_filter}" if output_filter else output,
+                    "--outdir",
+                    tmp_dir,
+                    f"-env:UserInstallation={tmp_dir.joinpath('_libreoffice').as_uri()}",
+                    *(c.file.get_absolute_path() for _, c in batch),
+                    cwd=tmp_dir,
+                )
+            finally:
+                runner.process_timeout = process_timeout
+
+            for n, converter in batch:
+                if (tmp_file := tmp_dir.joinpath(f"{converter.file.get_absolute_path().stem}.{output}")).is_file():
+                    dest_dir: Path = converter.output_dir(output_dir, keep_relative_path=keep_relative_path)
+                    dest_dir.mkdir(parents=True, exist_ok=True)
+                    results[n] = [tmp_file.replace(dest_dir / tmp_file.name)]
+
+        return results
+
+    def run_browser_server(self, server: BrowserServer, dest_file: Path) -> Path:
+        """
+        Print the file to PDF with a running chromium instance.
+
+        Errors are converted to ``ConvertError`` like in ``run_process``.
+
+        :param server: The chromium server.
+        :param dest_file: The path to the output file.
+        :raise ConvertError: If the conversion fails.
+        :raise ConvertTimeoutError: If the conversion times out.
+        :return: The path to the output file.
+        """
+        try:
+            with self.open_output(dest_file) as fh:
+                server.print_to_pdf(self.file.get_absolute_path(), fh, self.process_timeout)
+            return dest_file
+        except TimeoutExpired as err:
+            raise ConvertTimeoutError(self.file, f"The process timed out after {err.timeout}s", err)
+        except BrowserServerError as err:
+            raise ConvertError(self.file, str(err) or f"An unknown error occurred in {server.command}")
+
     def output_dir(self, output_dir: Path, *, keep_relative_path: bool = True, mkdir: bool = False) -> Path:
         """
         Compute the output directory and check if it is a valid directory path.
@@ -219,6 +464,63 @@ class ConverterABC(ABC):
             return output_dir.joinpath(f"{name}.{output}")
         return output_dir.joinpath(f"{name.removesuffix(self.file.suffixes)}.{output}")
 
+    @contextmanager
+    def open_output(
+        self,
+        path: Path,
+        mode: Literal["w", "wb"] = "wb",
+        encoding: str | None = None,
+        newline: str | None = None,
+    ) -> Generator[IO, None, None]:
+        """
+        Open an output file for writing, and hash its contents while they are written.
+
+        The digest is stored in ``output_digests`` when the file is closed, so the file does not need to be read again
+        to create its record.
+
+        :param path: The path to the output file.
+        :param mode: The mode to open the file with, "w" for text or "wb" for binary.
+        :param encoding: The encoding to use in text mode.
+        :param newline: The newline translation to use in text mode.
+        :return: The opened file.
+        """
+        with path.open("wb") as fh:
+            writer = DigestWriter(fh)
+            stream: IO = (
+                BufferedWriter(writer)
+                if mode == "wb"
+                else TextIOWrapper(BufferedWriter(writer), encoding=encoding, newline=newline)
+            )
+            with stream:
+                yield stream
+        self.output_digests[path] = writer.digest()
+
+    def write_output(self, path: Path, data: str | bytes, encoding: str | None = None) -> Path:
+        """
+        Write an output file and hash its contents while they are written.
+
+        :param path: The path to the output file.
+        :param data: The contents of the file. Strings are written in text mode like ``Path.write_text``.
+        :param encoding: The encoding to use for strings.
+        :return: The path to the output file.
+        """
+        with self.open_output(path, "wb" if isinstance(data, bytes) else "w", encoding) as fh:
+            fh.write(data)
+        return path
+
+    def replace_output(self, src: Path, dst: Path) -> Path:
+        """
+        Move an output file, keeping its digest if it was hashed while it was written.
+
+        :param src: The current path to the output file.
+        :param dst: The new path to the output file.
+        :return: The new path to the output file.
+        """
+        src.replace(dst)
+        if (digest := self.output_digests.pop(src, None)) is not None:
+            self.output_digests[dst] = digest
+        return dst
+
     # noinspection PyMethodMayBeStatic
     def output_puid(self, output: str) -> str | None:  # noqa: ARG002
         """
@@ -231,3 +533,18 @@ class ConverterABC(ABC):
 
     @abstractmethod
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]: ...
+
+    async def convert_async(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
+        """
+        Convert the file asynchronously.
+
+        Converters that only wait on external processes can override this method to use ``run_process_async``, the
+        default implementation runs ``convert`` in a separate thread.
+
+        :param output_dir: The base output path.
+        :param output: The desired output.
+        :param keep_relative_path: ``True`` if the output path should include the file's parent directories relative to
+            its root.
+        :return: The paths to the output files.
+        """
+        return await to_thread(self.convert, output_dir, output, keep_relative_path=keep_relative_path)
@@ -14,7 +14,11 @@ class ConverterAudio(ConverterABC):
         "flac",
     ]
     process_timeout: ClassVar[float] = 1800
+    process_stall_timeout: ClassVar[float] = 120.0
+    process_cost: ClassVar[tuple[float, float]] = (1.0, 2.0)
+    memory_cost: ClassVar[tuple[float, float]] = (200.0, 0.0)
     dependencies: ClassVar[dict[str, list[str]]] = {"ffmpeg": ["ffmpeg"]}
+    multithreading: ClassVar[bool] = True
 
     def output_puid(self, output: str) -> str | None:
         if output == "mp3":
@@ -25,10 +29,7 @@ class ConverterAudio(ConverterABC):
             return "fmt/279"
         return None
 
-    def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
-        output = self.output(output)
-        dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path)
-        dest_file: Path = self.output_file(dest_dir, output)
+    def _arguments(self, dest_file: Path, output: str) -> list[str | Path]:
         arguments: list[str] = []
 
         if output == "mp3":
@@ -36,20 +37,38 @@ class ConverterAudio(ConverterABC):
         elif output == "wav":
             arguments.extend(["-c:a", "pcm_s16le"])
 
+        return [
+            self.dependencies["ffmpeg"][0],
+            "-i",
+            self.file.get_absolute_path(),
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-stats",
+            "-vn",
+            *arguments,
+            dest_file.name,
+        ]
+
+    def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
+        output = self.output(output)
+        dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path)
+        dest_file: Path = self.output_file(dest_dir, output)
+
+        with TempDir(output_dir) as tmp_dir:
+            self.run_process(*self._arguments(dest_file, output), cwd=tmp_dir)
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            tmp_dir.joinpath(dest_file.name).replace(dest_file)
+
+        return [dest_file]
+
+    async def convert_async(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
+        output = self.output(output)
+        dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path)
+        dest_file: Path = self.output_file(dest_dir, output)
+
         with TempDir(output_dir) as tmp_dir:
-            self.run_process(
-                self.dependencies["ffmpeg"][0],
-                "-i",
-                self.file.get_absolute_path(),
-                "-nostdin",
-                "-loglevel",
-                "error",
-                "-stats",
-                "-vn",
-                *arguments,
-                dest_file.name,
-                cwd=tmp_dir,
-            )
+            await self.run_process_async(*self._arguments(dest_file, output), cwd=tmp_dir)
             dest_dir.mkdir(parents=True, exist_ok=True)
             tmp_dir.joinpath(dest_file.name).replace(dest_file)
 
@@ -10,6 +10,7 @@ class ConverterCAD(ConverterABC):
     tool_names: ClassVar[list[str]] = ["cad"]
     outputs: ClassVar[list[str]] = ["dxf", "pdf", "svg"]
     process_timeout: ClassVar[float] = 120
+    process_cost: ClassVar[tuple[float, float]] = (5.0, 2.0)
     platforms: ClassVar[list[str]] = ["win32"]
     dependencies: ClassVar[dict[str, list[str]]] = {"abviewer": ["ABViewer"]}
 
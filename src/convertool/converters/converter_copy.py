@@ -1,13 +1,18 @@
 from pathlib import Path
-from shutil import copy2
 from typing import ClassVar
 
+from convertool.util import fast_copy
+
 from .base import ConverterABC
 
 
 class ConverterCopy(ConverterABC):
     tool_names: ClassVar[list[str]] = ["copy"]
     outputs: ClassVar[list[str]] = ["copy"]
+    process_cost: ClassVar[tuple[float, float]] = (0.05, 0.01)
+    memory_cost: ClassVar[tuple[float, float]] = (10.0, 0.0)
+    multithreading: ClassVar[bool] = True
+    cacheable: ClassVar[bool] = False
 
     @classmethod
     def match_tool(cls, tool: str, output: str) -> bool:  # noqa: ARG003
@@ -22,5 +27,5 @@ class ConverterCopy(ConverterABC):
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path, mkdir=True)
         dest_file: Path = self.output_file(dest_dir, output)
-        copy2(self.file.get_absolute_path(), dest_file)
+        fast_copy(self.file.get_absolute_path(), dest_file)
         return [dest_file]
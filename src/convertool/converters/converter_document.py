@@ -1,10 +1,13 @@
 from pathlib import Path
 from typing import ClassVar
 
+from convertool.office import office_server
 from convertool.util import TempDir
 
 from .base import _shared_dependencies
+from .base import _shared_memory_cost
 from .base import _shared_platforms
+from .base import _shared_process_cost
 from .base import _shared_process_timeout
 from .base import ConverterABC
 from .base import dummy_base_file
@@ -15,7 +18,17 @@ class ConverterDocument(ConverterABC):
     tool_names: ClassVar[list[str]] = ["document"]
     outputs: ClassVar[list[str]] = ["odt", "pdf", "html"]
     process_timeout: ClassVar[float] = 60.0
+    process_stall_timeout: ClassVar[float] = 15.0
+    process_cost: ClassVar[tuple[float, float]] = (5.0, 2.0)
+    memory_cost: ClassVar[tuple[float, float]] = (500.0, 10.0)
     dependencies: ClassVar[dict[str, list[str]]] = {"libreoffice": ["libreoffice", "soffice"]}
+    office_filters: ClassVar[dict[str, str]] = {
+        "odt": "writer8",
+        "pdf": "writer_pdf_Export",
+        "html": "HTML (StarWriter)",
+    }
+    batch_outputs: ClassVar[list[str]] = ["odt", "pdf"]
+    multithreading: ClassVar[bool] = True
 
     def output_puid(self, output: str) -> str | None:
         if output == "html":
@@ -28,25 +41,47 @@ class ConverterDocument(ConverterABC):
             return 'writer_pdf_Export:{"SelectPdfVersion":3}'
         return ""
 
+    @classmethod
+    def convert_batch(
+        cls,
+        converters: list[ConverterABC],
+        output_dir: Path,
+        output: str,
+        *,
+        keep_relative_path: bool = True,
+    ) -> list[list[Path] | None]:
+        if office_server(cls.dependencies["libreoffice"][0]):
+            return super().convert_batch(converters, output_dir, output, keep_relative_path=keep_relative_path)
+        output = converters[0].output(output)
+        return cls.run_office_batch(
+            converters,
+            output_dir,
+            output,
+            converters[0].output_filter(output),
+            keep_relative_path=keep_relative_path,
+        )
+
     # noinspection DuplicatedCode
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
         output_filter: str = self.output_filter(output)
         dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path)
 
-        output_filter = f":{output_filter}" if output_filter else ""
-
         with TempDir(output_dir) as tmp_dir:
-            self.run_process(
-                self.dependencies["libreoffice"][0],
-                "--headless",
-                "--convert-to",
-                f"{output}{output_filter}" if output_filter else output,
-                "--outdir",
-                tmp_dir,
-                f"-env:UserInstallation={tmp_dir.joinpath('_libreoffice').as_uri()}",
-                self.file.get_absolute_path(),
-            )
+            if server := office_server(self.dependencies["libreoffice"][0]):
+                self.run_office_server(server, tmp_dir, output, output_filter or self.office_filters[output])
+            else:
+                self.run_process(
+                    self.dependencies["libreoffice"][0],
+                    "--headless",
+                    "--convert-to",
+                    f"{output}:{output_filter}" if output_filter else output,
+                    "--outdir",
+                    tmp_dir,
+                    f"-env:UserInstallation={tmp_dir.joinpath('_libreoffice').as_uri()}",
+                    self.file.get_absolute_path(),
+                    cwd=tmp_dir,
+                )
             dest_dir.mkdir(parents=True, exist_ok=True)
             return [f.replace(dest_dir / f.name) for f in tmp_dir.iterdir() if f.is_file()]
 
@@ -57,6 +92,9 @@ class ConverterDocumentToImage(ConverterABC):
     platforms: ClassVar[list[str]] = _shared_platforms(ConverterDocument, ConverterPDFToImage)
     dependencies: ClassVar[list[str] | None] = _shared_dependencies(ConverterDocument, ConverterPDFToImage)
     process_timeout: ClassVar[float | None] = _shared_process_timeout(ConverterDocument, ConverterPDFToImage)
+    process_cost: ClassVar[tuple[float, float]] = _shared_process_cost(ConverterDocument, ConverterPDFToImage)
+    memory_cost: ClassVar[tuple[float, float]] = _shared_memory_cost(ConverterDocument, ConverterPDFToImage)
+    multithreading: ClassVar[bool] = True
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
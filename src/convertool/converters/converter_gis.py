@@ -9,8 +9,10 @@ class ConverterGIS(ConverterABC):
     tool_names: ClassVar[list[str]] = ["gis"]
     outputs: ClassVar[list[str]] = ["gml"]
     process_timeout: ClassVar[float] = 120
+    process_cost: ClassVar[tuple[float, float]] = (1.0, 1.0)
     platforms: ClassVar[list[str]] = ["linux"]
     dependencies: ClassVar[dict[str, list[str]]] = {"ogr2ogr": ["ogr2ogr"]}
+    multithreading: ClassVar[bool] = True
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
@@ -28,5 +30,5 @@ class ConverterGIS(ConverterABC):
                 self.file.get_absolute_path(),
                 cwd=tmp_dir,
             )
-
+            dest_dir.mkdir(parents=True, exist_ok=True)
             return [f.replace(dest_dir / f.name) for f in tmp_dir.iterdir() if f.is_file()]
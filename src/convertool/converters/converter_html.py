@@ -1,10 +1,13 @@
 from pathlib import Path
 from typing import ClassVar
 
+from convertool.browser import browser_server
 from convertool.util import TempDir
 
 from .base import _shared_dependencies
+from .base import _shared_memory_cost
 from .base import _shared_platforms
+from .base import _shared_process_cost
 from .base import _shared_process_timeout
 from .base import ConverterABC
 from .base import dummy_base_file
@@ -16,6 +19,10 @@ class ConverterHTML(ConverterABC):
     outputs: ClassVar[list[str]] = ["pdf"]
     dependencies: ClassVar[dict[str, list[str]]] = {"chromium": ["chromium", "chromium-browser"]}
     process_timeout: ClassVar[float] = 60
+    process_stall_timeout: ClassVar[float] = 30.0
+    process_cost: ClassVar[tuple[float, float]] = (3.0, 1.0)
+    memory_cost: ClassVar[tuple[float, float]] = (1000.0, 5.0)
+    multithreading: ClassVar[bool] = True
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
@@ -24,17 +31,21 @@ class ConverterHTML(ConverterABC):
 
         with TempDir(output_dir) as tmp_dir:
             tmp_file = tmp_dir.joinpath("output.pdf")
-            self.run_process(
-                self.dependencies["chromium"][0],
-                "--headless",
-                "--no-sandbox",
-                f"--print-to-pdf={tmp_file}",
-                "--no-pdf-header-footer",
-                self.file.get_absolute_path(),
-                cwd=tmp_dir,
-            )
+            if server := browser_server(self.dependencies["chromium"][0]):
+                self.run_browser_server(server, tmp_file)
+            else:
+                self.run_process(
+                    self.dependencies["chromium"][0],
+                    "--headless",
+                    "--no-sandbox",
+                    f"--user-data-dir={tmp_dir.joinpath('_chromium')}",
+                    f"--print-to-pdf={tmp_file}",
+                    "--no-pdf-header-footer",
+                    self.file.get_absolute_path(),
+                    cwd=tmp_dir,
+                )
             dest_dir.mkdir(parents=True, exist_ok=True)
-            tmp_file.replace(dest_file)
+            self.replace_output(tmp_file, dest_file)
 
         return [dest_file]
 
@@ -45,6 +56,9 @@ class ConverterHTMLToImage(ConverterABC):
     platforms: ClassVar[list[str] | None] = _shared_platforms(ConverterHTML, ConverterPDFToImage)
     dependencies: ClassVar[dict[str, list[str]]] = _shared_dependencies(ConverterHTML, ConverterPDFToImage)
     process_timeout: ClassVar[float | None] = _shared_process_timeout(ConverterHTML, ConverterPDFToImage)
+    process_cost: ClassVar[tuple[float, float]] = _shared_process_cost(ConverterHTML, ConverterPDFToImage)
+    memory_cost: ClassVar[tuple[float, float]] = _shared_memory_cost(ConverterHTML, ConverterPDFToImage)
+    multithreading: ClassVar[bool] = True
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
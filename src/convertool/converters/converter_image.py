@@ -1,9 +1,14 @@
 from pathlib import Path
+from shutil import which
 from typing import ClassVar
 
 from convertool.util import TempDir
 
 from .base import ConverterABC
+from .exceptions import BadOption
+from .exceptions import ConvertError
+from .exceptions import ConvertStalledError
+from .exceptions import ConvertTimeoutError
 
 
 class ConverterImage(ConverterABC):
@@ -18,17 +23,49 @@ class ConverterImage(ConverterABC):
         "pdf",
     ]
     process_timeout: ClassVar[float] = 180.0
+    process_stall_timeout: ClassVar[float] = 120.0
+    process_cost: ClassVar[tuple[float, float]] = (1.0, 1.0)
+    memory_cost: ClassVar[tuple[float, float]] = (300.0, 20.0)
     dependencies: ClassVar[dict[str, list[str]]] = {"imagemagick": ["magick", "convert"]}
+    multithreading: ClassVar[bool] = True
+    vips_outputs: ClassVar[list[str]] = ["jpg", "png", "tif", "jp2"]
+    vips_min_pixels: ClassVar[int] = 25_000_000
+    vips_save_options: ClassVar[dict[str, str]] = {"jp2": "[lossless]", "jpg": "[Q=92]"}
 
-    def image_dpi(self, file: Path, default_density: int = 150) -> tuple[int, int]:
+    def test_options(self):
+        if self.options.get("engine", "auto") not in ("auto", "vips", "imagemagick"):
+            raise BadOption(self.file, f"Unsupported engine {self.options['engine']!r}.")
+
+    # noinspection PyMethodMayBeStatic
+    def magick_environment(self, tmp_dir: Path) -> dict[str, str]:
+        """
+        Get the environment variables that keep the temporary files of ImageMagick and its delegates in a directory.
+
+        The files are placed in a subdirectory, so they are never mistaken for output files.
+
+        :param tmp_dir: The temporary directory of the conversion.
+        :return: A dictionary of environment variables.
+        """
+        magick_tmp_dir: Path = tmp_dir.joinpath("_magick")
+        magick_tmp_dir.mkdir(exist_ok=True)
+        return {"MAGICK_TEMPORARY_PATH": str(magick_tmp_dir), "TMPDIR": str(magick_tmp_dir)}
+
+    def image_dpi(self, file: Path, default_density: int = 150, tmp_dir: Path | None = None) -> tuple[int, int]:
         """
         Find maximum DPI of an image/PDF and return the number of pages in it.
 
         :param file: The path to the image/PDf.
         :param default_density: The default max DPI value.
+        :param tmp_dir: Optionally, the directory to use for temporary files.
         :return: The DPI and the number of pages in the file.
         """
-        density_stdout, _ = self.run_process("identify", "-format", r"%x,%y\n", file)
+        density_stdout, _ = self.run_process(
+            "identify",
+            "-format",
+            r"%x,%y\n",
+            file,
+            environment=self.magick_environment(tmp_dir) if tmp_dir else None,
+        )
         density: int = default_density
         pages: int = 0
 
@@ -41,6 +78,82 @@ class ConverterImage(ConverterABC):
 
         return density, pages
 
+    def vips_header(self, file: Path, tmp_dir: Path | None = None) -> dict[str, str] | None:
+        """
+        Read the header of an image with vips.
+
+        :param file: The path to the image.
+        :param tmp_dir: Optionally, the directory to use for temporary files.
+        :return: The fields of the header, or ``None`` if vips is not installed or cannot load the image.
+        """
+        if not (vipsheader := which("vipsheader")):
+            return None
+
+        try:
+            stdout, _ = self.run_process(
+                vipsheader,
+                "-a",
+                file,
+                environment=self.magick_environment(tmp_dir) if tmp_dir else None,
+            )
+        except ConvertError:
+            return None
+
+        return {k.strip(): v.strip() for k, _, v in (line.partition(":") for line in stdout.splitlines())}
+
+    def vips_command(self, file: Path, output: str, dest_file: Path, tmp_dir: Path) -> list[str] | None:
+        """
+        Get the vips command for the conversion, if vips should be used instead of ImageMagick.
+
+        vips decodes images in tiles as they are written, instead of loading them in memory, so it is used for large
+        images, or for all images if the "engine" option is "vips". Outputs that vips cannot write, images it cannot
+        read, images with multiple pages or frames, CMYK images, layered images, and paths vips would parse as options
+        are converted with ImageMagick.
+        The "engine" option can also be set to "imagemagick" to never use vips.
+
+        :param file: The path to the image.
+        :param output: The output extension.
+        :param dest_file: The path to the output file.
+        :param tmp_dir: The temporary directory of the conversion.
+        :return: The arguments of the vips command, or ``None`` if ImageMagick should be used.
+        """
+        engine: str = self.options.get("engine", "auto")
+
+        if (
+            engine == "imagemagick"
+            or output not in self.vips_outputs
+            or self.options.get("layers") in ("true", "TRUE", True)
+            or "[" in str(file)
+            or "[" in str(dest_file)
+            or not (vips := which("vips"))
+            or not (header := self.vips_header(file, tmp_dir))
+        ):
+            return None
+
+        try:
+            width, height, bands = int(header["width"]), int(header["height"]), int(header["bands"])
+            pages: int = int(header.get("n-pages", "1"))
+        except (KeyError, ValueError):
+            return None
+
+        if pages > 1 or header.get("interpretation") == "cmyk":
+            return None
+        if engine == "auto" and width * height < self.vips_min_pixels:
+            return None
+
+        if output == "tif":
+            # Same as the LZW compression and 16 bits depth used with ImageMagick
+            return [
+                vips,
+                "colourspace",
+                str(file),
+                f"{dest_file}[compression=lzw]",
+                "grey16" if bands <= 2 else "rgb16",
+            ]
+
+        # The defaults of vips are lossy for JPEG 2000 and use a lower quality for JPEG than ImageMagick
+        return [vips, "copy", str(file), f"{dest_file}{self.vips_save_options.get(output, '')}"]
+
     def output(self, output: str) -> str:
         if output == "jpeg":
             output = "jpg"
@@ -64,13 +177,23 @@ class ConverterImage(ConverterABC):
             args.extend(("-coalesce",))
 
         with TempDir(output_dir) as tmp_dir:
-            self.run_process(
-                self.dependencies["imagemagick"][0],
-                filename,
-                *args,
-                dest_file.name,
-                cwd=tmp_dir,
-            )
+            if vips_command := self.vips_command(filename, output, tmp_dir.joinpath(dest_file.name), tmp_dir):
+                try:
+                    self.run_process(*vips_command, cwd=tmp_dir, environment=self.magick_environment(tmp_dir))
+                except (ConvertTimeoutError, ConvertStalledError):
+                    raise
+                except ConvertError:
+                    # The build of vips may lack the encoder, fall back on ImageMagick
+                    vips_command = None
+            if not vips_command:
+                self.run_process(
+                    self.dependencies["imagemagick"][0],
+                    filename,
+                    *args,
+                    dest_file.name,
+                    cwd=tmp_dir,
+                    environment=self.magick_environment(tmp_dir),
+                )
             dest_dir.mkdir(parents=True, exist_ok=True)
             tmp_dir.joinpath(dest_file.name).replace(dest_file)
 
@@ -79,6 +202,8 @@ class ConverterImage(ConverterABC):
 
 class ConverterPDFToImage(ConverterImage):
     tool_names: ClassVar[list[str]] = ["pdf"]
+    process_cost: ClassVar[tuple[float, float]] = (2.0, 5.0)
+    memory_cost: ClassVar[tuple[float, float]] = (1000.0, 50.0)
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
@@ -89,10 +214,10 @@ class ConverterPDFToImage(ConverterImage):
         if output in ("tif", "tiff"):
             args = ["-compress", "LZW", "-depth", "16"]
 
-        density, _ = self.image_dpi(self.file.get_absolute_path())
-        density *= 2
-
         with TempDir(output_dir) as tmp_dir:
+            density, _ = self.image_dpi(self.file.get_absolute_path(), tmp_dir=tmp_dir)
+            density *= 2
+
             self.run_process(
                 self.dependencies["imagemagick"][0],
                 "-density",
@@ -103,6 +228,7 @@ class ConverterPDFToImage(ConverterImage):
                 self.file.get_absolute_path(),
                 dest_file.name,
                 cwd=tmp_dir,
+                environment=self.magick_environment(tmp_dir),
             )
 
             dest_dir.mkdir(parents=True, exist_ok=True)
@@ -113,16 +239,17 @@ class ConverterPDFToImage(ConverterImage):
 class ConverterPDFLargeToImage(ConverterImage):
     tool_names: ClassVar[list[str]] = ["pdf-large"]
     outputs: ClassVar[list[str]] = ["tif", "tiff"]
+    process_cost: ClassVar[tuple[float, float]] = (5.0, 10.0)
+    memory_cost: ClassVar[tuple[float, float]] = (1000.0, 20.0)
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
         dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path)
         dest_file: Path = self.output_file(dest_dir, output)
 
-        density, pages = self.image_dpi(self.file.get_absolute_path())
-        density *= 2
-
         with TempDir(output_dir) as tmp_dir:
+            density, pages = self.image_dpi(self.file.get_absolute_path(), tmp_dir=tmp_dir)
+            density *= 2
             page_files: list[str] = []
 
             for page in range(pages):
@@ -136,6 +263,7 @@ class ConverterPDFLargeToImage(ConverterImage):
                     f"{self.file.get_absolute_path()}[{page}]",
                     page_files[-1],
                     cwd=tmp_dir,
+                    environment=self.magick_environment(tmp_dir),
                 )
 
             self.run_process(
@@ -149,6 +277,7 @@ class ConverterPDFLargeToImage(ConverterImage):
                 f"{tmp_dir.name}-*.jpg",
                 dest_file.name,
                 cwd=tmp_dir,
+                environment=self.magick_environment(tmp_dir),
             )
 
             dest_dir.mkdir(parents=True, exist_ok=True)
@@ -161,6 +290,8 @@ class ConverterTextToImage(ConverterImage):
         "text",
         "text-to-image",
     ]
+    process_cost: ClassVar[tuple[float, float]] = (2.0, 10.0)
+    memory_cost: ClassVar[tuple[float, float]] = (200.0, 0.0)
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
@@ -194,6 +325,7 @@ class ConverterTextToImage(ConverterImage):
                 text,
                 dest_file.name,
                 cwd=tmp_dir,
+                environment=self.magick_environment(tmp_dir),
             )
             dest_dir.mkdir(parents=True, exist_ok=True)
             tmp_dir.joinpath(dest_file.name).replace(dest_file)
@@ -5,7 +5,9 @@ from typing import ClassVar
 from convertool.util import TempDir
 
 from .base import _shared_dependencies
+from .base import _shared_memory_cost
 from .base import _shared_platforms
+from .base import _shared_process_cost
 from .base import _shared_process_timeout
 from .base import ConverterABC
 from .base import dummy_base_file
@@ -17,6 +19,7 @@ class ConverterMDI(ConverterABC):
     tool_names: ClassVar[list[str]] = ["mdi"]
     outputs: ClassVar[list[str]] = ["tif", "tiff"]
     process_timeout: ClassVar[float] = 120
+    process_cost: ClassVar[tuple[float, float]] = (2.0, 1.0)
     platforms: ClassVar[list[str]] = ["win32"]
     dependencies: ClassVar[dict[str, list[str]]] = {"mdi2tif": ["mdi2tif"]}
 
@@ -57,6 +60,8 @@ class ConverterMDIToPDF(ConverterABC):
     tool_names: ClassVar[list[str]] = ["mdi"]
     outputs: ClassVar[list[str]] = ["pdf"]
     process_timeout: ClassVar[float] = _shared_process_timeout(ConverterMDI, ConverterImage)
+    process_cost: ClassVar[tuple[float, float]] = _shared_process_cost(ConverterMDI, ConverterImage)
+    memory_cost: ClassVar[tuple[float, float]] = _shared_memory_cost(ConverterMDI, ConverterImage)
     platforms: ClassVar[list[str]] = _shared_platforms(ConverterMDI, ConverterImage)
     dependencies: ClassVar[dict[str, list[str]]] = _shared_dependencies(ConverterMDI, ConverterImage)
 
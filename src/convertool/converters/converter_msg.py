@@ -20,7 +20,9 @@ from striprtf.striprtf import rtf_to_text
 from convertool.util import TempDir
 
 from .base import _shared_dependencies
+from .base import _shared_memory_cost
 from .base import _shared_platforms
+from .base import _shared_process_cost
 from .base import _shared_process_timeout
 from .base import ConverterABC
 from .base import dummy_base_file
@@ -177,6 +179,8 @@ def msg_plain_body(msg: MessageBase) -> str:
 class ConverterMSG(ConverterABC):
     tool_names: ClassVar[list[str]] = ["msg"]
     outputs: ClassVar[list[str]] = ["html", "txt"]
+    process_cost: ClassVar[tuple[float, float]] = (0.2, 0.1)
+    multithreading: ClassVar[bool] = True
 
     def output_puid(self, output: str) -> str | None:
         if output == "txt":
@@ -200,7 +204,7 @@ class ConverterMSG(ConverterABC):
                 body = msg_plain_body(msg)
 
             dest_dir.mkdir(parents=True, exist_ok=True)
-            dest_file.write_text(body, encoding="utf-8")
+            self.write_output(dest_file, body, "utf-8")
 
             return [dest_file]
         except Exception as e:
@@ -213,6 +217,9 @@ class ConverterMSGToPDF(ConverterABC):
     platforms: ClassVar[list[str]] = _shared_platforms(ConverterMSG, ConverterPDFToImage)
     dependencies: ClassVar[list[str] | None] = _shared_dependencies(ConverterMSG, ConverterPDFToImage)
     process_timeout: ClassVar[float | None] = _shared_process_timeout(ConverterMSG, ConverterPDFToImage)
+    process_cost: ClassVar[tuple[float, float]] = _shared_process_cost(ConverterMSG, ConverterPDFToImage)
+    memory_cost: ClassVar[tuple[float, float]] = _shared_memory_cost(ConverterMSG, ConverterPDFToImage)
+    multithreading: ClassVar[bool] = True
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
@@ -236,6 +243,9 @@ class ConverterMSGToImage(ConverterABC):
     platforms: ClassVar[list[str]] = _shared_platforms(ConverterMSG, ConverterHTMLToImage)
     dependencies: ClassVar[list[str] | None] = _shared_dependencies(ConverterMSG, ConverterHTMLToImage)
     process_timeout: ClassVar[float | None] = _shared_process_timeout(ConverterMSG, ConverterHTMLToImage)
+    process_cost: ClassVar[tuple[float, float]] = _shared_process_cost(ConverterMSG, ConverterHTMLToImage)
+    memory_cost: ClassVar[tuple[float, float]] = _shared_memory_cost(ConverterMSG, ConverterHTMLToImage)
+    multithreading: ClassVar[bool] = True
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
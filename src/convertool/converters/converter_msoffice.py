@@ -10,6 +10,7 @@ from convertool.util import TempDir
 class ConverterMSOffice(ConverterABC):
     platforms: ClassVar[list[str]] = ["win32"]
     dependencies: ClassVar[dict[str, list[str]]] = {"docto": ["docto"]}
+    process_cost: ClassVar[tuple[float, float]] = (10.0, 2.0)
     _application: ClassVar[str]
 
     @abstractmethod
@@ -10,6 +10,8 @@ class ConverterPDF(ConverterABC):
     tool_names: ClassVar[list[str]] = ["pdf"]
     outputs: ClassVar[list[str]] = ["pdfa-1", "pdfa-2", "pdfa-3"]
     dependencies: ClassVar[dict[str, list[str]]] = {"ghostscript": ["gs"]}
+    process_cost: ClassVar[tuple[float, float]] = (2.0, 2.0)
+    multithreading: ClassVar[bool] = True
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
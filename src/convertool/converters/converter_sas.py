@@ -13,6 +13,8 @@ from .base import ConverterABC
 class ConverterSAS(ConverterABC):
     tool_names: ClassVar[list[str]] = ["sas"]
     outputs: ClassVar[list[str]] = ["csv", "tsv"]
+    process_cost: ClassVar[tuple[float, float]] = (0.5, 1.0)
+    multithreading: ClassVar[bool] = True
 
     def output_puid(self, output: str) -> str | None:
         if output == "csv":
@@ -39,12 +41,12 @@ class ConverterSAS(ConverterABC):
         ):
             tmp_file: Path = tmp_dir.joinpath("sas")
 
-            with tmp_file.open("w", encoding="utf-8") as fh:
+            with self.open_output(tmp_file, "w", "utf-8") as fh:
                 writer = csv.writer(fh, delimiter=delimiter)
                 for row in sas_file:
                     writer.writerow(row)
 
             dest_dir.mkdir(parents=True, exist_ok=True)
-            tmp_file.replace(dest_file)
+            self.replace_output(tmp_file, dest_file)
 
         return [dest_file]
@@ -1,6 +1,7 @@
 from pathlib import Path
 from typing import ClassVar
 
+from convertool.office import office_server
 from convertool.util import TempDir
 
 from .base import ConverterABC
@@ -10,7 +11,13 @@ class ConverterSpreadsheet(ConverterABC):
     tool_names: ClassVar[list[str]] = ["spreadsheet"]
     outputs: ClassVar[list[str]] = ["ods", "pdf", "html"]
     process_timeout: ClassVar[float] = 60.0
+    process_stall_timeout: ClassVar[float] = 15.0
+    process_cost: ClassVar[tuple[float, float]] = (5.0, 2.0)
+    memory_cost: ClassVar[tuple[float, float]] = (500.0, 10.0)
     dependencies: ClassVar[dict[str, list[str]]] = {"libreoffice": ["libreoffice", "soffice"]}
+    office_filters: ClassVar[dict[str, str]] = {"ods": "calc8", "pdf": "calc_pdf_Export", "html": "HTML (StarCalc)"}
+    batch_outputs: ClassVar[list[str]] = ["ods", "pdf"]
+    multithreading: ClassVar[bool] = True
 
     def output_puid(self, output: str) -> str | None:
         if output == "html":
@@ -21,24 +28,46 @@ class ConverterSpreadsheet(ConverterABC):
     def output_filter(self, output: str) -> str:  # noqa: ARG002
         return ""
 
+    @classmethod
+    def convert_batch(
+        cls,
+        converters: list[ConverterABC],
+        output_dir: Path,
+        output: str,
+        *,
+        keep_relative_path: bool = True,
+    ) -> list[list[Path] | None]:
+        if office_server(cls.dependencies["libreoffice"][0]):
+            return super().convert_batch(converters, output_dir, output, keep_relative_path=keep_relative_path)
+        output = converters[0].output(output)
+        return cls.run_office_batch(
+            converters,
+            output_dir,
+            output,
+            converters[0].output_filter(output),
+            keep_relative_path=keep_relative_path,
+        )
+
     # noinspection DuplicatedCode
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
         output_filter: str = self.output_filter(output)
         dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path)
 
-        output_filter = f":{output_filter}" if output_filter else ""
-
         with TempDir(output_dir) as tmp_dir:
-            self.run_process(
-                self.dependencies["libreoffice"][0],
-                "--headless",
-                "--convert-to",
-                f"{output}{output_filter}" if output_filter else output,
-                "--outdir",
-                f"-env:UserInstallation={tmp_dir.joinpath('_libreoffice').as_uri()}",
-                tmp_dir,
-                self.file.get_absolute_path(),
-            )
+            if server := office_server(self.dependencies["libreoffice"][0]):
+                self.run_office_server(server, tmp_dir, output, output_filter or self.office_filters[output])
+            else:
+                self.run_process(
+                    self.dependencies["libreoffice"][0],
+                    "--headless",
+                    "--convert-to",
+                    f"{output}:{output_filter}" if output_filter else output,
+                    "--outdir",
+                    tmp_dir,
+                    f"-env:UserInstallation={tmp_dir.joinpath('_libreoffice').as_uri()}",
+                    self.file.get_absolute_path(),
+                    cwd=tmp_dir,
+                )
             dest_dir.mkdir(parents=True, exist_ok=True)
             return [f.replace(dest_dir / f.name) for f in tmp_dir.iterdir() if f.is_file()]
@@ -28,6 +28,7 @@ class ConverterSymphovert(ConverterABC):
     platforms: ClassVar[list[str]] = ["win32"]
     dependencies: ClassVar[dict[str, list[str]]] = {"symphony": ["symphony"]}
     outputs: ClassVar[list[str]] = ["odt", "ods", "odp"]
+    process_cost: ClassVar[tuple[float, float]] = (10.0, 2.0)
 
     @classmethod
     def test_dependencies(cls):
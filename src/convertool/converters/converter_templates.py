@@ -11,6 +11,8 @@ from .exceptions import ConvertError
 class ConverterTemplate(ConverterABC):
     tool_names: ClassVar[list[str]] = ["template"]
     outputs: ClassVar[list[str]] = TemplateTypeEnum
+    process_cost: ClassVar[tuple[float, float]] = (0.05, 0.0)
+    cacheable: ClassVar[bool] = False
 
     def output_puid(self, output: str) -> str | None:
         if output == "temporary-file":
@@ -67,6 +69,6 @@ class ConverterTemplate(ConverterABC):
             )
 
         dest_dir.mkdir(parents=True, exist_ok=True)
-        dest_file.write_text(template, encoding="utf-8")
+        self.write_output(dest_file, template, "utf-8")
 
         return [dest_file]
@@ -150,6 +150,8 @@ def tnef_to_html(tnef: TNEF, headers: TNEFHeaders):
 class ConverterTNEF(ConverterABC):
     tool_names: ClassVar[list[str]] = ["tnef"]
     outputs: ClassVar[list[[str]]] = ["html", "txt"]
+    process_cost: ClassVar[tuple[float, float]] = (0.2, 0.1)
+    multithreading: ClassVar[bool] = True
 
     def output_puid(self, output: str) -> str | None:
         if output == "txt":
@@ -191,7 +193,7 @@ class ConverterTNEF(ConverterABC):
                 body = tnef_to_html(tnef, headers)
 
             dest_dir.mkdir(parents=True, exist_ok=True)
-            dest_file.write_text(body, encoding="utf-8")
+            self.write_output(dest_file, body, "utf-8")
 
             return [dest_file]
         except Exception as e:
@@ -15,47 +15,69 @@ class ConverterVideo(ConverterABC):
         "h265",
     ]
     process_timeout: ClassVar[float] = 7200
+    process_stall_timeout: ClassVar[float] = 120.0
+    process_cost: ClassVar[tuple[float, float]] = (5.0, 10.0)
+    memory_cost: ClassVar[tuple[float, float]] = (1000.0, 1.0)
     dependencies: ClassVar[dict[str, list[str]]] = {"ffmpeg": ["ffmpeg"]}
+    multithreading: ClassVar[bool] = True
 
-    def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
-        output = self.output(output)
-        dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path)
-        final_extension: str = ""
+    def _arguments(self, dest_file: Path, output: str) -> list[str | Path]:
         arguments: list[str] = []
 
         if output == "mpeg2":
-            output = "mpg"
             arguments.extend(["-c:v", "mpeg2video", "-c:a", "mp3"])
-        elif output == "h264":
-            output = "mp4"
-            arguments.extend(["-c:v", "libx264", "-c:a", "aac"])
-        elif output == "h264-mpg":
-            output = "mp4"
-            final_extension = "mpg"
+        elif output in ("h264", "h264-mpg"):
             arguments.extend(["-c:v", "libx264", "-c:a", "aac"])
         elif output == "h265":
-            output = "mp4"
             arguments.extend(["-c:v", "libx265", "-c:a", "aac", "-vtag", "hvc1"])
 
-        dest_file: Path = self.output_file(dest_dir, output)
+        return [
+            self.dependencies["ffmpeg"][0],
+            "-i",
+            self.file.get_absolute_path(),
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-stats",
+            *arguments,
+            dest_file.name,
+        ]
+
+    def _dest_file(self, dest_dir: Path, output: str) -> tuple[Path, str]:
+        if output == "mpeg2":
+            return self.output_file(dest_dir, "mpg"), ""
+        if output in ("h264", "h265"):
+            return self.output_file(dest_dir, "mp4"), ""
+        if output == "h264-mpg":
+            return self.output_file(dest_dir, "mp4"), "mpg"
+        return self.output_file(dest_dir, output), ""
+
+    def _move_output(self, tmp_dir: Path, dest_dir: Path, dest_file: Path, final_extension: str) -> Path:
+        if final_extension:
+            tmp_file = tmp_dir.joinpath(dest_file.name)
+            dest_file = dest_file.with_name(tmp_file.replace(self.output_file(tmp_dir, final_extension)).name)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir.joinpath(dest_file.name).replace(dest_file)
+        return dest_file
+
+    def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
+        output = self.output(output)
+        dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path)
+        dest_file, final_extension = self._dest_file(dest_dir, output)
+
+        with TempDir(output_dir) as tmp_dir:
+            self.run_process(*self._arguments(dest_file, output), cwd=tmp_dir)
+            dest_file = self._move_output(tmp_dir, dest_dir, dest_file, final_extension)
+
+        return [dest_file]
+
+    async def convert_async(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
+        output = self.output(output)
+        dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path)
+        dest_file, final_extension = self._dest_file(dest_dir, output)
 
         with TempDir(output_dir) as tmp_dir:
-            self.run_process(
-                self.dependencies["ffmpeg"][0],
-                "-i",
-                self.file.get_absolute_path(),
-                "-nostdin",
-                "-loglevel",
-                "error",
-                "-stats",
-                *arguments,
-                dest_file.name,
-                cwd=tmp_dir,
-            )
-            if final_extension:
-                tmp_file = tmp_dir.joinpath(dest_file.name)
-                dest_file = dest_file.with_name(tmp_file.replace(self.output_file(tmp_dir, final_extension)).name)
-            dest_dir.mkdir(parents=True, exist_ok=True)
-            tmp_dir.joinpath(dest_file.name).replace(dest_file)
+            await self.run_process_async(*self._arguments(dest_file, output), cwd=tmp_dir)
+            dest_file = self._move_output(tmp_dir, dest_dir, dest_file, final_extension)
 
         return [dest_file]
@@ -1,23 +1,148 @@
+from functools import lru_cache
 from pathlib import Path
 from typing import ClassVar
+from urllib.parse import unquote
+from urllib.parse import urlparse
+
+from lxml import etree
 
 from convertool.util import TempDir
 
 from . import resources
 from .base import _shared_dependencies
+from .base import _shared_memory_cost
 from .base import _shared_platforms
+from .base import _shared_process_cost
 from .base import _shared_process_timeout
 from .base import ConverterABC
 from .base import dummy_base_file
 from .converter_html import ConverterHTML
 from .converter_html import ConverterHTMLToImage
+from .exceptions import BadOption
+
+_EMPTY_STYLESHEET: bytes = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b'<xsl:stylesheet xmlns:xsl="http://www.w3.org/1999/XSL/Transform" version="1.0"></xsl:stylesheet>'
+)
+_STYLESHEET_TYPES: tuple[str, ...] = ("text/xsl", "text/xml", "application/xml", "application/xslt+xml")
+_ACCESS_CONTROL: etree.XSLTAccessControl = etree.XSLTAccessControl(
+    read_network=False,
+    write_file=False,
+    create_dir=False,
+    write_network=False,
+)
+
+
+@lru_cache(maxsize=32)
+def _compile_stylesheet(path: Path | None, mtime_ns: int | None) -> etree.XSLT:
+    if path is None:
+        return etree.XSLT(etree.fromstring(_EMPTY_STYLESHEET), access_control=_ACCESS_CONTROL)
+    return etree.XSLT(etree.parse(path), access_control=_ACCESS_CONTROL)
+
+
+def trusted_stylesheet(path: Path | None) -> bool:
+    """
+    Check whether a stylesheet can be applied in-process.
+
+    Only the stylesheets bundled with convertool, and the empty stylesheet, are trusted. The others may come from the
+    archive and are applied with xmlstarlet, so that they are subject to the timeouts of the process.
+
+    :param path: The path to the stylesheet, or ``None`` for the empty stylesheet.
+    :return: ``True`` if the stylesheet is trusted, ``False`` otherwise.
+    """
+    return path is None or path.resolve().is_relative_to(resources.medcom.parent.resolve())
+
+
+def compiled_stylesheet(path: Path | None) -> etree.XSLT:
+    """
+    Get a compiled XSL stylesheet.
+
+    Stylesheets are compiled once per process and compiled again if their modification time changes.
+
+    :param path: The path to the stylesheet, or ``None`` for an empty stylesheet.
+    :return: The compiled stylesheet.
+    """
+    if path is None:
+        return _compile_stylesheet(None, None)
+    path = path.resolve()
+    return _compile_stylesheet(path, path.stat().st_mtime_ns)
+
+
+def embedded_stylesheet(document: etree._ElementTree, file: Path) -> Path | None:
+    """
+    Get the path to the stylesheet linked by the ``xml-stylesheet`` processing instruction of a document.
+
+    :param document: The parsed document.
+    :param file: The path to the document.
+    :raise ValueError: If the stylesheet is not a local file.
+    :return: The path to the stylesheet, or ``None`` if the document does not link one.
+    """
+    for pi in document.xpath("/processing-instruction('xml-stylesheet')"):
+        if pi.get("type") not in _STYLESHEET_TYPES or not (href := pi.get("href")):
+            continue
+        url = urlparse(href)
+        if url.scheme not in ("", "file") or url.netloc or url.fragment or href.startswith("#"):
+            raise ValueError(f"Unsupported stylesheet {href!r}")
+        return file.parent.joinpath(unquote(url.path))
+    return None
+
+
+def transform(file: Path, xsl: Path | None = None, *, embed: bool = False) -> str:
+    """
+    Apply a trusted XSL stylesheet to a document in-process.
+
+    The output is the same as the one of ``xmlstarlet tr``.
+
+    :param file: The path to the document.
+    :param xsl: The path to the stylesheet, or ``None`` for an empty stylesheet.
+    :param embed: Whether to use the stylesheet linked by the document instead, if it links one.
+    :raise etree.LxmlError: If the document or the stylesheet cannot be parsed, or the transformation fails.
+    :raise ValueError: If the stylesheet is not trusted, or the stylesheet linked by the document is not a local file.
+    :raise OSError: If the stylesheet cannot be read.
+    :return: The result of the transformation.
+    """
+    if not trusted_stylesheet(xsl):
+        raise ValueError(f"Untrusted stylesheet {xsl}")
+    document = etree.parse(file)
+    if embed and (embedded := embedded_stylesheet(document, file)):
+        if not trusted_stylesheet(embedded):
+            raise ValueError(f"Untrusted stylesheet {embedded}")
+        xsl = embedded
+    # Decoded like the captured stdout of xmlstarlet
+    return bytes(compiled_stylesheet(xsl)(document)).decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
 
 
 class ConverterXSL(ConverterABC):
     tool_names: ClassVar[list[str]] = ["xslt"]
     outputs: ClassVar[list[str]] = ["html", "xml"]
     process_timeout: ClassVar[float] = 10
+    process_cost: ClassVar[tuple[float, float]] = (0.5, 0.5)
     dependencies: ClassVar[dict[str, list[str]]] = {"xmlstarlet": ["xmlstarlet"]}
+    multithreading: ClassVar[bool] = True
+
+    def test_options(self):
+        if self.options.get("engine", "lxml") not in ("lxml", "xmlstarlet"):
+            raise BadOption(self.file, f"Unsupported engine {self.options['engine']!r}.")
+
+    def transform(self, xsl: Path | None, *, embed: bool = False) -> str | None:
+        """
+        Apply an XSL stylesheet to the file in-process with lxml.
+
+        Stylesheets are compiled once per process. The transformation is left to xmlstarlet if the "engine" option is
+        "xmlstarlet", if the stylesheet is not bundled with convertool, or if lxml cannot apply it. In-process
+        transformations are not bound by the timeouts of the converter, so stylesheets found in the archive, including
+        those linked by the file, always go through xmlstarlet.
+
+        :param xsl: The path to the stylesheet, or ``None`` for an empty stylesheet.
+        :param embed: Whether to use the stylesheet linked by the file instead, if it links one.
+        :return: The result of the transformation, or ``None`` if xmlstarlet should be used.
+        """
+        if self.options.get("engine", "lxml") == "xmlstarlet" or not trusted_stylesheet(xsl):
+            return None
+        try:
+            return transform(self.file.get_absolute_path(), xsl, embed=embed)
+        except (etree.LxmlError, ValueError, OSError):
+            return None
 
     def convert(
         self,
@@ -31,33 +156,32 @@ class ConverterXSL(ConverterABC):
         dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path)
         dest_file: Path = self.output_file(dest_dir, output)
 
-        with TempDir(output_dir) as tmp_dir:
-            tmp_xsl: Path = xsl or tmp_dir.joinpath(f"{tmp_dir.name}.xsl")
-            if not xsl:
-                tmp_xsl.write_text(
-                    '<?xml version="1.0" encoding="UTF-8"?>'
-                    '<xsl:stylesheet xmlns:xsl="http://www.w3.org/1999/XSL/Transform" version="1.0"></xsl:stylesheet>',
-                    encoding="utf-8",
+        if (stdout := self.transform(xsl, embed=not xsl)) is None:
+            with TempDir(output_dir) as tmp_dir:
+                tmp_xsl: Path = xsl or tmp_dir.joinpath(f"{tmp_dir.name}.xsl")
+                if not xsl:
+                    tmp_xsl.write_bytes(_EMPTY_STYLESHEET)
+                stdout, _ = self.run_process(
+                    self.dependencies["xmlstarlet"][0],
+                    "tr",
+                    "" if xsl else "--embed",
+                    tmp_xsl,
+                    self.file.get_absolute_path(),
                 )
-            stdout, _ = self.run_process(
-                self.dependencies["xmlstarlet"][0],
-                "tr",
-                "" if xsl else "--embed",
-                tmp_xsl,
-                self.file.get_absolute_path(),
-            )
 
         dest_dir.mkdir(parents=True, exist_ok=True)
-        dest_file.write_text(stdout)
+        self.write_output(dest_file, stdout)
 
         return [dest_file]
 
 
-class ConverterMedCom(ConverterABC):
+class ConverterMedCom(ConverterXSL):
     tool_names: ClassVar[list[str]] = ["medcom"]
     outputs: ClassVar[list[str]] = ["html"]
     process_timeout: ClassVar[float] = 10
+    process_cost: ClassVar[tuple[float, float]] = (0.5, 0.5)
     dependencies: ClassVar[dict[str, list[str]]] = {"xmlstarlet": ["xmlstarlet"]}
+    multithreading: ClassVar[bool] = True
 
     def output_puid(self, output: str) -> str | None:
         if output == "html":
@@ -71,10 +195,11 @@ class ConverterMedCom(ConverterABC):
 
         xsl: Path = resources.medcom.joinpath("viewEmessage.xslt")
 
-        stdout, _ = self.run_process(self.dependencies["xmlstarlet"][0], "tr", xsl, self.file.get_absolute_path())
+        if (stdout := self.transform(xsl)) is None:
+            stdout, _ = self.run_process(self.dependencies["xmlstarlet"][0], "tr", xsl, self.file.get_absolute_path())
 
         dest_dir.mkdir(parents=True, exist_ok=True)
-        dest_file.write_text(stdout)
+        self.write_output(dest_file, stdout)
 
         return [dest_file]
 
@@ -85,6 +210,9 @@ class ConverterXSLToPDF(ConverterABC):
     platforms: ClassVar[list[str] | None] = _shared_platforms(ConverterXSL, ConverterHTML)
     dependencies: ClassVar[dict[str, list[str]]] = _shared_dependencies(ConverterXSL, ConverterHTML)
     process_timeout: ClassVar[float | None] = _shared_process_timeout(ConverterXSL, ConverterHTML)
+    process_cost: ClassVar[tuple[float, float]] = _shared_process_cost(ConverterXSL, ConverterHTML)
+    memory_cost: ClassVar[tuple[float, float]] = _shared_memory_cost(ConverterXSL, ConverterHTML)
+    multithreading: ClassVar[bool] = True
 
     def convert(
         self,
@@ -112,6 +240,9 @@ class ConverterXSLToImage(ConverterABC):
     platforms: ClassVar[list[str] | None] = _shared_platforms(ConverterXSL, ConverterHTMLToImage)
     dependencies: ClassVar[dict[str, list[str]]] = _shared_dependencies(ConverterXSL, ConverterHTMLToImage)
     process_timeout: ClassVar[float | None] = _shared_process_timeout(ConverterXSL, ConverterHTMLToImage)
+    process_cost: ClassVar[tuple[float, float]] = _shared_process_cost(ConverterXSL, ConverterHTMLToImage)
+    memory_cost: ClassVar[tuple[float, float]] = _shared_memory_cost(ConverterXSL, ConverterHTMLToImage)
+    multithreading: ClassVar[bool] = True
 
     def convert(
         self,
@@ -139,6 +270,9 @@ class ConverterMedComToPDF(ConverterABC):
     platforms: ClassVar[list[str] | None] = _shared_platforms(ConverterMedCom, ConverterHTML)
     dependencies: ClassVar[dict[str, list[str]]] = _shared_dependencies(ConverterMedCom, ConverterHTML)
     process_timeout: ClassVar[float | None] = _shared_process_timeout(ConverterMedCom, ConverterHTML)
+    process_cost: ClassVar[tuple[float, float]] = _shared_process_cost(ConverterMedCom, ConverterHTML)
+    memory_cost: ClassVar[tuple[float, float]] = _shared_memory_cost(ConverterMedCom, ConverterHTML)
+    multithreading: ClassVar[bool] = True
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
@@ -159,6 +293,9 @@ class ConverterMedComToImage(ConverterABC):
     platforms: ClassVar[list[str] | None] = _shared_platforms(ConverterMedCom, ConverterHTMLToImage)
     dependencies: ClassVar[dict[str, list[str]]] = _shared_dependencies(ConverterMedCom, ConverterHTMLToImage)
     process_timeout: ClassVar[float | None] = _shared_process_timeout(ConverterMedCom, ConverterHTMLToImage)
+    process_cost: ClassVar[tuple[float, float]] = _shared_process_cost(ConverterMedCom, ConverterHTMLToImage)
+    memory_cost: ClassVar[tuple[float, float]] = _shared_memory_cost(ConverterMedCom, ConverterHTMLToImage)
+    multithreading: ClassVar[bool] = True
 
     def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
         output = self.output(output)
@@ -1,4 +1,5 @@
 from pathlib import Path
+from shutil import copyfileobj
 from typing import ClassVar
 from zipfile import ZipFile
 
@@ -13,6 +14,8 @@ from .exceptions import ConvertError
 class ConverterZIPFile(ConverterABC):
     tool_names: ClassVar[list[str]] = ["zipfile"]
     outputs: ClassVar[list[str]] = []
+    process_cost: ClassVar[tuple[float, float]] = (0.2, 0.5)
+    multithreading: ClassVar[bool] = True
 
     @classmethod
     def match_tool(cls, tool: str, output: str) -> bool:  # noqa: ARG003
@@ -41,6 +44,9 @@ class ConverterZIPFile(ConverterABC):
                 if member.is_dir():
                     raise ConvertError(self.file, f"{self.options['path']!r} is a directory.")
 
-                tmp_file = Path(zf.extract(member, tmp_dir))
+                tmp_file: Path = tmp_dir.joinpath(dest_file.name)
 
-            return [tmp_file.replace(dest_file)]
+                with zf.open(member) as fh, self.open_output(tmp_file) as out:
+                    copyfileobj(fh, out)
+
+            return [self.replace_output(tmp_file, dest_file)]
@@ -47,6 +47,9 @@ class ConvertError(Exception):
 class ConvertTimeoutError(ConvertError): ...
 
 
+class ConvertStalledError(ConvertError): ...
+
+
 class OutputDirError(ConvertError): ...
 
 
@@ -0,0 +1,132 @@
+from collections.abc import Callable
+from itertools import batched
+
+from acacore.database import FilesDB
+from acacore.database.table import Table
+from acacore.models.file import MasterFile
+from acacore.models.file import OriginalFile
+
+from .convert import ConvertInstructions
+
+
+class CostModel:
+    """
+    Estimate how long conversions take.
+
+    A linear model of the duration against the size of the input file is fitted for each tool and output using the
+    durations recorded in the event log by previous runs. Conversions without enough history fall back on the
+    ``process_cost`` of their converter.
+
+    The rates of the model are stored as a tuple with the fixed cost in seconds and the cost in seconds per megabyte
+    for each tool and output.
+    """
+
+    def __init__(self, rates: dict[tuple[str, str], tuple[float, float]] | None = None) -> None:
+        self.rates: dict[tuple[str, str], tuple[float, float]] = rates or {}
+
+    @classmethod
+    def from_events(
+        cls,
+        database: FilesDB,
+        files_table: Table[OriginalFile | MasterFile],
+        operation: str,
+        min_samples: int = 5,
+    ) -> "CostModel":
+        """
+        Fit the model on the durations of previous conversions.
+
+        :param database: The database containing the event log.
+        :param files_table: The table of the files the events refer to.
+        :param operation: The operation of the events that record a successful conversion.
+        :param min_samples: The minimum number of conversions needed to fit the model of a tool and output.
+        :return: The fitted model.
+        """
+        rates: dict[tuple[str, str], tuple[float, float]] = {}
+
+        for tool, output, n, sx, sy, sxx, sxy in database.execute(
+            f"""
+            select tool, output, count(*), sum(x), sum(y), sum(x * x), sum(x * y)
+            from (
+                select json_extract(l.data, '$.tool')     as tool,
+                       json_extract(l.data, '$.output')   as output,
+                       f.size / 1e6                       as x,
+                       json_extract(l.data, '$.duration') as y
+                from {database.log.name} l
+                         join {files_table.name} f on f.uuid = l.file_uuid
+                where l.operation = ? and json_extract(l.data, '$.duration') is not null
+            )
+            group by tool, output
+            """,
+            [operation],
+        ).fetchall():
+            if n < min_samples:
+                continue
+            denominator: float = n * sxx - sx * sx
+            rate: float = max((n * sxy - sx * sy) / denominator, 0.0) if denominator > 1e-9 else 0.0
+            rates[(tool, output)] = (max((sy - rate * sx) / n, 0.0), rate)
+
+        return cls(rates)
+
+    def estimate(self, instructions: ConvertInstructions) -> float:
+        """
+        Estimate the duration of a conversion.
+
+        :param instructions: The instructions of the conversion.
+        :return: The estimated duration in seconds.
+        """
+        if rate := self.rates.get((instructions.tool, instructions.output)):
+            return rate[0] + rate[1] * (instructions.file.size or 0) / 1_000_000
+        return instructions.converter_cls.estimate_cost(instructions.file)
+
+    def timeout(
+        self,
+        instructions: ConvertInstructions,
+        factor: float,
+        minimum: float = 30.0,
+        maximum: float = 4.0,
+    ) -> float | None:
+        """
+        Compute the timeout of a conversion from its estimated duration.
+
+        The timeout is the estimated duration multiplied by ``factor``. It is never shorter than ``minimum`` seconds,
+        or the timeout of the converter if that is shorter, and never longer than the timeout of the converter
+        multiplied by ``maximum``. Converters without a timeout are left without one.
+
+        :param instructions: The instructions of the conversion.
+        :param factor: The multiplier applied to the estimated duration.
+        :param minimum: The shortest timeout in seconds.
+        :param maximum: The multiplier applied to the timeout of the converter to get the longest timeout.
+        :return: The timeout in seconds, or ``None`` if the converter has no timeout.
+        """
+        if not (timeout := instructions.converter_cls.process_timeout):
+            return None
+        return min(max(self.estimate(instructions) * factor, min(minimum, timeout)), timeout * maximum)
+
+
+def rank_files[F: OriginalFile | MasterFile](
+    database: FilesDB,
+    table: Table[F],
+    cost: Callable[[F], float],
+) -> list[tuple[str, str]]:
+    """
+    Store the estimated cost of each file of a table in a temporary table.
+
+    :param database: The database containing the table.
+    :param table: The table of the files to rank.
+    :param cost: A function returning the estimated cost of a file.
+    :return: The ``order_by`` argument to select the files of the table from the most to the least expensive.
+    """
+    cost_table: str = f"{table.name}_cost"
+
+    database.execute(f"create temporary table if not exists {cost_table} (uuid text primary key, cost real not null)")
+    database.execute(f"delete from {cost_table}")
+
+    for chunk in batched(((str(f.uuid), cost(f)) for f in table.select()), 1000):
+        database.executemany(f"insert into {cost_table} (uuid, cost) values (?, ?)", chunk)
+
+    database.commit()
+
+    return [
+        (f"(select cost from {cost_table} c where c.uuid = {table.name}.uuid)", "desc"),
+        ("lower(relative_path)", "asc"),
+    ]
@@ -0,0 +1,70 @@
+from collections.abc import Generator
+from collections.abc import Iterable
+from json import dumps
+
+from .convert import ConvertInstructions
+
+
+class Deduplicator:
+    """
+    Hold back conversions of files whose content is already being converted.
+
+    Files are grouped by checksum, tool, output, and options. The first file of each group is converted, and the
+    others are held back until its result is available, so that its outputs can be reused for them.
+    """
+
+    def __init__(self) -> None:
+        self.pending: dict[tuple[str, str, str, str], list[ConvertInstructions]] = {}
+
+    @staticmethod
+    def key(instructions: ConvertInstructions) -> tuple[str, str, str, str] | None:
+        """
+        Get the key of the group of a conversion.
+
+        :param instructions: The instructions of the conversion.
+        :return: The key, or ``None`` if the conversion cannot be deduplicated.
+        """
+        if not instructions.file.checksum or not instructions.converter_cls.cacheable:
+            return None
+        return (
+            instructions.file.checksum,
+            instructions.tool,
+            instructions.output,
+            dumps(instructions.options, sort_keys=True, default=str),
+        )
+
+    def filter(self, instructions: Iterable[ConvertInstructions]) -> Generator[ConvertInstructions, None, None]:
+        """
+        Yield the first instructions of each group and hold back the others.
+
+        :param instructions: The instructions to filter.
+        """
+        for inst in instructions:
+            if (key := self.key(inst)) is None:
+                yield inst
+            elif key in self.pending:
+                self.pending[key].append(inst)
+            else:
+                self.pending[key] = []
+                yield inst
+
+    def duplicates(self, instructions: ConvertInstructions) -> list[ConvertInstructions]:
+        """
+        Release the instructions held back by a conversion.
+
+        :param instructions: The instructions of the conversion that was started for the group.
+        :return: The instructions of the duplicate files.
+        """
+        if (key := self.key(instructions)) is None:
+            return []
+        return self.pending.pop(key, [])
+
+    def remaining(self) -> list[ConvertInstructions]:
+        """
+        Release all the instructions that are still held back.
+
+        :return: The instructions of the duplicate files.
+        """
+        remaining: list[ConvertInstructions] = [i for group in self.pending.values() for i in group]
+        self.pending.clear()
+        return remaining
@@ -0,0 +1,144 @@
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from io import RawIOBase
+from os import cpu_count
+from os import getpid
+from pathlib import Path
+from typing import Any
+from typing import BinaryIO
+from typing import NamedTuple
+
+import chardet
+from acacore.models.file import BaseFile
+
+_HEAD_SIZE: int = 2048
+_CHUNK_SIZE: int = 1024 * 1024
+_TEXT_CHARS: bytes = bytes(sorted({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7F}))
+_executor: tuple[int, ThreadPoolExecutor] | None = None
+
+
+class FileDigest(NamedTuple):
+    checksum: str
+    size: int
+    is_binary: bool
+    encoding: dict[str, Any] | None
+
+    @classmethod
+    def from_head(cls, checksum: str, size: int, head: bytes) -> "FileDigest":
+        """
+        Create a digest from the checksum of a file and its first bytes.
+
+        :param checksum: The SHA-256 checksum of the file.
+        :param size: The size of the file.
+        :param head: The first bytes of the file, used to detect whether it is binary and its encoding.
+        :return: The digest.
+        """
+        is_binary: bool = bool(head.translate(None, _TEXT_CHARS))
+        return cls(checksum, size, is_binary, None if is_binary else dict(chardet.detect(head)))
+
+
+class DigestWriter(RawIOBase):
+    """
+    Binary stream that hashes the data written to a file.
+
+    Closing the writer does not close the underlying file.
+    """
+
+    def __init__(self, fh: BinaryIO) -> None:
+        super().__init__()
+        self.fh: BinaryIO = fh
+        self.hasher = sha256()
+        self.size: int = 0
+        self.head: bytes = b""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes | bytearray | memoryview) -> int:
+        data = bytes(data)
+        self.fh.write(data)
+        self.hasher.update(data)
+        if len(self.head) < _HEAD_SIZE:
+            self.head += data[: _HEAD_SIZE - len(self.head)]
+        self.size += len(data)
+        return len(data)
+
+    def digest(self) -> FileDigest:
+        return FileDigest.from_head(self.hasher.hexdigest(), self.size, self.head)
+
+
+def file_digest(path: Path) -> FileDigest:
+    """
+    Hash a file.
+
+    :param path: The path of the file.
+    :return: The digest of the file.
+    """
+    hasher = sha256()
+    size: int = 0
+    head: bytes = b""
+
+    with path.open("rb") as fh:
+        while chunk := fh.read(_CHUNK_SIZE):
+            hasher.update(chunk)
+            if not size:
+                head = chunk[:_HEAD_SIZE]
+            size += len(chunk)
+
+    return FileDigest.from_head(hasher.hexdigest(), size, head)
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor  # noqa: PLW0603
+    # Threads do not survive a fork, so each process gets its own pool
+    if _executor is None or _executor[0] != getpid():
+        _executor = (getpid(), ThreadPoolExecutor(min(4, cpu_count() or 1), "convertool-digest"))
+    return _executor[1]
+
+
+def digest_files(paths: list[Path], known: dict[Path, FileDigest] | None = None) -> list[Future[FileDigest]]:
+    """
+    Hash files on a background thread pool.
+
+    Files whose digest was computed while they were written are not read again, as long as their size did not change.
+
+    :param paths: The paths of the files.
+    :param known: The digests computed while the files were written.
+    :return: A future digest for each file.
+    """
+    futures: list[Future[FileDigest]] = []
+
+    for path in paths:
+        if (digest := (known or {}).get(path)) and path.stat().st_size == digest.size:
+            future: Future[FileDigest] = Future()
+            future.set_result(digest)
+        else:
+            future = _pool().submit(file_digest, path)
+        futures.append(future)
+
+    return futures
+
+
+def file_record[F: BaseFile](cls: type[F], path: Path, root: Path, digest: FileDigest, data: dict[str, Any]) -> F:
+    """
+    Create the database record of a file from its digest, without reading it.
+
+    :param cls: The model of the record.
+    :param path: The path of the file.
+    :param root: The directory the path of the record is relative to.
+    :param digest: The digest of the file.
+    :param data: Additional fields of the record.
+    :return: The record.
+    """
+    return cls(
+        checksum=digest.checksum,
+        encoding=digest.encoding,
+        relative_path=path.relative_to(root),
+        is_binary=digest.is_binary,
+        size=digest.size,
+        puid=None,
+        signature=None,
+        root=root,
+        **data,
+    )
@@ -0,0 +1,429 @@
+from abc import ABC
+from abc import abstractmethod
+from collections import deque
+from collections.abc import Generator
+from collections.abc import Iterable
+from itertools import count
+from logging import INFO
+from logging import WARNING
+from multiprocessing.connection import Client
+from multiprocessing.connection import Listener
+from pathlib import Path
+from queue import Empty
+from queue import SimpleQueue
+from socket import gethostname
+from threading import Event as ThreadEvent
+from threading import Lock
+from threading import Thread
+from time import monotonic
+from time import sleep
+from typing import Any
+from typing import NamedTuple
+from typing import Protocol
+
+from acacore.database import FilesDB
+from acacore.models.event import Event
+from acacore.models.file import AccessFile
+from acacore.models.file import MasterFile
+from acacore.models.file import OriginalFile
+from acacore.models.file import StatutoryFile
+from acacore.utils.click import context_commands
+from click import Context
+from structlog.stdlib import BoundLogger
+
+from .convert import convert
+from .convert import ConvertFailure
+from .convert import ConvertInstructions
+from .convert import ConvertResult
+from .convert import format_traceback
+
+type Address = tuple[str, int]
+
+
+class TransportConnection(Protocol):
+    def send(self, obj: Any) -> None: ...  # noqa: ANN401
+
+    def recv(self) -> Any: ...  # noqa: ANN401
+
+    def close(self) -> None: ...
+
+
+class TransportListener(Protocol):
+    @property
+    def address(self) -> Address: ...
+
+    def accept(self) -> TransportConnection: ...
+
+    def close(self) -> None: ...
+
+
+class Transport(ABC):
+    """
+    The channel used by the coordinator and the workers to exchange messages.
+
+    Messages are tuples whose first item is the type of the message.
+    """
+
+    @abstractmethod
+    def listen(self, address: Address) -> TransportListener:
+        """
+        Listen for connections from workers.
+
+        :param address: The address to listen on.
+        :return: The listener.
+        """
+
+    @abstractmethod
+    def connect(self, address: Address) -> TransportConnection:
+        """
+        Connect to a coordinator.
+
+        :param address: The address of the coordinator.
+        :raise ConnectionError: If the coordinator cannot be reached.
+        :return: The connection.
+        """
+
+
+class TCPTransport(Transport):
+    """
+    Transport over TCP using ``multiprocessing.connection``.
+
+    Both ends must use the same authentication key, connections from clients that do not know the key are refused.
+    """
+
+    def __init__(self, authkey: bytes) -> None:
+        self.authkey: bytes = authkey
+
+    def listen(self, address: Address) -> TransportListener:
+        return Listener(address, "AF_INET", authkey=self.authkey)
+
+    def connect(self, address: Address) -> TransportConnection:
+        return Client(address, "AF_INET", authkey=self.authkey)
+
+
+class Lease(NamedTuple):
+    instructions: ConvertInstructions
+    worker: str
+    expires: float
+
+
+class Coordinator:
+    """
+    Hand out instructions to remote workers and collect their results.
+
+    Each instruction sent to a worker is leased for ``lease_timeout`` seconds, workers renew their leases while the
+    conversion is running. When a lease expires, or the connection to the worker is lost, the instructions are put
+    back at the front of the queue so that another worker can take them. Results for leases that are no longer valid
+    are discarded.
+    """
+
+    def __init__(
+        self,
+        transport: Transport,
+        address: Address,
+        config: dict[str, Any],
+        lease_timeout: float,
+    ) -> None:
+        self.config: dict[str, Any] = config
+        self.lease_timeout: float = lease_timeout
+        self.pending: deque[ConvertInstructions] = deque()
+        self.leases: dict[int, Lease] = {}
+        self.done: bool = False
+        self._lease_ids = count(1)
+        self._lock: Lock = Lock()
+        self._results: SimpleQueue[ConvertResult] = SimpleQueue()
+        self._listener: TransportListener = transport.listen(address)
+        self._closed: bool = False
+
+    def __enter__(self) -> "Coordinator":
+        Thread(target=self._accept, name="convertool-coordinator", daemon=True).start()
+        return self
+
+    def __exit__(self, _exc_type: type[BaseException] | None, _exc_val: Any, _exc_tb: Any) -> None:  # noqa: ANN401
+        self._closed = True
+        self._listener.close()
+
+    @property
+    def address(self) -> Address:
+        return self._listener.address
+
+    @property
+    def outstanding(self) -> int:
+        """The number of instructions that are either waiting for a worker or leased."""
+        with self._lock:
+            return len(self.pending) + len(self.leases)
+
+    def submit(self, instructions: ConvertInstructions):
+        with self._lock:
+            self.pending.append(instructions)
+
+    def finish(self):
+        """Signal that no more instructions will be submitted, workers are stopped once all leases are completed."""
+        with self._lock:
+            self.done = True
+
+    def expire(self) -> list[Lease]:
+        """
+        Put the instructions of expired leases back in the queue.
+
+        :return: The expired leases.
+        """
+        now: float = monotonic()
+        with self._lock:
+            expired: list[int] = [lease_id for lease_id, lease in self.leases.items() if lease.expires < now]
+            leases: list[Lease] = [self.leases.pop(lease_id) for lease_id in expired]
+            self.pending.extendleft(lease.instructions for lease in reversed(leases))
+        return leases
+
+    def results(self, *, block: bool = False) -> Generator[ConvertResult, None, None]:
+        """
+        Yield the results received from the workers.
+
+        :param block: If ``True``, wait until a result is available or a lease expires.
+        """
+        if block:
+            try:
+                yield self._results.get(timeout=min(self.lease_timeout, 1.0))
+            except Empty:
+                return
+        while not self._results.empty():
+            yield self._results.get()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                return
+            except Exception:
+                # Failed handshakes, e.g. a client with the wrong key, do not stop the coordinator
+                continue
+            Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _lease(self, worker: str) -> tuple[Any, ...]:
+        with self._lock:
+            if self.pending:
+                lease_id: int = next(self._lease_ids)
+                instructions: ConvertInstructions = self.pending.popleft()
+                self.leases[lease_id] = Lease(instructions, worker, monotonic() + self.lease_timeout)
+                return "lease", lease_id, instructions
+            if self.done and not self.leases:
+                return ("stop",)
+            return "wait", 1.0
+
+    def _serve(self, conn: TransportConnection):
+        worker: str = ""
+
+        try:
+            while True:
+                message: tuple[Any, ...] = conn.recv()
+                if message[0] == "hello":
+                    worker = f"{message[1]}#{id(conn)}"
+                    conn.send(("config", self.config))
+                elif message[0] == "request":
+                    conn.send(self._lease(worker))
+                elif message[0] == "heartbeat":
+                    with self._lock:
+                        if (lease := self.leases.get(message[1])) and lease.worker == worker:
+                            self.leases[message[1]] = lease._replace(expires=monotonic() + self.lease_timeout)
+                elif message[0] == "result":
+                    with self._lock:
+                        lease = self.leases.pop(message[1], None)
+                    if lease and lease.worker == worker:
+                        self._results.put(message[2])
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            with self._lock:
+                lost: list[int] = [lease_id for lease_id, lease in self.leases.items() if lease.worker == worker]
+                self.pending.extendleft(self.leases.pop(lease_id).instructions for lease_id in reversed(lost))
+
+
+def coordinate_instructions[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | StatutoryFile](
+    context: Context | str,
+    database: FilesDB | None,
+    output_dir: Path,
+    root_dir: Path,
+    relative_root_dir: Path,
+    instructions: Iterable[ConvertInstructions[M, O]],
+    verbose: bool,
+    hashed_output_names: bool,
+    timeout: int | None,
+    logger: BoundLogger,
+    transport: Transport,
+    address: Address,
+    lease_timeout: float,
+    read_ahead: int = 256,
+) -> Generator[ConvertResult[M, O], None, None]:
+    """
+    Convert a stream of instructions using remote workers.
+
+    Converters that support multithreading are run by the workers connected to the coordinator, the others are run
+    in the current process. Workers must have access to the AVID directory, paths are sent to them relative to its
+    root. Results are yielded as soon as they are available.
+
+    :param context: The click context or the name of the command.
+    :param database: The database, it is only passed to converters running in the current process.
+    :param output_dir: The output directory.
+    :param root_dir: The root directory of the files.
+    :param relative_root_dir: The directory the converted files should be relative to.
+    :param instructions: The instructions to convert. They are consumed lazily.
+    :param verbose: Whether to show the output of the converters.
+    :param hashed_output_names: Whether to use hashed names for the output files.
+    :param timeout: The timeout override for the converters run by the workers.
+    :param logger: The logger to use.
+    :param transport: The transport used to communicate with the workers.
+    :param address: The address the coordinator listens on.
+    :param lease_timeout: The number of seconds after which the instructions of a silent worker are reassigned.
+    :param read_ahead: The maximum number of instructions waiting for a worker.
+    """
+    context_str: str = ".".join(context_commands(context)) if isinstance(context, Context) else context
+    config: dict[str, Any] = {
+        "context": context_str,
+        "output_dir": str(output_dir.relative_to(root_dir)),
+        "relative_root_dir": str(relative_root_dir.relative_to(root_dir)),
+        "verbose": verbose,
+        "hashed_output_names": hashed_output_names,
+        "timeout": timeout,
+        "lease_timeout": lease_timeout,
+    }
+
+    def receive(*, block: bool = False) -> Generator[ConvertResult[M, O], None, None]:
+        for lease in coordinator.expire():
+            Event.from_command(context, "lease:expired", lease.instructions.file).log(
+                WARNING,
+                logger,
+                worker=lease.worker,
+            )
+        for result in coordinator.results(block=block):
+            for file in result.output_files:
+                file.root = root_dir
+            yield result
+
+    with Coordinator(transport, address, config, lease_timeout) as coordinator:
+        Event.from_command(context, "coordinator").log(INFO, logger, address=":".join(map(str, coordinator.address)))
+
+        for inst in instructions:
+            if inst.converter_cls.multithreading:
+                coordinator.submit(inst)
+            else:
+                yield convert(
+                    context_str,
+                    database,
+                    output_dir,
+                    root_dir,
+                    relative_root_dir,
+                    inst,
+                    verbose,
+                    hashed_output_names,
+                    logger,
+                )
+            yield from receive()
+            while len(coordinator.pending) >= read_ahead:
+                yield from receive(block=True)
+
+        coordinator.finish()
+
+        while coordinator.outstanding:
+            yield from receive(block=True)
+
+
+def run_worker(
+    transport: Transport,
+    address: Address,
+    root_dir: Path,
+    logger: BoundLogger,
+    name: str | None = None,
+    connect_timeout: float = 60,
+) -> int:
+    """
+    Convert the instructions handed out by a coordinator until it stops the worker.
+
+    :param transport: The transport used to communicate with the coordinator.
+    :param address: The address of the coordinator.
+    :param root_dir: The path to the AVID directory on this host.
+    :param logger: The logger to use.
+    :param name: The name of the worker, defaults to the hostname.
+    :param connect_timeout: The number of seconds to keep retrying to connect to the coordinator.
+    :raise ConnectionError: If the coordinator cannot be reached.
+    :return: The number of converted instructions.
+    """
+    deadline: float = monotonic() + connect_timeout
+
+    while True:
+        try:
+            conn: TransportConnection = transport.connect(address)
+            break
+        except ConnectionError:
+            if monotonic() > deadline:
+                raise
+            sleep(1)
+
+    send_lock: Lock = Lock()
+    converted: int = 0
+
+    def send(message: tuple[Any, ...]):
+        with send_lock:
+            conn.send(message)
+
+    def heartbeat(lease_id: int, stop: ThreadEvent, interval: float):
+        while not stop.wait(interval):
+            send(("heartbeat", lease_id))
+
+    try:
+        send(("hello", name or gethostname()))
+        _, config = conn.recv()
+        output_dir: Path = root_dir.joinpath(config["output_dir"])
+        relative_root_dir: Path = root_dir.joinpath(config["relative_root_dir"])
+
+        while True:
+            send(("request",))
+            message: tuple[Any, ...] = conn.recv()
+
+            if message[0] == "stop":
+                break
+            if message[0] == "wait":
+                sleep(message[1])
+                continue
+
+            _, lease_id, instructions = message
+
+            if config["timeout"] is not None:
+                instructions.converter_cls.process_timeout = (
+                    None if config["timeout"] == 0 else float(config["timeout"])
+                )
+
+            stop_heartbeat = ThreadEvent()
+            Thread(
+                target=heartbeat,
+                args=(lease_id, stop_heartbeat, config["lease_timeout"] / 3),
+                daemon=True,
+            ).start()
+
+            try:
+                result: ConvertResult = convert(
+                    config["context"],
+                    None,
+                    output_dir,
+                    root_dir,
+                    relative_root_dir,
+                    instructions,
+                    config["verbose"],
+                    config["hashed_output_names"],
+                    logger,
+                )
+            finally:
+                stop_heartbeat.set()
+
+            if result.error is not None:
+                result = result._replace(error=ConvertFailure(result.error.exception, format_traceback(result.error)))
+
+            send(("result", lease_id, result))
+            converted += 1
+    except EOFError:
+        pass
+    finally:
+        conn.close()
+
+    return converted
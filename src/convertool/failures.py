@@ -0,0 +1,93 @@
+from acacore.database import FilesDB
+from acacore.database.table import Table
+from acacore.models.file import MasterFile
+from acacore.models.file import OriginalFile
+
+from .cache import tool_version_hash
+from .convert import ConvertInstructions
+
+
+class FailureCache:
+    """
+    Skip conversions that are known to fail.
+
+    Failures are read from the error events recorded in the event log by previous runs, and are keyed by the checksum
+    of the file, the tool and output of the conversion, and the fingerprint of the version of the tools used by the
+    converter. A failure is forgotten if the same conversion succeeds in a later run, and it no longer matches once the
+    tools are upgraded.
+    """
+
+    def __init__(self, failures: set[tuple[str, str, str, str]] | None = None) -> None:
+        self.failures: set[tuple[str, str, str, str]] = failures or set()
+        self.skipped: int = 0
+
+    @classmethod
+    def from_events(
+        cls,
+        database: FilesDB,
+        files_table: Table[OriginalFile | MasterFile],
+        error_operation: str,
+        converted_operation: str,
+    ) -> "FailureCache":
+        """
+        Collect the failures of previous conversions.
+
+        :param database: The database containing the event log.
+        :param files_table: The table of the files the events refer to.
+        :param error_operation: The operation of the events that record a failed conversion.
+        :param converted_operation: The operation of the events that record a successful conversion.
+        :return: The failures.
+        """
+        failures: set[tuple[str, str, str, str]] = set()
+
+        for operation, *key in database.execute(
+            f"""
+            select l.operation,
+                   f.checksum,
+                   json_extract(l.data, '$.tool'),
+                   json_extract(l.data, '$.output'),
+                   json_extract(l.data, '$.version')
+            from {database.log.name} l
+                     join {files_table.name} f on f.uuid = l.file_uuid
+            where l.operation in (?, ?)
+              and f.checksum is not null
+              and json_extract(l.data, '$.version') is not null
+            order by l.time
+            """,
+            [error_operation, converted_operation],
+        ).fetchall():
+            if operation == error_operation:
+                failures.add(tuple(key))
+            else:
+                failures.discard(tuple(key))
+
+        return cls(failures)
+
+    @staticmethod
+    def key(instructions: ConvertInstructions) -> tuple[str, str, str, str] | None:
+        """
+        Get the key of a conversion.
+
+        :param instructions: The instructions of the conversion.
+        :return: The key, or ``None`` if the file has no checksum.
+        """
+        if not instructions.file.checksum:
+            return None
+        return (
+            instructions.file.checksum,
+            instructions.tool,
+            instructions.output,
+            tool_version_hash(instructions.converter_cls),
+        )
+
+    def allow(self, instructions: ConvertInstructions) -> bool:
+        """
+        Check whether a conversion should be attempted, and count it as skipped if not.
+
+        :param instructions: The instructions of the conversion.
+        :return: ``False`` if the conversion failed in a previous run, ``True`` otherwise.
+        """
+        if self.failures and self.key(instructions) in self.failures:
+            self.skipped += 1
+            return False
+        return True
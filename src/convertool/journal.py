@@ -0,0 +1,197 @@
+from collections.abc import Callable
+from json import dumps
+from json import JSONDecodeError
+from json import loads
+from os import PathLike
+from pathlib import Path
+from re import sub
+from typing import Any
+from typing import TextIO
+
+from acacore.database import FilesDB
+from acacore.database.table import Table
+from acacore.models.event import Event
+from acacore.models.file import ConvertedFile
+from acacore.models.file import MasterFile
+from acacore.models.file import OriginalFile
+
+from .digest import digest_files
+
+
+class RunJournal:
+    """
+    Append-only journal of completed conversions.
+
+    Each successful conversion is written to the journal, and flushed, before it is sent to the database. If the
+    program stops before the results are committed, the journal can be reconciled with the database on the next run,
+    so that the converted files are recorded instead of being converted again.
+
+    Each line of the journal is a JSON object with the UUID of the source file, its processed value after the
+    conversion, the records of the output files (including their paths, sizes, and checksums), and the "converted"
+    event.
+    """
+
+    def __init__(self, path: str | PathLike[str]) -> None:
+        self.path: Path = Path(path)
+        self._fh: TextIO | None = None
+
+    @staticmethod
+    def _name(target: str, owner: str | None = None) -> str:
+        name: str = f"convertool-journal-{target.replace(':', '-')}"
+        return f"{name}-{sub(r'[^A-Za-z0-9.-]', '_', owner)}.jsonl" if owner else f"{name}.jsonl"
+
+    @classmethod
+    def for_run(cls, directory: Path, target: str, owner: str | None = None) -> "RunJournal":
+        """
+        Get the journal of a run.
+
+        Cooperative runs each have their own journal, named after the owner of their leases, so that a run never reads
+        or clears the entries of another run that is still active.
+
+        :param directory: The directory of the journals.
+        :param target: The conversion target of the run.
+        :param owner: The owner of the leases of the run, or ``None`` if the run is not cooperative.
+        :return: The journal.
+        """
+        return cls(directory.joinpath(cls._name(target, owner)))
+
+    @classmethod
+    def orphans(cls, directory: Path, target: str, active_owners: Callable[[], set[str]]) -> list["RunJournal"]:
+        """
+        Get the journals of a target left by runs that are no longer active.
+
+        The active owners are read after the journals are listed, as runs register before they create their journal.
+
+        :param directory: The directory of the journals.
+        :param target: The conversion target.
+        :param active_owners: A function returning the owners of the runs that are still active.
+        :return: The journals of the target whose owner is not active.
+        """
+        paths: list[Path] = sorted(directory.glob(f"{cls._name(target).removesuffix('.jsonl')}*.jsonl"))
+        active: set[str] = {cls._name(target, owner) for owner in active_owners()}
+        return [cls(path) for path in paths if path.name not in active]
+
+    def __enter__(self) -> "RunJournal":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = self.path.open("a", encoding="utf-8")
+        return self
+
+    def __exit__(self, _exc_type: type[BaseException] | None, _exc_val: Any, _exc_tb: Any) -> None:  # noqa: ANN401
+        self.close()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def write(
+        self,
+        file: OriginalFile | MasterFile,
+        output_files: list[ConvertedFile],
+        event: Event,
+    ):
+        """
+        Append a completed conversion to the journal.
+
+        :param file: The source file, with its updated processed value.
+        :param output_files: The records of the output files.
+        :param event: The event of the conversion.
+        """
+        entry: dict[str, Any] = {
+            "uuid": str(file.uuid),
+            "processed": file.processed,
+            "outputs": [f.model_dump(mode="json") for f in output_files],
+            "event": event.model_dump(mode="json"),
+        }
+        self._fh.write(dumps(entry) + "\n")
+        self._fh.flush()
+
+    def entries(self) -> list[dict[str, Any]]:
+        """
+        Read the entries of the journal.
+
+        Lines that cannot be parsed, like a line that was being written when the program stopped, are skipped.
+
+        :return: The list of entries.
+        """
+        if not self.path.is_file():
+            return []
+
+        entries: list[dict[str, Any]] = []
+
+        with self.path.open(encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entries.append(loads(line))
+                except JSONDecodeError:
+                    continue
+
+        return entries
+
+    def clear(self):
+        """Remove all entries from the journal."""
+        if self._fh is not None:
+            self._fh.seek(0)
+            self._fh.truncate()
+        else:
+            self.path.unlink(missing_ok=True)
+
+    def reconcile(
+        self,
+        database: FilesDB,
+        src_table: Table[OriginalFile | MasterFile],
+        out_table: Table[ConvertedFile],
+        root: Path,
+        is_processed: Callable[[OriginalFile | MasterFile], bool],
+        set_processed: Callable[[OriginalFile | MasterFile], bool | int],
+    ) -> tuple[list[str], int]:
+        """
+        Record the conversions in the journal that are missing from the database.
+
+        A conversion is recorded only if its source file is not already processed, and all its output files exist
+        with the expected size and checksum. The processed value of the source file is computed from its current row,
+        so that changes made by other targets since the conversion are kept. The journal is cleared once the changes
+        are committed.
+
+        :param database: The database.
+        :param src_table: The table of the source files.
+        :param out_table: The table of the output files.
+        :param root: The root directory of the output files.
+        :param is_processed: A function returning whether a source file has already been processed.
+        :param set_processed: A function returning the processed value of a converted source file.
+        :return: The UUIDs of the source files whose conversions were recorded and the number of discarded conversions.
+        """
+        recorded: list[str] = []
+        discarded: int = 0
+
+        for entry in self.entries():
+            file: OriginalFile | MasterFile | None = src_table.select({"uuid": entry["uuid"]}).fetchone()
+            if file is None or is_processed(file):
+                continue
+
+            output_files: list[ConvertedFile] = [out_table.model.model_validate(o) for o in entry["outputs"]]
+
+            paths: list[Path] = [f.get_absolute_path(root) for f in output_files]
+
+            if not all(p.is_file() and p.stat().st_size == f.size for f, p in zip(output_files, paths, strict=True)):
+                discarded += 1
+                continue
+
+            # Outputs may have been rewritten with the same size after the conversion
+            if not all(
+                d.result().checksum == f.checksum for f, d in zip(output_files, digest_files(paths), strict=True)
+            ):
+                discarded += 1
+                continue
+
+            if output_files:
+                out_table.insert(*output_files)
+            file.processed = set_processed(file)
+            src_table.update(file)
+            database.log.insert(Event.model_validate(entry["event"]))
+            recorded.append(entry["uuid"])
+
+        database.commit()
+        self.clear()
+
+        return recorded, discarded
@@ -0,0 +1,137 @@
+from collections.abc import Callable
+from os import getpid
+from os import PathLike
+from pathlib import Path
+from socket import gethostname
+from sqlite3 import connect
+from sqlite3 import Connection
+from threading import Event as ThreadEvent
+from threading import Thread
+from time import time
+from typing import Any
+from uuid import uuid4
+
+from acacore.database.table import Table
+from acacore.models.file import MasterFile
+from acacore.models.file import OriginalFile
+
+
+class RowLeases:
+    """
+    Leases on files shared by concurrent runs on the same AVID.
+
+    Each run claims the files it is about to convert, files that are leased by another run are skipped. Leases are
+    stored in a separate SQLite database so that claiming a file never waits on the results being written to the main
+    database.
+
+    Leases are renewed in the background for as long as the run is active, and released when it ends. The leases of
+    a run that stopped without releasing them expire after ``timeout`` seconds. Each run is also registered as an
+    owner for as long as it is active, whether it holds leases or not, so that other runs can tell whether it is still
+    alive.
+    """
+
+    def __init__(self, path: str | PathLike[str], target: str, timeout: float) -> None:
+        self.path: Path = Path(path)
+        self.target: str = target
+        self.timeout: float = timeout
+        self.owner: str = f"{gethostname()}:{getpid()}:{uuid4().hex[:8]}"
+        self._conn: Connection | None = None
+        self._stop: ThreadEvent = ThreadEvent()
+        self._heartbeat: Thread = Thread(target=self._renew, name="convertool-leases", daemon=True)
+
+    def __enter__(self) -> "RowLeases":
+        self._conn = self._connect()
+        self._conn.execute(
+            "insert or replace into owners (owner, expires) values (?, ?)",
+            [self.owner, time() + self.timeout],
+        )
+        self._heartbeat.start()
+        return self
+
+    def __exit__(self, _exc_type: type[BaseException] | None, _exc_val: Any, _exc_tb: Any) -> None:  # noqa: ANN401
+        self._stop.set()
+        self._heartbeat.join()
+        self._conn.execute("delete from leases where owner = ?", [self.owner])
+        self._conn.execute("delete from owners where owner = ?", [self.owner])
+        self._conn.close()
+
+    def _connect(self) -> Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn: Connection = connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("pragma journal_mode = wal")
+        conn.execute(
+            "create table if not exists leases ("
+            "uuid text not null, target text not null, owner text not null, expires real not null, "
+            "primary key (uuid, target))"
+        )
+        conn.execute("create table if not exists owners (owner text primary key, expires real not null)")
+        return conn
+
+    def _renew(self):
+        conn: Connection = self._connect()
+        try:
+            while not self._stop.wait(self.timeout / 3):
+                expires: float = time() + self.timeout
+                conn.execute("update leases set expires = ? where owner = ?", [expires, self.owner])
+                conn.execute("update owners set expires = ? where owner = ?", [expires, self.owner])
+        finally:
+            conn.close()
+
+    def active_owners(self) -> set[str]:
+        """
+        Get the owners of the runs that are still active.
+
+        :return: The owners whose registration has not expired.
+        """
+        conn: Connection = self._connect()
+        try:
+            return {owner for (owner,) in conn.execute("select owner from owners where expires >= ?", [time()])}
+        finally:
+            conn.close()
+
+    def claim(
+        self,
+        file: OriginalFile | MasterFile,
+        src_table: Table[OriginalFile | MasterFile],
+        is_processed: Callable[[OriginalFile | MasterFile], bool],
+    ) -> bool:
+        """
+        Claim a file for this run.
+
+        The claim succeeds if the file is not leased, or if its lease has expired. Once claimed, the file is read again
+        from the database to check that it was not processed by another run in the meantime.
+
+        :param file: The file to claim.
+        :param src_table: The table containing the file.
+        :param is_processed: A function returning whether the file has already been processed.
+        :return: ``True`` if the file was claimed and still needs to be processed, ``False`` otherwise.
+        """
+        now: float = time()
+        cursor = self._conn.execute(
+            "insert into leases (uuid, target, owner, expires) values (?, ?, ?, ?) "
+            "on conflict (uuid, target) do update set owner = excluded.owner, expires = excluded.expires "
+            "where leases.expires < ? or leases.owner = excluded.owner",
+            [str(file.uuid), self.target, self.owner, now + self.timeout, now],
+        )
+
+        if cursor.rowcount < 1:
+            return False
+
+        current: OriginalFile | MasterFile | None = src_table.select({"uuid": str(file.uuid)}).fetchone()
+
+        if current is None or is_processed(current):
+            self.release(file)
+            return False
+
+        return True
+
+    def release(self, file: OriginalFile | MasterFile):
+        """
+        Release the lease on a file.
+
+        :param file: The file to release.
+        """
+        self._conn.execute(
+            "delete from leases where uuid = ? and target = ? and owner = ?",
+            [str(file.uuid), self.target, self.owner],
+        )
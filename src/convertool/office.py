@@ -0,0 +1,243 @@
+from json import loads
+from multiprocessing.util import Finalize
+from os import environ
+from os import getpid
+from pathlib import Path
+from shutil import rmtree
+from subprocess import DEVNULL
+from subprocess import Popen
+from subprocess import TimeoutExpired
+from tempfile import mkdtemp
+from threading import Lock
+from threading import Timer
+from time import monotonic
+from time import sleep
+from typing import Any
+from uuid import uuid4
+
+from .util import _kill_process_group
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+except ImportError:  # The Python bindings of LibreOffice are not installed
+    uno = None
+
+OFFICE_SERVER_ENV: str = "CONVERTOOL_OFFICE_SERVER"
+_servers: dict[tuple[int, str], "OfficeServer"] = {}
+
+
+class OfficeServerError(Exception): ...
+
+
+def _properties(**values: Any) -> tuple[Any, ...]:  # noqa: ANN401
+    properties: list[Any] = []
+    for name, value in values.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        properties.append(prop)
+    return tuple(properties)
+
+
+class OfficeServer:
+    """
+    A long-running headless LibreOffice instance that converts documents over UNO.
+
+    The instance is started on the first conversion and listens on a named pipe. Its profile is created once and kept
+    for the life of the server, so it is not initialised again for every file. The instance is restarted after
+    ``max_jobs`` conversions to release the memory it accumulates, and when it crashes or times out, in which case its
+    profile is also discarded.
+    """
+
+    def __init__(self, command: str, max_jobs: int, startup_timeout: float = 60.0) -> None:
+        self.command: str = command
+        self.max_jobs: int = max_jobs
+        self.startup_timeout: float = startup_timeout
+        self.jobs: int = 0
+        self.pipe_name: str = f"convertool-{getpid()}-{uuid4().hex[:8]}"
+        self.profile_dir: Path = Path(mkdtemp(prefix="convertool-office-"))
+        self.process: Popen | None = None
+        self._desktop: Any = None
+        self._lock: Lock = Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """
+        Start the instance and connect to it.
+
+        :raise OfficeServerError: If the instance exits or cannot be reached before ``startup_timeout``.
+        """
+        self.process = Popen(
+            [
+                self.command,
+                "--headless",
+                "--invisible",
+                "--nologo",
+                "--nodefault",
+                "--norestore",
+                "--nolockcheck",
+                f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext",
+                f"-env:UserInstallation={self.profile_dir.as_uri()}",
+            ],
+            stdout=DEVNULL,
+            stderr=DEVNULL,
+            start_new_session=True,
+        )
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver",
+            local_context,
+        )
+        deadline: float = monotonic() + self.startup_timeout
+
+        while True:
+            try:
+                context = resolver.resolve(f"uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext")
+                break
+            except NoConnectException:
+                if not self.running or monotonic() > deadline:
+                    self.stop(reset=True)
+                    raise OfficeServerError(f"{self.command} could not be started")
+                sleep(0.25)
+
+        self._desktop = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+        self.jobs = 0
+
+    def stop(self, *, reset: bool = False):
+        """
+        Stop the instance.
+
+        :param reset: Whether to discard the profile of the instance.
+        """
+        if self._desktop is not None and self.running:
+            try:
+                self._desktop.terminate()
+                self.process.wait(10)
+            except Exception:
+                pass
+        if self.process is not None and self.process.poll() is None:
+            _kill_process_group(self.process)
+            self.process.wait()
+        self.process = None
+        self._desktop = None
+        if reset:
+            rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+
+    def close(self):
+        """Stop the instance and remove its profile."""
+        self.stop()
+        rmtree(self.profile_dir, ignore_errors=True)
+
+    def convert(self, src: Path, dest_dir: Path, output: str, output_filter: str, timeout: float | None = None) -> Path:
+        """
+        Convert a document.
+
+        :param src: The path to the document.
+        :param dest_dir: The directory where the output is saved. Filters that produce more than one file save the
+            others next to it.
+        :param output: The extension of the output.
+        :param output_filter: The name of the export filter, optionally followed by a colon and its options as a JSON
+            object, as accepted by the ``--convert-to`` argument of LibreOffice.
+        :param timeout: The maximum number of seconds the conversion can take.
+        :raise OfficeServerError: If the conversion fails.
+        :raise TimeoutExpired: If the conversion times out.
+        :return: The path to the output.
+        """
+        filter_name, _, filter_options = output_filter.partition(":")
+        dest_file: Path = dest_dir.joinpath(f"{src.stem}.{output}")
+        store_properties: dict[str, Any] = {"FilterName": filter_name}
+
+        if filter_options:
+            store_properties["FilterData"] = uno.Any(
+                "[]com.sun.star.beans.PropertyValue",
+                _properties(**loads(filter_options)),
+            )
+
+        with self._lock:
+            if self.running and self.jobs >= self.max_jobs:
+                self.stop()
+            if not self.running:
+                self.stop(reset=self.process is not None)
+                self.start()
+
+            self.jobs += 1
+            # The instance is killed if the conversion takes too long, which interrupts the pending UNO call
+            timer: Timer | None = Timer(timeout, _kill_process_group, [self.process]) if timeout else None
+
+            try:
+                if timer:
+                    timer.start()
+                document = self._desktop.loadComponentFromURL(
+                    src.as_uri(),
+                    "_blank",
+                    0,
+                    _properties(Hidden=True, ReadOnly=True, UpdateDocMode=0),
+                )
+                if document is None:
+                    raise OfficeServerError(f"{src.name} could not be loaded")
+                try:
+                    document.storeToURL(dest_file.as_uri(), _properties(**store_properties))
+                finally:
+                    document.close(True)
+            except Exception as err:
+                if timer and timer.finished.is_set():
+                    self.stop(reset=True)
+                    raise TimeoutExpired(self.command, timeout)
+                if not self.running:
+                    self.stop(reset=True)
+                if isinstance(err, OfficeServerError):
+                    raise
+                raise OfficeServerError(getattr(err, "Message", None) or repr(err))
+            finally:
+                if timer:
+                    timer.cancel()
+
+        return dest_file
+
+
+def _close_servers():
+    # Servers inherited from the parent process belong to it
+    for key in [k for k in _servers if k[0] == getpid()]:
+        _servers.pop(key).close()
+
+
+def office_server_available() -> bool:
+    return uno is not None
+
+
+def enable_office_server(max_jobs: int):
+    """
+    Enable the LibreOffice servers in the current process and in the processes it starts.
+
+    :param max_jobs: The number of conversions after which a server is restarted. Use 0 to disable the servers.
+    """
+    environ[OFFICE_SERVER_ENV] = str(max_jobs)
+
+
+def office_server(command: str) -> OfficeServer | None:
+    """
+    Get the LibreOffice server of the current process.
+
+    Each process, and so each slot of the worker pool, has its own server for each LibreOffice command. Servers are
+    closed when the process exits.
+
+    :param command: The LibreOffice command.
+    :return: The server, or ``None`` if the servers are not enabled or the Python bindings of LibreOffice are not
+        available.
+    """
+    if uno is None or not (max_jobs := int(environ.get(OFFICE_SERVER_ENV) or 0)):
+        return None
+
+    if (server := _servers.get((getpid(), command))) is None:
+        if not any(pid == getpid() for pid, _ in _servers):
+            # Worker processes exit without running atexit handlers, but they do run multiprocessing finalizers
+            Finalize(None, _close_servers, exitpriority=10)
+        server = _servers[(getpid(), command)] = OfficeServer(command, max_jobs)
+
+    return server
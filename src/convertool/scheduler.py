@@ -0,0 +1,531 @@
+from asyncio import AbstractEventLoop
+from asyncio import all_tasks
+from asyncio import current_task
+from asyncio import gather
+from asyncio import new_event_loop
+from asyncio import run_coroutine_threadsafe
+from collections import Counter
+from collections import deque
+from collections.abc import Generator
+from collections.abc import Iterable
+from concurrent.futures import Future
+from json import dumps
+from logging import INFO
+from multiprocessing import Pool
+from pathlib import Path
+from queue import Empty
+from queue import SimpleQueue
+from signal import SIG_IGN
+from signal import SIGINT
+from signal import signal
+from threading import Thread
+from traceback import format_exception_only
+from typing import Any
+
+from acacore.database import FilesDB
+from acacore.models.event import Event
+from acacore.models.file import AccessFile
+from acacore.models.file import MasterFile
+from acacore.models.file import OriginalFile
+from acacore.models.file import StatutoryFile
+from acacore.utils.click import context_commands
+from click import Context
+from structlog.stdlib import BoundLogger
+
+from .cache import ConvertCache
+from .controller import ConcurrencyController
+from .convert import convert
+from .convert import convert_async
+from .convert import convert_batch
+from .convert import ConvertFailure
+from .convert import ConvertInstructions
+from .convert import ConvertResult
+from .convert import format_traceback
+from .converters import ConverterABC
+
+_worker: dict[str, Any] = {}
+
+type ConvertJob = ConvertInstructions | list[ConvertInstructions]
+
+
+def _job_instructions(job: ConvertJob) -> list[ConvertInstructions]:
+    return job if isinstance(job, list) else [job]
+
+
+def _native_async(job: ConvertJob) -> bool:
+    # Converters that override convert_async only wait on external processes
+    return (
+        not isinstance(job, list)
+        and job.converter_cls.multithreading
+        and job.converter_cls.convert_async is not ConverterABC.convert_async
+    )
+
+
+def _job_memory(job: ConvertJob) -> float:
+    # The files of a batch are converted one after the other by the same process
+    return max(i.converter_cls.estimate_memory(i.file) for i in _job_instructions(job))
+
+
+def batch_instructions(instructions: Iterable[ConvertInstructions], size: int) -> Generator[ConvertJob, None, None]:
+    """
+    Group the instructions that can be converted together.
+
+    Instructions whose converter can convert their output in batches are held back until ``size`` of them share the
+    same converter, tool, output, and options, and are then yielded as a list. Their timeouts are added up when the
+    batch is converted, so instructions with different timeouts can be grouped together. The other instructions are
+    yielded as they come. Incomplete groups are yielded once all the instructions have been read.
+
+    :param instructions: The instructions to group.
+    :param size: The maximum number of instructions in a batch. Use 1 or less to disable batches.
+    """
+    groups: dict[str, list[ConvertInstructions]] = {}
+
+    for inst in instructions:
+        if size <= 1 or inst.output not in inst.converter_cls.batch_outputs:
+            yield inst
+            continue
+        key: str = dumps(
+            [inst.converter_cls.__name__, inst.tool, inst.output, inst.options],
+            sort_keys=True,
+            default=str,
+        )
+        (group := groups.setdefault(key, [])).append(inst)
+        if len(group) >= size:
+            yield groups.pop(key)
+
+    for group in groups.values():
+        yield group if len(group) > 1 else group[0]
+
+
+def _init_worker(
+    context: str,
+    output_dir: Path,
+    root_dir: Path,
+    relative_root_dir: Path,
+    verbose: bool,
+    hashed_output_names: bool,
+    timeout: int | None,
+    logger: BoundLogger,
+    cache: ConvertCache | None,
+):
+    # Interrupts are handled by the parent process, which terminates the pool
+    signal(SIGINT, SIG_IGN)
+    _worker.update(
+        context=context,
+        output_dir=output_dir,
+        root_dir=root_dir,
+        relative_root_dir=relative_root_dir,
+        verbose=verbose,
+        hashed_output_names=hashed_output_names,
+        timeout=timeout,
+        logger=logger,
+        cache=cache,
+    )
+
+
+def _picklable_result[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | StatutoryFile](
+    result: ConvertResult[M, O],
+) -> ConvertResult[M, O]:
+    if result.error is not None:
+        return result._replace(error=ConvertFailure(result.error.exception, format_traceback(result.error)))
+    return result
+
+
+def _convert_worker[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | StatutoryFile](
+    job: ConvertInstructions[M, O] | list[ConvertInstructions[M, O]],
+) -> list[ConvertResult[M, O]]:
+    instructions: list[ConvertInstructions[M, O]] = _job_instructions(job)
+
+    if _worker["timeout"] is not None:
+        instructions[0].converter_cls.process_timeout = None if _worker["timeout"] == 0 else float(_worker["timeout"])
+
+    if isinstance(job, list):
+        results = convert_batch(
+            _worker["context"],
+            None,
+            _worker["output_dir"],
+            _worker["root_dir"],
+            _worker["relative_root_dir"],
+            job,
+            _worker["verbose"],
+            _worker["hashed_output_names"],
+            _worker["logger"],
+            _worker["cache"],
+        )
+    else:
+        results = [
+            convert(
+                _worker["context"],
+                None,
+                _worker["output_dir"],
+                _worker["root_dir"],
+                _worker["relative_root_dir"],
+                job,
+                _worker["verbose"],
+                _worker["hashed_output_names"],
+                _worker["logger"],
+                _worker["cache"],
+            )
+        ]
+
+    return [_picklable_result(r) for r in results]
+
+
+class ConvertPool:
+    """
+    A persistent pool of worker processes.
+
+    Instructions are dispatched to the first idle worker as soon as they are submitted, and results are collected in
+    the order in which they are completed, so a single slow file does not hold back the rest of the queue. A batch of
+    instructions is dispatched to a single worker.
+
+    The pool also keeps count of how many running conversions use each dependency, so that instructions can be held
+    back when the quota for one of their dependencies has been reached.
+
+    If ``async_jobs`` is given, the conversions of converters with a native ``convert_async`` method are run from an
+    event loop in a background thread of the current process instead, up to ``async_jobs`` at the same time, so that
+    they do not take a worker process each.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        context: str,
+        output_dir: Path,
+        root_dir: Path,
+        relative_root_dir: Path,
+        verbose: bool,
+        hashed_output_names: bool,
+        timeout: int | None,
+        logger: BoundLogger,
+        quotas: dict[str, int] | None = None,
+        memory_budget: float | None = None,
+        cache: ConvertCache | None = None,
+        async_jobs: int = 0,
+    ) -> None:
+        self.processes: int = processes
+        self.limit: int = processes
+        self.quotas: dict[str, int] = quotas or {}
+        self.memory_budget: float | None = memory_budget
+        self.running: int = 0
+        self.usage: Counter[str] = Counter()
+        self.memory: float = 0.0
+        self.async_jobs: int = async_jobs
+        self.async_running: int = 0
+        self._results: SimpleQueue[list[ConvertResult]] = SimpleQueue()
+        self._pool = Pool(
+            processes,
+            _init_worker,
+            (context, output_dir, root_dir, relative_root_dir, verbose, hashed_output_names, timeout, logger, cache),
+        )
+        self._async_args: tuple[Any, ...] = (
+            context,
+            None,
+            output_dir,
+            root_dir,
+            relative_root_dir,
+        )
+        self._async_kwargs: dict[str, Any] = {
+            "verbose": verbose,
+            "hashed_output_name": hashed_output_names,
+            "logger": logger,
+            "cache": cache,
+        }
+        self._loop: AbstractEventLoop | None = new_event_loop() if async_jobs else None
+        self._loop_thread: Thread | None = None
+
+    def __enter__(self) -> "ConvertPool":
+        if self._loop:
+            self._loop_thread = Thread(target=self._loop.run_forever, name="convertool-async", daemon=True)
+            self._loop_thread.start()
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, _exc_val: Any, _exc_tb: Any) -> None:  # noqa: ANN401
+        if exc_type is None:
+            self._pool.close()
+        else:
+            self._pool.terminate()
+        self._pool.join()
+        if self._loop:
+            if exc_type is not None:
+                run_coroutine_threadsafe(self._cancel_async(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
+
+    @staticmethod
+    async def _cancel_async() -> None:
+        # Cancelled processes are killed by run_process_async
+        tasks = [t for t in all_tasks() if t is not current_task()]
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
+
+    @property
+    def full(self) -> bool:
+        return self.running - self.async_running >= self.limit
+
+    @property
+    def async_full(self) -> bool:
+        return self.async_running >= self.async_jobs
+
+    def native_async(self, job: ConvertJob) -> bool:
+        """
+        Check whether the instructions are run from the event loop of the pool.
+
+        :param job: The instructions, or batch of instructions, to check.
+        :return: ``True`` if the pool has an event loop and the converter has a native ``convert_async`` method.
+        """
+        return bool(self.async_jobs) and _native_async(job)
+
+    def admissible(self, job: ConvertJob) -> bool:
+        """
+        Check whether the instructions can be started without exceeding the quotas or the memory budget.
+
+        A conversion whose estimated memory exceeds the budget on its own is started when no other conversion is
+        running, so that it is not held back forever.
+
+        :param job: The instructions, or batch of instructions, to check.
+        :return: ``True`` if none of the converter's dependencies has reached its quota and the estimated memory of
+            the conversion fits in the budget, ``False`` otherwise.
+        """
+        converter_cls = _job_instructions(job)[0].converter_cls
+
+        if self.memory_budget is not None and self.running and self.memory + _job_memory(job) > self.memory_budget:
+            return False
+
+        return all(self.usage[dep] < self.quotas[dep] for dep in converter_cls.dependencies or {} if dep in self.quotas)
+
+    def submit(self, job: ConvertJob):
+        """
+        Send instructions, or a batch of instructions, to the first available worker.
+
+        :param job: The instructions to convert.
+        """
+        instructions: list[ConvertInstructions] = _job_instructions(job)
+        self.running += 1
+        self.usage.update(list(instructions[0].converter_cls.dependencies or {}))
+        self.memory += _job_memory(job)
+
+        if self.native_async(job):
+            self.async_running += 1
+            future: Future[ConvertResult] = run_coroutine_threadsafe(
+                convert_async(*self._async_args, job, **self._async_kwargs),
+                self._loop,
+            )
+            future.add_done_callback(lambda f: self._put_async(job, f))
+            return
+
+        self._pool.apply_async(
+            _convert_worker,
+            (job,),
+            callback=self._results.put,
+            error_callback=lambda err: self._results.put(
+                [
+                    ConvertResult(inst, [], ConvertFailure(err, "".join(format_exception_only(err))), 0.0)
+                    for inst in instructions
+                ]
+            ),
+        )
+
+    def _put_async(self, instructions: ConvertInstructions, future: Future[ConvertResult]):
+        if future.cancelled():
+            return
+        if (err := future.exception()) is not None:
+            self._results.put(
+                [ConvertResult(instructions, [], ConvertFailure(err, "".join(format_exception_only(err))), 0.0)]
+            )
+        else:
+            self._results.put([future.result()])
+
+    def _get(self, timeout: float | None = None) -> list[ConvertResult]:
+        results = self._results.get(timeout=timeout)
+        job: ConvertJob = [r.instructions for r in results] if len(results) > 1 else results[0].instructions
+        self.running -= 1
+        self.async_running -= self.native_async(job)
+        self.usage.subtract(list(results[0].instructions.converter_cls.dependencies or {}))
+        self.memory -= _job_memory(job)
+        return results
+
+    def results(self, *, block: bool = False, timeout: float | None = None) -> Generator[ConvertResult, None, None]:
+        """
+        Yield the results of the completed conversions.
+
+        :param block: If ``True``, wait for at least one result to be available.
+        :param timeout: The maximum number of seconds to wait for a result when blocking.
+        """
+        if block and self.running:
+            try:
+                yield from self._get(timeout)
+            except Empty:
+                return
+        while self.running and not self._results.empty():
+            yield from self._get()
+
+    def wait(self) -> Generator[ConvertResult, None, None]:
+        """Yield the results of all remaining conversions as they complete."""
+        while self.running:
+            yield from self._get()
+
+
+def convert_instructions[M: OriginalFile | MasterFile, O: MasterFile | AccessFile | StatutoryFile](
+    context: Context | str,
+    database: FilesDB | None,
+    output_dir: Path,
+    root_dir: Path,
+    relative_root_dir: Path,
+    instructions: Iterable[ConvertInstructions[M, O]],
+    threads: int,
+    verbose: bool,
+    hashed_output_names: bool,
+    timeout: int | None,
+    logger: BoundLogger,
+    quotas: dict[str, int] | None = None,
+    controller: ConcurrencyController | None = None,
+    memory_budget: float | None = None,
+    cache: ConvertCache | None = None,
+    batch_size: int = 0,
+    async_jobs: int = 0,
+) -> Generator[ConvertResult[M, O], None, None]:
+    """
+    Convert a stream of instructions.
+
+    Converters that support multithreading are run in a persistent pool of worker processes that is kept alive for
+    the whole run, the others are run in the current process. Results are yielded as soon as they are available.
+
+    Instructions whose dependencies have reached their quota are held back, and instructions that come after them
+    are started in the meantime. The same happens to instructions whose estimated memory does not fit in what is left
+    of the memory budget, so that smaller conversions keep running while a larger one waits for memory to be freed.
+
+    If a concurrency controller is given, the number of concurrent conversions in the pool is adjusted to the load of
+    the system while the conversions run, within the bounds of the controller.
+
+    If a batch size is given, instructions that can be converted together are grouped with ``batch_instructions``, and
+    each batch is converted by a single worker with ``convert_batch``.
+
+    If a number of asynchronous jobs is given, the conversions of converters with a native ``convert_async`` method,
+    like audio and video, are awaited from an event loop in the current process instead of taking a worker process
+    each. They are limited by ``async_jobs`` rather than by the number of worker processes.
+
+    :param context: The click context or the name of the command.
+    :param database: The database, it is only passed to converters running in the current process.
+    :param output_dir: The output directory.
+    :param root_dir: The root directory of the files.
+    :param relative_root_dir: The directory the converted files should be relative to.
+    :param instructions: The instructions to convert. They are consumed lazily.
+    :param threads: The number of worker processes. Use 1 to run all conversions in the current process.
+    :param verbose: Whether to show the output of the converters.
+    :param hashed_output_names: Whether to use hashed names for the output files.
+    :param timeout: The timeout override for the converters in the worker processes.
+    :param logger: The logger to use.
+    :param quotas: The maximum number of concurrent conversions for each dependency.
+    :param controller: The controller used to adjust the number of concurrent conversions.
+    :param memory_budget: The maximum estimated memory, in megabytes, of the concurrent conversions.
+    :param cache: The cache of conversion outputs.
+    :param batch_size: The maximum number of instructions converted together. Use 0 to convert each file on its own.
+    :param async_jobs: The maximum number of conversions run from the event loop of the pool. Use 0 to run all
+        conversions in worker processes.
+    """
+    context_str: str = ".".join(context_commands(context)) if isinstance(context, Context) else context
+
+    def run(job: ConvertJob) -> list[ConvertResult[M, O]]:
+        if isinstance(job, list):
+            return convert_batch(
+                context_str,
+                database,
+                output_dir,
+                root_dir,
+                relative_root_dir,
+                job,
+                verbose,
+                hashed_output_names,
+                logger,
+                cache,
+            )
+        return [
+            convert(
+                context_str,
+                database,
+                output_dir,
+                root_dir,
+                relative_root_dir,
+                job,
+                verbose,
+                hashed_output_names,
+                logger,
+                cache,
+            )
+        ]
+
+    jobs: Iterable[ConvertJob] = batch_instructions(instructions, batch_size)
+
+    if threads <= 1 and not async_jobs:
+        for job in jobs:
+            yield from run(job)
+        return
+
+    pending: deque[ConvertJob] = deque()
+
+    with ConvertPool(
+        threads,
+        context_str,
+        output_dir,
+        root_dir,
+        relative_root_dir,
+        verbose,
+        hashed_output_names,
+        timeout,
+        logger,
+        quotas,
+        memory_budget,
+        cache,
+        async_jobs,
+    ) as pool:
+        wait_timeout: float | None = None
+
+        if controller:
+            pool.limit = min(controller.limit, threads)
+            wait_timeout = controller.interval or None
+
+        def adjust():
+            if controller and (load := controller.update()):
+                pool.limit = min(controller.limit, threads)
+                Event.from_command(context, "concurrency").log(
+                    INFO,
+                    logger,
+                    limit=pool.limit,
+                    load=round(load.load, 2),
+                    memory=round(load.memory, 2),
+                    iowait=round(load.iowait, 2),
+                )
+
+        def dispatch() -> Generator[ConvertResult[M, O], None, None]:
+            for job in list(pending):
+                multithreading: bool = _job_instructions(job)[0].converter_cls.multithreading
+                if pool.native_async(job):
+                    if pool.async_full:
+                        continue
+                elif multithreading and pool.full:
+                    continue
+                if not pool.admissible(job):
+                    continue
+                pending.remove(job)
+                if multithreading:
+                    pool.submit(job)
+                else:
+                    yield from run(job)
+
+        for job in jobs:
+            pending.append(job)
+            yield from dispatch()
+            yield from pool.results()
+            # Only read ahead a limited number of instructions when they are held back by the quotas or memory budget
+            while len(pending) >= threads * 4:
+                yield from pool.results(block=True, timeout=wait_timeout)
+                adjust()
+                yield from dispatch()
+
+        while pending or pool.running:
+            yield from pool.results(block=True, timeout=wait_timeout)
+            adjust()
+            yield from dispatch()
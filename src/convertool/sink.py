@@ -0,0 +1,158 @@
+from os import PathLike
+from pathlib import Path
+from queue import Empty
+from queue import SimpleQueue
+from threading import Thread
+from typing import Any
+from typing import Literal
+
+from acacore.database import FilesDB
+from acacore.database.table import Table
+from acacore.models.event import Event
+from acacore.models.file import ConvertedFile
+from acacore.models.file import MasterFile
+from acacore.models.file import OriginalFile
+
+type SinkEntry = OriginalFile | MasterFile | ConvertedFile | Event
+type SinkOperation = tuple[Literal["insert", "update"], str, SinkEntry] | tuple[Literal["commit"], None, None]
+
+
+class ResultSink:
+    """
+    Write the results of conversions to the database from a dedicated thread.
+
+    Operations are queued by the main thread and written by the sink in batches, inserts into the same table are
+    grouped into a single ``executemany`` call. The sink uses its own connection to the database, which is opened in
+    its thread.
+
+    Exiting the context flushes all the queued operations before returning. Operations that were not followed by a
+    commit are committed only if the context exits without errors.
+    """
+
+    def __init__(self, database_path: str | PathLike[str], batch_size: int = 500) -> None:
+        self.database_path: Path = Path(database_path)
+        self.batch_size: int = batch_size
+        self.error: BaseException | None = None
+        self._commit_on_close: bool = True
+        self._queue: SimpleQueue[SinkOperation | None] = SimpleQueue()
+        self._thread: Thread = Thread(target=self._run, name="convertool-sink", daemon=True)
+
+    def __enter__(self) -> "ResultSink":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, _exc_val: Any, _exc_tb: Any) -> None:  # noqa: ANN401
+        self.close(commit=exc_type is None)
+
+    def _put(self, operation: SinkOperation):
+        if self.error is not None:
+            raise self.error
+        self._queue.put(operation)
+
+    def insert(self, table: Table, *entries: SinkEntry):
+        """
+        Queue entries to be inserted in a table.
+
+        :param table: The table to insert the entries into.
+        :param entries: The entries to insert.
+        :raise BaseException: If the sink failed to write a previous batch.
+        """
+        for entry in entries:
+            self._put(("insert", table.name, entry))
+
+    def update(self, table: Table, entry: SinkEntry):
+        """
+        Queue an entry to be updated in a table.
+
+        :param table: The table containing the entry.
+        :param entry: The updated entry.
+        :raise BaseException: If the sink failed to write a previous batch.
+        """
+        self._put(("update", table.name, entry))
+
+    def commit(self):
+        """
+        Queue a commit.
+
+        :raise BaseException: If the sink failed to write a previous batch.
+        """
+        self._put(("commit", None, None))
+
+    def close(self, *, commit: bool = True):
+        """
+        Flush the queued operations and stop the sink.
+
+        :param commit: Whether to commit the operations that were not followed by a commit.
+        :raise BaseException: If the sink failed to write the queued operations.
+        """
+        self._commit_on_close = commit
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _batch(self) -> tuple[list[SinkOperation], bool]:
+        operations: list[SinkOperation] = []
+        operation: SinkOperation | None = self._queue.get()
+
+        while operation is not None:
+            operations.append(operation)
+            if len(operations) >= self.batch_size:
+                return operations, False
+            try:
+                operation = self._queue.get_nowait()
+            except Empty:
+                return operations, False
+
+        return operations, True
+
+    @staticmethod
+    def _write(database: FilesDB, tables: dict[str, Table], operations: list[SinkOperation]) -> None:
+        inserts: dict[str, list[SinkEntry]] = {}
+        updates: list[tuple[str, SinkEntry]] = []
+        commit: bool = False
+
+        for action, table, entry in operations:
+            if action == "insert":
+                inserts.setdefault(table, []).append(entry)
+            elif action == "update":
+                updates.append((table, entry))
+            elif action == "commit":
+                commit = True
+
+        for table, entries in inserts.items():
+            tables[table].insert(*entries)
+        for table, entry in updates:
+            tables[table].update(entry)
+
+        if commit:
+            database.commit()
+
+    def _run(self):
+        stop: bool = False
+
+        try:
+            with FilesDB(self.database_path) as database:
+                tables: dict[str, Table] = {
+                    t.name: t
+                    for t in (
+                        database.original_files,
+                        database.master_files,
+                        database.access_files,
+                        database.statutory_files,
+                        database.log,
+                    )
+                }
+                while not stop:
+                    operations, stop = self._batch()
+                    self._write(database, tables, operations)
+                if self._commit_on_close:
+                    database.commit()
+                else:
+                    database.rollback()
+        except BaseException as err:
+            self.error = err
+            # Keep consuming the queue until the sink is closed so that the main thread is never blocked
+            while not stop:
+                stop = self._queue.get() is None
@@ -1,11 +1,31 @@
+from asyncio import CancelledError
+from asyncio import create_subprocess_exec
+from asyncio import ensure_future
+from asyncio import Task
+from asyncio import wait
+from asyncio import wait_for
+from asyncio.subprocess import PIPE
+from asyncio.subprocess import Process
+from collections.abc import Callable
+from os import environ
+from os import fstat
+from os import link
 from os import PathLike
 from pathlib import Path
 from platform import system
+from shutil import copyfileobj
+from shutil import copystat
 from sqlite3 import DatabaseError
 from subprocess import CalledProcessError
 from subprocess import CompletedProcess
+from subprocess import Popen
 from subprocess import run
+from subprocess import TimeoutExpired
 from tempfile import TemporaryDirectory
+from time import monotonic
+from tomllib import load as load_toml
+from typing import Any
+from typing import BinaryIO
 
 import chardet
 from acacore.database import FilesDB
@@ -13,6 +33,28 @@ from click import BadParameter
 from click import Context
 from click import Parameter
 
+try:
+    from os import killpg
+    from signal import SIGKILL
+except ImportError:  # Windows
+    killpg = None
+
+try:
+    from fcntl import FICLONE
+    from fcntl import ioctl
+except ImportError:  # Windows
+    ioctl = None
+
+try:
+    from os import copy_file_range
+except ImportError:  # Not Linux
+    copy_file_range = None
+
+try:
+    from os import sendfile
+except ImportError:  # Windows
+    sendfile = None
+
 ENV: str = ""
 
 if system().lower() in ("linux", "darwin"):
@@ -94,6 +136,29 @@ def get_avid(ctx: Context, path: str | PathLike[str], param_name: str) -> AVID:
     return avid
 
 
+def parse_address(value: str) -> tuple[str, int]:
+    """
+    Parse an address in the form HOST:PORT.
+
+    :param value: The address to parse.
+    :raise ValueError: If the address is not valid.
+    :return: A tuple with the host and the port.
+    """
+    host, sep, port = value.rpartition(":")
+    if not sep or not host or not port.isdigit() or not 0 <= int(port) <= 65535:
+        raise ValueError(f"Invalid address {value!r}, expected HOST:PORT")
+    return host.strip("[]"), int(port)
+
+
+def param_callback_address(ctx: Context, param: Parameter, value: str | None) -> tuple[str, int] | None:
+    if value is None:
+        return None
+    try:
+        return parse_address(value)
+    except ValueError as err:
+        raise BadParameter(err.args[0], ctx, param)
+
+
 def open_database(ctx: Context, avid: AVID, param_name: str) -> FilesDB:
     try:
         return FilesDB(avid.database_path, check_initialisation=True, check_version=True)
@@ -101,29 +166,169 @@ def open_database(ctx: Context, avid: AVID, param_name: str) -> FilesDB:
         raise BadParameter(e.args[0], ctx, ctx_params(ctx)[param_name])
 
 
+def read_config(path: str | PathLike[str]) -> dict[str, Any]:
+    """
+    Read a TOML configuration file.
+
+    :param path: The path to the configuration file.
+    :raise ValueError: If the file is not valid TOML.
+    :return: The parsed configuration.
+    """
+    with Path(path).open("rb") as fh:
+        return load_toml(fh)
+
+
+class ProcessStalled(TimeoutExpired):
+    """The process made no progress for longer than its stall timeout."""
+
+    def __str__(self) -> str:
+        return f"Command {self.cmd!r} made no progress for {self.timeout} seconds"
+
+
+def _process_tree(pid: int) -> list[int]:
+    pids: list[int] = [pid]
+    for parent in pids:
+        for children in Path("/proc", str(parent), "task").glob("*/children"):
+            try:
+                pids.extend(int(c) for c in children.read_text().split())
+            except (OSError, ValueError):
+                continue
+    return pids
+
+
+def process_progress(pid: int, cwd: str | PathLike | None = None) -> tuple[int, int]:
+    """
+    Sample the progress of a running process.
+
+    The progress is measured as the CPU time used by the process and its children, read from ``/proc`` where
+    available, and the total size of the files in its working directory.
+
+    :param pid: The ID of the process.
+    :param cwd: Optionally, the working directory of the process.
+    :return: A tuple with the CPU time in clock ticks and the size of the output in bytes.
+    """
+    cpu: int = 0
+    output: int = 0
+
+    for child in _process_tree(pid):
+        try:
+            # The name of the command is in parentheses and may contain spaces
+            fields: list[str] = Path("/proc", str(child), "stat").read_text().rpartition(")")[2].split()
+            cpu += int(fields[11]) + int(fields[12])
+        except (OSError, ValueError, IndexError):
+            continue
+
+    if cwd:
+        for file in Path(cwd).rglob("*"):
+            try:
+                output += file.stat().st_size if file.is_file() else 0
+            except OSError:
+                continue
+
+    return cpu, output
+
+
+def _kill_process_group(process: Popen | Process):
+    if killpg is None:
+        process.kill()
+        return
+    try:
+        killpg(process.pid, SIGKILL)
+    except OSError:
+        process.kill()
+
+
+def _run_process_watched(
+    command: list[str],
+    cwd: str | PathLike | None,
+    capture_output: bool,
+    timeout: float | None,
+    stall_timeout: float,
+    environment: dict[str, str] | None,
+) -> tuple[str, str]:
+    interval: float = min(stall_timeout / 5, 1.0)
+    start: float = monotonic()
+    last_progress: float = start
+    progress: tuple[int, int] | None = None
+
+    with Popen(
+        command,
+        cwd=cwd,
+        stdout=PIPE if capture_output else None,
+        stderr=PIPE if capture_output else None,
+        encoding="utf-8",
+        errors="replace",
+        env=(environ | environment) if environment else None,
+        start_new_session=True,
+    ) as process:
+        try:
+            while True:
+                try:
+                    stdout, stderr = process.communicate(timeout=interval)
+                    break
+                except TimeoutExpired:
+                    now: float = monotonic()
+                    if timeout is not None and now - start > timeout:
+                        raise TimeoutExpired(command, timeout)
+                    if (sample := process_progress(process.pid, cwd)) != progress:
+                        progress, last_progress = sample, now
+                    elif now - last_progress > stall_timeout:
+                        raise ProcessStalled(command, stall_timeout)
+        except TimeoutExpired as err:
+            _kill_process_group(process)
+            err.output, err.stderr = process.communicate()
+            raise
+        except BaseException:
+            # The process runs in its own session, so it does not receive the signals sent to this one
+            _kill_process_group(process)
+            raise
+
+    if process.returncode:
+        raise CalledProcessError(process.returncode, command, stdout, stderr)
+
+    return stdout or "", stderr or ""
+
+
 def run_process(
     *args: str | int | PathLike,
     cwd: str | PathLike | None = None,
     env: bool = True,
     capture_output: bool = True,
     timeout: float | None = None,
+    environment: dict[str, str] | None = None,
+    stall_timeout: float | None = None,
 ) -> tuple[str, str]:
     """
     Run process and capture output.
 
     If the command is not found, a ``CalledProcessError`` exception is raised instead of ``FileNotFoundError``.
 
+    If a stall timeout is given, the process is killed when neither its CPU time (including that of its children) nor
+    the size of the files in its working directory has changed for that many seconds.
+
     :param args: The arguments for ``subprocess.run``. Non-string arguments are cast to string.
     :param cwd: Optionally, the working directory to use.
     :param env: If ``True`` to use the system's env command (if available).
     :param capture_output: Whether to capture the output of ``subprocess.run``. Default: ``True``.
     :param timeout: Optionally, a timeout.
+    :param environment: Optionally, extra environment variables for the process.
+    :param stall_timeout: Optionally, the number of seconds the process can run without making progress.
     :raise CalledProcessError: If the process exists with a non-zero code.
+    :raise ProcessStalled: If the process stalls.
     :raise TimeoutExpired: If the process times out.
     :return: A tuple with the captured stdout and stderr outputs in string format.
     """
     try:
         env_args = [ENV] if env and ENV else []
+        if stall_timeout:
+            return _run_process_watched(
+                [*env_args, *map(str, args)],
+                cwd,
+                capture_output,
+                timeout,
+                stall_timeout,
+                environment,
+            )
         process: CompletedProcess[str] = run(
             [*env_args, *map(str, args)],
             cwd=cwd,
@@ -132,12 +337,158 @@ def run_process(
             errors="replace",
             check=True,
             timeout=timeout,
+            env=(environ | environment) if environment else None,
         )
         return process.stdout or "", process.stderr or ""
     except FileNotFoundError:
         raise CalledProcessError(127, args[0:1], "", f"Command not found {''.join(args[0:1])}")
 
 
+async def run_process_async(
+    *args: str | int | PathLike,
+    cwd: str | PathLike | None = None,
+    env: bool = True,
+    capture_output: bool = True,
+    timeout: float | None = None,
+    environment: dict[str, str] | None = None,
+    stall_timeout: float | None = None,
+) -> tuple[str, str]:
+    """
+    Run process asynchronously and capture output.
+
+    Behaves like ``run_process``, but the process is started with ``asyncio.create_subprocess_exec``, so that many
+    processes can be awaited concurrently from a single event loop. If the task is cancelled, the process times out,
+    or it stalls, the process is killed.
+
+    :param args: The arguments of the process. Non-string arguments are cast to string.
+    :param cwd: Optionally, the working directory to use.
+    :param env: If ``True`` to use the system's env command (if available).
+    :param capture_output: Whether to capture the output of the process. Default: ``True``.
+    :param timeout: Optionally, a timeout.
+    :param environment: Optionally, extra environment variables for the process.
+    :param stall_timeout: Optionally, the number of seconds the process can run without making progress.
+    :raise CalledProcessError: If the process exists with a non-zero code.
+    :raise ProcessStalled: If the process stalls.
+    :raise TimeoutExpired: If the process times out.
+    :return: A tuple with the captured stdout and stderr outputs in string format.
+    """
+    env_args = [ENV] if env and ENV else []
+    command: list[str] = [*env_args, *map(str, args)]
+
+    try:
+        process = await create_subprocess_exec(
+            *command,
+            cwd=cwd,
+            stdout=PIPE if capture_output else None,
+            stderr=PIPE if capture_output else None,
+            env=(environ | environment) if environment else None,
+            start_new_session=True,
+        )
+    except FileNotFoundError:
+        raise CalledProcessError(127, args[0:1], "", f"Command not found {''.join(args[0:1])}")
+
+    communicate: Task[tuple[bytes, bytes]] = ensure_future(process.communicate())
+    start: float = monotonic()
+    last_progress: float = start
+    progress: tuple[int, int] | None = None
+
+    try:
+        if not stall_timeout:
+            stdout, stderr = await wait_for(communicate, timeout)
+        else:
+            while not (await wait([communicate], timeout=min(stall_timeout / 5, 1.0)))[0]:
+                now: float = monotonic()
+                if timeout is not None and now - start > timeout:
+                    raise TimeoutError
+                if (sample := process_progress(process.pid, cwd)) != progress:
+                    progress, last_progress = sample, now
+                elif now - last_progress > stall_timeout:
+                    _kill_process_group(process)
+                    stdout, stderr = await communicate
+                    raise ProcessStalled(command, stall_timeout, stdout, stderr)
+            stdout, stderr = communicate.result()
+    except TimeoutError:
+        _kill_process_group(process)
+        stdout, stderr = await process.communicate() if communicate.cancelled() else await communicate
+        raise TimeoutExpired(command, timeout, stdout, stderr)
+    except CancelledError:
+        communicate.cancel()
+        _kill_process_group(process)
+        await process.wait()
+        raise
+
+    stdout_str: str = (stdout or b"").decode("utf-8", errors="replace")
+    stderr_str: str = (stderr or b"").decode("utf-8", errors="replace")
+
+    if process.returncode:
+        raise CalledProcessError(process.returncode, command, stdout_str, stderr_str)
+
+    return stdout_str, stderr_str
+
+
+def link_or_copy(src: Path, dst: Path):
+    """
+    Hard-link a file to a new path, or copy it if it cannot be linked.
+
+    The destination is replaced if it exists, and its parent directories are created if needed.
+
+    :param src: The path of the file.
+    :param dst: The new path.
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    dst.unlink(missing_ok=True)
+    try:
+        link(src, dst)
+    except OSError:
+        fast_copy(src, dst)
+
+
+def _copy_in_kernel(copy: Callable[[int, int, int], int], fsrc: BinaryIO, fdst: BinaryIO, size: int) -> bool:
+    # Same block size as shutil's own sendfile copy
+    block_size: int = min(max(size, 2**23), 2**30)
+    copied: int = 0
+
+    while True:
+        try:
+            sent: int = copy(fsrc.fileno(), fdst.fileno(), block_size)
+        except OSError:
+            if not copied:
+                return False
+            raise
+        if not sent:
+            # Some filesystems report nothing to copy instead of failing
+            return bool(copied) or not size
+        copied += sent
+
+
+def fast_copy(src: Path, dst: Path):
+    """
+    Copy a file and its metadata using the fastest method supported by the platform and filesystems.
+
+    The file is first cloned with a reflink, which shares the data of the two files until either is changed, if both
+    are on the same filesystem and it supports it (e.g., Btrfs or XFS). Otherwise, the data is copied by the kernel
+    with ``copy_file_range`` or ``sendfile``, and only if neither is available, it is copied through userspace. The
+    metadata is copied like ``shutil.copy2`` does.
+
+    :param src: The path of the file.
+    :param dst: The new path.
+    """
+    with src.open("rb") as fsrc, dst.open("wb") as fdst:
+        size: int = fstat(fsrc.fileno()).st_size
+        try:
+            cloned: bool = ioctl is not None and ioctl(fdst.fileno(), FICLONE, fsrc.fileno()) == 0
+        except OSError:
+            cloned = False
+        if not (
+            cloned
+            or (copy_file_range and _copy_in_kernel(copy_file_range, fsrc, fdst, size))
+            or (sendfile and _copy_in_kernel(lambda s, d, n: sendfile(d, s, None, n), fsrc, fdst, size))
+        ):
+            copyfileobj(fsrc, fdst)
+
+    copystat(src, dst)
+
+
 def get_encoding(path: Path, bof_length: int = 2048) -> str | None:
     """
     Get the encoding of the file as detected by chardet.
@@ -1,3 +1,5 @@
+from asyncio import gather
+from asyncio import run
 from pathlib import Path
 
 from acacore.siegfried import Siegfried
@@ -25,3 +27,20 @@ def test_audio(test_files: dict[str, Path], output_dir: Path, siegfried: Siegfri
             assert sf_match.mime in mimetypes
             output_puid = converter.output_puid(output)
             assert output_puid is None or sf_match.id == converter.output_puid(output)
+
+
+def test_audio_async(test_files: dict[str, Path], output_dir: Path, siegfried: Siegfried):
+    path = test_files["audio.m4a"]
+    file = dummy_base_file(path, path.parent)
+
+    async def convert_all() -> list[list[Path]]:
+        return await gather(
+            *(ConverterAudio(file).convert_async(output_dir.joinpath(o), o) for o in MIMETYPES),
+        )
+
+    for (output, mimetypes), output_files in zip(MIMETYPES.items(), run(convert_all()), strict=True):
+        assert len(output_files) == 1
+        assert output_files[0].is_relative_to(output_dir.joinpath(output))
+        sf_match = siegfried.identify(output_files[0]).files[0].best_match()
+        assert sf_match is not None
+        assert sf_match.mime in mimetypes
@@ -0,0 +1,59 @@
+from pathlib import Path
+from typing import ClassVar
+
+from convertool.breaker import CircuitBreaker
+from convertool.convert import ConvertFailure
+from convertool.convert import ConvertInstructions
+from convertool.converters import ConverterABC
+from convertool.converters.base import dummy_base_file
+from convertool.converters.exceptions import ConvertError
+from convertool.converters.exceptions import ConvertTimeoutError
+
+
+def test_circuit_breaker():
+    class ConverterA(ConverterABC):
+        tool_names: ClassVar[list[str]] = ["a"]
+        outputs: ClassVar[list[str]] = ["out"]
+        dependencies: ClassVar[dict[str, list[str]]] = {"a": ["a"]}
+
+        def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:  # noqa: ARG002
+            return []
+
+    class ConverterB(ConverterABC):
+        tool_names: ClassVar[list[str]] = ["b"]
+        outputs: ClassVar[list[str]] = ["out"]
+
+        def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:  # noqa: ARG002
+            return []
+
+    file = dummy_base_file("file.txt")
+    inst_a = ConvertInstructions(file, "original", "master", ConverterA, "a", "out", None, None)
+    inst_b = ConvertInstructions(file, "original", "master", ConverterB, "b", "out", None, None)
+    error = ConvertFailure(ConvertError(file, "error"), "")
+    timeout = ConvertFailure(ConvertTimeoutError(file, "timeout"), "")
+    breaker = CircuitBreaker(3)
+
+    # Successes and different errors reset the count
+    assert breaker.record(inst_a, error) == []
+    assert breaker.record(inst_a, error) == []
+    assert breaker.record(inst_a, None) == []
+    assert breaker.record(inst_a, error) == []
+    assert breaker.record(inst_a, error) == []
+    assert breaker.record(inst_a, timeout) == []
+    assert breaker.allow(inst_a)
+
+    assert breaker.record(inst_a, timeout) == []
+    assert breaker.record(inst_a, timeout) == ["a"]
+    assert breaker.record(inst_a, timeout) == []
+    assert breaker.opened == {"a": "ConvertTimeoutError"}
+
+    assert not breaker.allow(inst_a)
+    assert not breaker.allow(inst_a)
+    assert breaker.allow(inst_b)
+    assert breaker.skipped == {"a": 2}
+
+    # Converters without dependencies are counted by name
+    for _ in range(3):
+        breaker.record(inst_b, error)
+    assert not breaker.allow(inst_b)
+    assert breaker.opened == {"a": "ConvertTimeoutError", ConverterB.__name__: "ConvertError"}
@@ -0,0 +1,79 @@
+from pathlib import Path
+from typing import ClassVar
+
+from convertool.cache import ConvertCache
+from convertool.converters import ConverterABC
+from convertool.converters.base import dummy_base_file
+
+
+class ConverterUpper(ConverterABC):
+    tool_names: ClassVar[list[str]] = ["upper"]
+    outputs: ClassVar[list[str]] = ["txt"]
+
+    def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
+        dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path, mkdir=True)
+        dest_file: Path = self.output_file(dest_dir, output)
+        dest_file.write_text(self.file.get_absolute_path().read_text().upper())
+        return [dest_file]
+
+
+def test_convert_cache(tmp_path: Path):
+    src_dir: Path = tmp_path / "src"
+    out_dir: Path = tmp_path / "out"
+    src_dir.joinpath("sub").mkdir(parents=True)
+    src_dir.joinpath("a.txt").write_text("hello")
+    src_dir.joinpath("sub", "b.txt").write_text("hello")
+
+    cache = ConvertCache(tmp_path / "cache")
+
+    file_a = dummy_base_file(src_dir / "a.txt", src_dir)
+    file_a.checksum = "checksum"
+    converter_a = ConverterUpper(file_a)
+    key = cache.key(converter_a, "upper", "txt", None)
+
+    assert cache.restore(key, converter_a, out_dir, "txt") is None
+    cache.store(key, converter_a, out_dir, "txt", converter_a.convert(out_dir, "txt"))
+
+    # Same content under a different name
+    file_b = dummy_base_file(src_dir / "sub" / "b.txt", src_dir)
+    file_b.checksum = "checksum"
+    converter_b = ConverterUpper(file_b)
+
+    assert cache.key(converter_b, "upper", "txt", None) == key
+    assert cache.key(converter_b, "upper", "txt", {"option": "value"}) != key
+
+    restored = cache.restore(key, converter_b, out_dir, "txt")
+    assert restored == [converter_b.output_file(converter_b.output_dir(out_dir), "txt")]
+    assert restored[0].read_text() == "HELLO"
+    assert cache.stats() == (1, 1, 5, 1)
+
+    # Files without a checksum are not cached
+    assert cache.key(ConverterUpper(dummy_base_file(src_dir / "a.txt", src_dir)), "upper", "txt", None) is None
+
+    assert cache.prune(max_size=0) == 1
+    assert cache.stats() == (0, 0, 0, 0)
+    assert cache.restore(key, converter_b, out_dir, "txt") is None
+
+
+def test_convert_cache_prune(tmp_path: Path):
+    src_dir: Path = tmp_path / "src"
+    out_dir: Path = tmp_path / "out"
+    src_dir.mkdir(parents=True)
+    cache = ConvertCache(tmp_path / "cache")
+    keys: list[str] = []
+
+    for n in range(3):
+        src_dir.joinpath(f"{n}.txt").write_text("hello")
+        file = dummy_base_file(src_dir / f"{n}.txt", src_dir)
+        file.checksum = f"checksum{n}"
+        converter = ConverterUpper(file)
+        keys.append(cache.key(converter, "upper", "txt", None))
+        cache.store(keys[-1], converter, out_dir, "txt", converter.convert(out_dir, "txt"))
+        cache.conn.execute("update entries set accessed = ? where key = ?", [n, keys[-1]])
+
+    assert cache.prune(max_size=15) == 0
+    assert cache.prune(max_size=10) == 1
+    assert {k for (k,) in cache.conn.execute("select key from entries")} == set(keys[1:])
+    assert not cache.entry_dir(keys[0]).exists()
+    assert cache.prune(max_age=0) == 2
+    assert cache.stats() == (0, 0, 0, 0)
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from convertool.controller import ConcurrencyController
+
+
+def write_proc(proc: Path, load: float, available: int, iowait: int, total: int):
+    proc.joinpath("loadavg").write_text(f"{load} {load} {load} 1/100 1000\n")
+    proc.joinpath("meminfo").write_text(f"MemTotal: 1000 kB\nMemFree: 10 kB\nMemAvailable: {available} kB\n")
+    proc.joinpath("stat").write_text(f"cpu  {total - iowait} 0 0 0 {iowait} 0 0 0 0 0\ncpu0 0 0 0 0 0 0 0 0 0 0\n")
+
+
+def test_concurrency_controller(tmp_path: Path):
+    controller = ConcurrencyController(2, 4, 0, tmp_path)
+    controller.cpus = 1
+    assert controller.limit == 2
+
+    # Idle system: the limit grows up to the maximum
+    for n in range(1, 5):
+        write_proc(tmp_path, 0.1, 800, 0, n * 100)
+        controller.update()
+    assert controller.limit == 4
+
+    # High load: the limit shrinks
+    write_proc(tmp_path, 2.0, 800, 0, 500)
+    load = controller.update()
+    assert load is not None
+    assert load.load == 2.0
+    assert controller.limit == 3
+
+    # Low memory: the limit shrinks down to the minimum
+    for n in range(6, 9):
+        write_proc(tmp_path, 0.1, 50, 0, n * 100)
+        controller.update()
+    assert controller.limit == 2
+
+    # High I/O wait: the limit stays at the minimum
+    write_proc(tmp_path, 0.1, 800, 90, 1000)
+    assert controller.update() is None
+    assert controller.limit == 2
+
+
+def test_concurrency_controller_no_proc(tmp_path: Path):
+    controller = ConcurrencyController(1, 4, 0, tmp_path / "missing")
+    assert controller.limit == 4
+    assert controller.update() is None
+    assert controller.limit == 4
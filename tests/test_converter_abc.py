@@ -3,10 +3,16 @@ from shutil import which
 from typing import ClassVar
 
 import pytest
+import structlog
 
+from convertool.convert import convert
+from convertool.convert import ConvertInstructions
 from convertool.converters import ConverterABC
+from convertool.converters.base import dummy_base_file
+from convertool.converters.exceptions import ConvertTimeoutError
 from convertool.converters.exceptions import MissingDependency
 from convertool.converters.exceptions import UnsupportedPlatform
+from convertool.costs import CostModel
 
 
 def test_platforms():
@@ -37,3 +43,70 @@ def test_dependencies():
     Converter.dependencies = {"dep": ["-invalid dependency", "echo"]}
     Converter.test_dependencies()
     assert Converter.dependencies["dep"] == [which("echo")]
+
+
+def test_estimate_cost():
+    class Converter(ConverterABC):
+        tool_names: ClassVar[list[str]] = ["tool"]
+        outputs: ClassVar[list[str]] = ["out"]
+        process_cost: ClassVar[tuple[float, float]] = (2.0, 3.0)
+        memory_cost: ClassVar[tuple[float, float]] = (100.0, 10.0)
+
+        def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:  # noqa: ARG002
+            return []
+
+    file = dummy_base_file("file.txt")
+    file.size = 2_000_000
+
+    assert Converter.estimate_cost(file) == 8.0
+    assert Converter.estimate_memory(file) == 120.0
+    assert (
+        CostModel().estimate(ConvertInstructions(file, "original", "master", Converter, "tool", "out", None, None))
+        == 8.0
+    )
+    assert (
+        CostModel({("tool", "out"): (1.0, 1.0)}).estimate(
+            ConvertInstructions(file, "original", "master", Converter, "tool", "out", None, None)
+        )
+        == 3.0
+    )
+
+    Converter.process_timeout = 60.0
+    instructions = ConvertInstructions(file, "original", "master", Converter, "tool", "out", None, None)
+    assert CostModel().timeout(instructions, 10) == 80.0
+    assert CostModel({("tool", "out"): (0.1, 0.0)}).timeout(instructions, 10) == 30.0
+    assert CostModel({("tool", "out"): (100.0, 0.0)}).timeout(instructions, 10) == 240.0
+    Converter.process_timeout = None
+    assert CostModel().timeout(instructions, 10) is None
+
+
+def test_instructions_timeout(tmp_path: Path):
+    class Converter(ConverterABC):
+        tool_names: ClassVar[list[str]] = ["tool"]
+        outputs: ClassVar[list[str]] = ["out"]
+        process_timeout: ClassVar[float] = 0.1
+
+        def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:  # noqa: ARG002
+            self.run_process("sleep", "0.5")
+            return []
+
+    file = dummy_base_file(tmp_path.joinpath("file.txt"))
+    logger = structlog.stdlib.get_logger()
+    instructions = ConvertInstructions(file, "original", "master", Converter, "tool", "out", None, None)
+
+    result = convert("convertool.test", None, tmp_path, tmp_path, tmp_path, instructions, False, True, logger)
+    assert isinstance(result.error.exception, ConvertTimeoutError)
+
+    result = convert(
+        "convertool.test",
+        None,
+        tmp_path,
+        tmp_path,
+        tmp_path,
+        instructions._replace(timeout=10.0),
+        False,
+        True,
+        logger,
+    )
+    assert result.error is None
+    assert Converter.process_timeout == 0.1
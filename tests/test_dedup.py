@@ -0,0 +1,63 @@
+from pathlib import Path
+
+import structlog
+
+from convertool.convert import ConvertFailure
+from convertool.convert import ConvertInstructions
+from convertool.convert import ConvertResult
+from convertool.convert import duplicate
+from convertool.converters import ConverterCopy
+from convertool.converters import ConverterTextToImage
+from convertool.converters.base import dummy_base_file
+from convertool.converters.exceptions import ConvertError
+from convertool.dedup import Deduplicator
+
+
+def instructions(name: str, checksum: str, output: str = "png") -> ConvertInstructions:
+    file = dummy_base_file(name)
+    file.checksum = checksum
+    return ConvertInstructions(file, "original", "master", ConverterTextToImage, "text", output, None, None)
+
+
+def test_deduplicator():
+    dedup = Deduplicator()
+    a1 = instructions("a1.txt", "a")
+    a2 = instructions("a2.txt", "a")
+    a3 = instructions("a3.txt", "a")
+    a_jpg = instructions("a.txt", "a", "jpg")
+    b1 = instructions("b1.txt", "b")
+    b2 = instructions("b2.txt", "b")
+    no_checksum = instructions("c.txt", "")
+    copy = instructions("d1.txt", "d")._replace(converter_cls=ConverterCopy, tool="copy", output="copy")
+    copy_duplicate = copy._replace(file=dummy_base_file("d2.txt"))
+    copy_duplicate.file.checksum = "d"
+
+    assert list(dedup.filter([a1, a2, a_jpg, b1, a3, b2, no_checksum, copy, copy_duplicate])) == [
+        a1,
+        a_jpg,
+        b1,
+        no_checksum,
+        copy,
+        copy_duplicate,
+    ]
+    assert dedup.duplicates(a1) == [a2, a3]
+    assert dedup.duplicates(a1) == []
+    assert dedup.duplicates(a_jpg) == []
+    assert dedup.remaining() == [b2]
+    assert dedup.duplicates(b1) == []
+
+
+def test_duplicate_error(tmp_path: Path):
+    a1 = instructions("a1.txt", "a")
+    a2 = instructions("a2.txt", "a")
+    error = ConvertFailure(ConvertError(a1.file, "error"), "")
+    logger = structlog.stdlib.get_logger()
+
+    result = duplicate(
+        "convertool.test", ConvertResult(a1, [], error, 1.0), tmp_path, tmp_path, tmp_path, a2, True, logger
+    )
+
+    assert result.instructions is a2
+    assert result.output_files == []
+    assert result.error is error
+    assert not list(tmp_path.iterdir())
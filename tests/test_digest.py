@@ -0,0 +1,49 @@
+from hashlib import sha256
+from pathlib import Path
+from typing import ClassVar
+
+from convertool.converters import ConverterABC
+from convertool.converters.base import dummy_base_file
+from convertool.digest import digest_files
+from convertool.digest import file_digest
+
+
+class ConverterWrite(ConverterABC):
+    tool_names: ClassVar[list[str]] = ["write"]
+    outputs: ClassVar[list[str]] = ["txt", "bin"]
+
+    def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:
+        dest_dir: Path = self.output_dir(output_dir, keep_relative_path=keep_relative_path, mkdir=True)
+        dest_file: Path = self.output_file(dest_dir, output)
+        if output == "txt":
+            return [self.write_output(dest_file, "æøå\n" * 1000, "utf-8")]
+        tmp_file: Path = self.write_output(dest_dir.joinpath("tmp"), bytes(range(256)) * 1000)
+        return [self.replace_output(tmp_file, dest_file)]
+
+
+def test_file_digest(tmp_path: Path):
+    text_file: Path = tmp_path.joinpath("file.txt")
+    text_file.write_text("text\n", encoding="utf-8")
+    binary_file: Path = tmp_path.joinpath("file.bin")
+    binary_file.write_bytes(bytes(range(256)))
+
+    assert file_digest(text_file).checksum == sha256(text_file.read_bytes()).hexdigest()
+    assert file_digest(text_file).size == text_file.stat().st_size
+    assert not file_digest(text_file).is_binary
+    assert file_digest(text_file).encoding["encoding"] == "ascii"
+    assert file_digest(binary_file).is_binary
+    assert file_digest(binary_file).encoding is None
+
+
+def test_write_output(tmp_path: Path):
+    tmp_path.joinpath("file.txt").write_text("")
+    converter = ConverterWrite(dummy_base_file(tmp_path / "file.txt", tmp_path))
+
+    for output in ConverterWrite.outputs:
+        [output_file] = converter.convert(tmp_path / "out", output)
+        assert converter.output_digests[output_file] == file_digest(output_file)
+        assert [f.result() for f in digest_files([output_file], converter.output_digests)] == [file_digest(output_file)]
+
+    # Digests of files changed after they were written are not used
+    output_file.write_bytes(b"changed")
+    assert digest_files([output_file], converter.output_digests)[0].result() == file_digest(output_file)
@@ -1,9 +1,13 @@
 from pathlib import Path
 
+import pytest
 from acacore.database import FilesDB
 from acacore.utils.functions import rm_tree
+from click import BadParameter
 
 from convertool.cli import app
+from convertool.costs import CostModel
+from convertool.journal import RunJournal
 from convertool.util import AVID
 
 
@@ -142,3 +146,225 @@ def test_digiarch_master_statutory(avid_dir_copy: Path):
             else:
                 assert not output_files
                 assert not file.processed
+
+
+# noinspection DuplicatedCode
+def test_digiarch_quotas(avid_dir_copy: Path):
+    avid = AVID(avid_dir_copy)
+    config = avid.metadata_dir.joinpath("convertool.toml")
+    config.write_text("[quotas]\nlibreoffice = 1\nimagemagick = 2\n")
+
+    with FilesDB(avid.database_path) as db:
+        db.master_files.delete("uuid is not null")
+        db.log.delete("operation like 'convertool.digiarch%'")
+        # noinspection SqlWithoutWhere
+        db.execute(f"update {db.original_files.name} set processed = false")
+        db.commit()
+        rm_tree(avid.dirs.master_documents)
+
+    app.main(
+        ["digiarch", str(avid.path), "original:master", "--config", str(config), "--quota", "ffmpeg", "1"],
+        standalone_mode=False,
+    )
+
+    with FilesDB(avid.database_path) as db:
+        for file in db.original_files.select():
+            output_files = db.master_files.select({"original_uuid": str(file.uuid)}).fetchall()
+            event = db.log.select(
+                "file_uuid = ? and operation = 'convertool.digiarch:converted'",
+                [str(file.uuid)],
+            ).fetchone()
+            if event:
+                assert len(output_files) == event.data["files"]
+                assert all(f.get_absolute_path(avid.path).is_file() for f in output_files)
+                assert file.processed
+            else:
+                assert not output_files
+                assert not file.processed
+
+
+# noinspection DuplicatedCode
+def test_digiarch_async_jobs(avid_dir_copy: Path):
+    avid = AVID(avid_dir_copy)
+
+    with FilesDB(avid.database_path) as db:
+        db.master_files.delete("uuid is not null")
+        db.log.delete("operation like 'convertool.digiarch%'")
+        # noinspection SqlWithoutWhere
+        db.execute(f"update {db.original_files.name} set processed = false")
+        db.commit()
+        rm_tree(avid.dirs.master_documents)
+
+    app.main(["digiarch", str(avid.path), "original:master", "--async-jobs", "4"], standalone_mode=False)
+
+    with FilesDB(avid.database_path) as db:
+        for file in db.original_files.select():
+            output_files = db.master_files.select({"original_uuid": str(file.uuid)}).fetchall()
+            event = db.log.select(
+                "file_uuid = ? and operation = 'convertool.digiarch:converted'",
+                [str(file.uuid)],
+            ).fetchone()
+            if event:
+                assert len(output_files) == event.data["files"]
+                assert all(f.get_absolute_path(avid.path).is_file() for f in output_files)
+                assert file.processed
+            else:
+                assert not output_files
+                assert not file.processed
+
+
+def test_digiarch_quotas_unknown(avid_dir_copy: Path):
+    avid = AVID(avid_dir_copy)
+
+    with pytest.raises(BadParameter, match="unknown dependencies"):
+        app.main(["digiarch", str(avid.path), "original:master", "--quota", "-invalid", "1"], standalone_mode=False)
+
+
+def test_digiarch_coordinator_local_options(avid_dir_copy: Path, tmp_path: Path):
+    avid = AVID(avid_dir_copy)
+
+    for args in (
+        ["--cache", str(tmp_path / "cache")],
+        ["--quota", "libreoffice", "1"],
+        ["--memory-budget", "1024"],
+        ["--min-threads", "1"],
+        ["--office-batch", "10"],
+        ["--async-jobs", "2"],
+    ):
+        with pytest.raises(BadParameter, match="cannot be used with --coordinator"):
+            app.main(
+                [
+                    "digiarch",
+                    str(avid.path),
+                    "original:master",
+                    "--coordinator",
+                    "localhost:8000",
+                    "--authkey",
+                    "key",
+                    *args,
+                ],
+                standalone_mode=False,
+            )
+
+
+# noinspection DuplicatedCode
+def test_digiarch_order(avid_dir_copy: Path):
+    avid = AVID(avid_dir_copy)
+
+    def reset():
+        with FilesDB(avid.database_path) as db:
+            db.master_files.delete("uuid is not null")
+            # noinspection SqlWithoutWhere
+            db.execute(f"update {db.original_files.name} set processed = false")
+            db.commit()
+            rm_tree(avid.dirs.master_documents)
+
+    with FilesDB(avid.database_path) as db:
+        db.log.delete("operation like 'convertool.digiarch%'")
+        db.commit()
+
+    reset()
+    app.main(["digiarch", str(avid.path), "original:master", "--order", "path"], standalone_mode=False)
+
+    with FilesDB(avid.database_path) as db:
+        events = db.log.select("operation = 'convertool.digiarch:converted'").fetchall()
+        assert events
+        assert all(e.data["duration"] >= 0 for e in events)
+        processed = {str(f.uuid) for f in db.original_files.select("processed")}
+        cost_model = CostModel.from_events(db, db.original_files, "convertool.digiarch:converted", min_samples=1)
+        assert cost_model.rates
+        assert all(base >= 0 and rate >= 0 for base, rate in cost_model.rates.values())
+
+    reset()
+    app.main(["digiarch", str(avid.path), "original:master", "--order", "cost"], standalone_mode=False)
+
+    with FilesDB(avid.database_path) as db:
+        assert {str(f.uuid) for f in db.original_files.select("processed")} == processed
+
+
+# noinspection DuplicatedCode
+def test_digiarch_threads(avid_dir_copy: Path):
+    avid = AVID(avid_dir_copy)
+
+    def run(threads: int) -> dict[str, list[str]]:
+        with FilesDB(avid.database_path) as db:
+            db.master_files.delete("uuid is not null")
+            db.log.delete("operation like 'convertool.digiarch%'")
+            # noinspection SqlWithoutWhere
+            db.execute(f"update {db.original_files.name} set processed = false")
+            db.commit()
+            rm_tree(avid.dirs.master_documents)
+
+        app.main(
+            ["digiarch", str(avid.path), "original:master", "--threads", str(threads)],
+            standalone_mode=False,
+        )
+
+        with FilesDB(avid.database_path) as db:
+            converted: dict[str, list[str]] = {}
+            for file in db.original_files.select("processed"):
+                output_files = db.master_files.select({"original_uuid": str(file.uuid)}).fetchall()
+                assert all(f.get_absolute_path(avid.path).is_file() for f in output_files)
+                converted[str(file.uuid)] = sorted(str(f.relative_path) for f in output_files)
+            return converted
+
+    converted = run(1)
+    assert converted
+    assert run(2) == converted
+
+
+# noinspection DuplicatedCode
+def test_digiarch_journal(avid_dir_copy: Path):
+    avid = AVID(avid_dir_copy)
+    journal = RunJournal(avid.metadata_dir.joinpath("convertool-journal-original-master.jsonl"))
+
+    with FilesDB(avid.database_path) as db:
+        db.master_files.delete("uuid is not null")
+        db.log.delete("operation like 'convertool.digiarch%'")
+        # noinspection SqlWithoutWhere
+        db.execute(f"update {db.original_files.name} set processed = false")
+        db.commit()
+        rm_tree(avid.dirs.master_documents)
+
+    app.main(["digiarch", str(avid.path), "original:master"], standalone_mode=False)
+
+    assert not journal.entries()
+
+    # Simulate a run whose results were written to the journal but never committed
+    with FilesDB(avid.database_path) as db, journal:
+        processed = db.original_files.select("processed").fetchall()
+        assert processed
+        for file in processed:
+            event = db.log.select(
+                "file_uuid = ? and operation = 'convertool.digiarch:converted'",
+                [str(file.uuid)],
+            ).fetchone()
+            journal.write(file, db.master_files.select({"original_uuid": str(file.uuid)}).fetchall(), event)
+        db.master_files.delete("uuid is not null")
+        db.log.delete("operation like 'convertool.digiarch%'")
+        # noinspection SqlWithoutWhere
+        db.execute(f"update {db.original_files.name} set processed = false")
+        db.commit()
+
+    assert len(journal.entries()) == len(processed)
+
+    # An output rewritten with the same size must not be recorded
+    corrupted_entry = next(e for e in journal.entries() if any(o["size"] for o in e["outputs"]))
+    corrupted_path = avid.path.joinpath(next(o["relative_path"] for o in corrupted_entry["outputs"] if o["size"]))
+    corrupted_path.write_bytes(bytes(b ^ 0xFF for b in corrupted_path.read_bytes()))
+    processed = [f for f in processed if str(f.uuid) != corrupted_entry["uuid"]]
+
+    app.main(["digiarch", str(avid.path), "original:master", "--tool-include", "-none"], standalone_mode=False)
+
+    assert not journal.entries()
+
+    with FilesDB(avid.database_path) as db:
+        assert {str(f.uuid) for f in db.original_files.select("processed")} == {str(f.uuid) for f in processed}
+        for file in processed:
+            output_files = db.master_files.select({"original_uuid": str(file.uuid)}).fetchall()
+            event = db.log.select(
+                "file_uuid = ? and operation = 'convertool.digiarch:converted'",
+                [str(file.uuid)],
+            ).fetchone()
+            assert event is not None
+            assert len(output_files) == event.data["files"]
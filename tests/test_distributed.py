@@ -0,0 +1,102 @@
+from pathlib import Path
+from socket import socket
+from threading import Thread
+from time import sleep
+
+import structlog
+from acacore.models.file import OriginalFile
+from acacore.models.reference_files import ActionData
+from acacore.models.reference_files import ConvertAction
+
+from convertool.convert import ConvertInstructions
+from convertool.convert import ConvertResult
+from convertool.convert import original_file_converter
+from convertool.distributed import coordinate_instructions
+from convertool.distributed import run_worker
+from convertool.distributed import TCPTransport
+from convertool.util import AVID
+
+
+def free_port() -> int:
+    with socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def copy_instructions(avid: AVID, names: list[str]) -> list[ConvertInstructions]:
+    # noinspection PyTypeChecker
+    return [
+        original_file_converter(
+            OriginalFile(
+                checksum="",
+                encoding=None,
+                relative_path=(p := avid.dirs.original_documents.joinpath(name)).relative_to(avid.path),
+                is_binary=True,
+                size=p.stat().st_size,
+                puid=None,
+                signature=None,
+                root=avid.path,
+                action="convert",
+                action_data=ActionData(convert=ConvertAction(tool="copy", output="copy")),
+                original_path=p.relative_to(avid.path),
+            )
+        )
+        for name in names
+    ]
+
+
+def test_coordinator(avid_dir_copy: Path):
+    avid = AVID(avid_dir_copy)
+    logger = structlog.stdlib.get_logger()
+    transport = TCPTransport(b"convertool-test")
+    address = ("localhost", free_port())
+    instructions = copy_instructions(avid, ["random", "spreadsheet.csv", "text_to_img.txt"])
+    results: list[ConvertResult] = []
+
+    coordinator = Thread(
+        target=lambda: results.extend(
+            coordinate_instructions(
+                "convertool.test",
+                None,
+                avid.dirs.master_documents,
+                avid.path,
+                avid.dirs.original_documents,
+                instructions,
+                False,
+                True,
+                None,
+                logger,
+                transport,
+                address,
+                2,
+            )
+        )
+    )
+    coordinator.start()
+
+    # A worker that takes a lease and disconnects without returning the result
+    while True:
+        try:
+            conn = transport.connect(address)
+            break
+        except ConnectionError:
+            sleep(0.1)
+    conn.send(("hello", "dead"))
+    conn.recv()
+    while (message := (conn.send(("request",)), conn.recv())[1])[0] == "wait":
+        sleep(0.1)
+    assert message[0] == "lease"
+    conn.close()
+
+    assert run_worker(transport, address, avid.path, logger, "test", 10) == len(instructions)
+
+    coordinator.join(10)
+    assert not coordinator.is_alive()
+
+    assert sorted(str(r.instructions.file.relative_path) for r in results) == sorted(
+        str(i.file.relative_path) for i in instructions
+    )
+    for result in results:
+        assert result.error is None
+        assert len(result.output_files) == 1
+        assert result.output_files[0].get_absolute_path(avid.path).is_file()
@@ -1,10 +1,15 @@
 from pathlib import Path
+from shutil import copy2
 
+import pytest
 from acacore.siegfried import Siegfried
 
 from convertool.converters.base import dummy_base_file
 from convertool.converters.converter_document import ConverterDocument
 from convertool.converters.converter_document import ConverterDocumentToImage
+from convertool.office import enable_office_server
+from convertool.office import office_server
+from convertool.office import office_server_available
 
 from .test_image import MIMETYPES
 
@@ -43,6 +48,59 @@ def test_document_to_pdf(test_files: dict[str, Path], output_dir: Path, siegfrie
         assert sf_match.mime == "application/pdf"
 
 
+# noinspection DuplicatedCode
+@pytest.mark.skipif(not office_server_available(), reason="LibreOffice Python bindings are not available")
+def test_document_to_pdf_office_server(test_files: dict[str, Path], output_dir: Path, siegfried: Siegfried):
+    enable_office_server(2)
+
+    try:
+        for path in [f for n, f in test_files.items() if n.startswith("document.")]:
+            print(path.name)
+
+            file = dummy_base_file(path, path.parent)
+            converter = ConverterDocument(file)
+
+            output_files = converter.convert(output_dir / "office-server", "pdf")
+            expected_output_file = file.relative_path.with_suffix(".pdf")
+            assert len(output_files) == 1
+            assert expected_output_file.name in [f.name for f in output_files]
+            sf_match = siegfried.identify(output_files[0]).files[0].best_match()
+            assert sf_match is not None
+            assert sf_match.mime == "application/pdf"
+
+        assert office_server(ConverterDocument.dependencies["libreoffice"][0]).jobs <= 2
+    finally:
+        enable_office_server(0)
+
+
+# noinspection DuplicatedCode
+def test_document_to_pdf_batch(test_files: dict[str, Path], output_dir: Path, siegfried: Siegfried):
+    paths = [f for n, f in test_files.items() if n.startswith("document.")]
+
+    # LibreOffice names the outputs after the files, so files with the same name are not converted together
+    converters = [ConverterDocument(dummy_base_file(p, p.parent)) for p in paths]
+    assert ConverterDocument.convert_batch(converters, output_dir / "batch", "pdf") == [None] * len(paths)
+
+    batch_dir: Path = output_dir.joinpath("batch-src")
+    batch_dir.mkdir(parents=True, exist_ok=True)
+    for n, path in enumerate(paths):
+        copy2(path, batch_dir.joinpath(f"document-{n}{path.suffix}"))
+
+    converters = [ConverterDocument(dummy_base_file(p, batch_dir)) for p in sorted(batch_dir.iterdir())]
+    for converter, output_files in zip(
+        converters,
+        ConverterDocument.convert_batch(converters, output_dir / "batch", "pdf"),
+        strict=True,
+    ):
+        print(converter.file.name)
+        assert output_files is not None
+        assert len(output_files) == 1
+        assert output_files[0].name == converter.file.relative_path.with_suffix(".pdf").name
+        sf_match = siegfried.identify(output_files[0]).files[0].best_match()
+        assert sf_match is not None
+        assert sf_match.mime == "application/pdf"
+
+
 # noinspection DuplicatedCode
 def test_document_to_html(test_files: dict[str, Path], output_dir: Path, siegfried: Siegfried):
     for path in [f for n, f in test_files.items() if n.startswith("document.")]:
@@ -0,0 +1,28 @@
+from convertool.cache import tool_version_hash
+from convertool.convert import ConvertInstructions
+from convertool.converters import ConverterTextToImage
+from convertool.converters.base import dummy_base_file
+from convertool.failures import FailureCache
+
+
+def instructions(name: str, checksum: str, output: str = "png") -> ConvertInstructions:
+    file = dummy_base_file(name)
+    file.checksum = checksum
+    return ConvertInstructions(file, "original", "master", ConverterTextToImage, "text", output, None, None)
+
+
+def test_failure_cache():
+    version: str = tool_version_hash(ConverterTextToImage)
+    failures = FailureCache({("a", "text", "png", version), ("b", "text", "png", "old-version")})
+
+    assert FailureCache.key(instructions("a.txt", "a")) == ("a", "text", "png", version)
+    assert FailureCache.key(instructions("c.txt", "")) is None
+
+    assert not failures.allow(instructions("a1.txt", "a"))
+    assert not failures.allow(instructions("a2.txt", "a"))
+    # Different output, tool version, or content
+    assert failures.allow(instructions("a.txt", "a", "jpg"))
+    assert failures.allow(instructions("b.txt", "b"))
+    assert failures.allow(instructions("c.txt", "c"))
+    assert failures.allow(instructions("d.txt", ""))
+    assert failures.skipped == 2
@@ -1,7 +1,11 @@
 from pathlib import Path
 
+import pytest
 from acacore.siegfried import Siegfried
 
+from convertool.browser import browser_server
+from convertool.browser import browser_server_available
+from convertool.browser import enable_browser_server
 from convertool.converters import ConverterHTML
 from convertool.converters.base import dummy_base_file
 from convertool.converters.converter_html import ConverterHTMLToImage
@@ -20,6 +24,28 @@ def test_html_to_pdf(test_files: dict[str, Path], output_dir: Path, siegfried: S
         assert siegfried.identify(output_files[0]).files[0].best_match().mime == "application/pdf"
 
 
+@pytest.mark.skipif(not browser_server_available(), reason="Not available on this platform")
+def test_html_to_pdf_browser_server(test_files: dict[str, Path], output_dir: Path, siegfried: Siegfried):
+    enable_browser_server(2)
+
+    try:
+        for path in [f for n, f in test_files.items() if n.startswith("html")] * 2:
+            file = dummy_base_file(path, path.parent)
+            converter = ConverterHTML(file)
+
+            output_files = converter.convert(output_dir / "browser-server", "pdf")
+            assert len(output_files) == 1
+            assert output_files[0].suffix == ".pdf"
+            assert converter.output_digests[output_files[0]].size == output_files[0].stat().st_size
+            assert siegfried.identify(output_files[0]).files[0].best_match().mime == "application/pdf"
+
+        server = browser_server(ConverterHTML.dependencies["chromium"][0])
+        assert server.healthy()
+        assert server.jobs <= 2
+    finally:
+        enable_browser_server(0)
+
+
 def test_html_to_image(test_files: dict[str, Path], output_dir: Path, siegfried: Siegfried):
     for path in [f for n, f in test_files.items() if n.startswith("html")]:
         file = dummy_base_file(path, path.parent)
@@ -1,5 +1,8 @@
 from pathlib import Path
+from shutil import which
+from subprocess import run
 
+import pytest
 from acacore.siegfried import Siegfried
 
 from convertool.converters.base import dummy_base_file
@@ -30,6 +33,42 @@ def test_img_to_img(test_files: dict[str, Path], output_dir: Path, siegfried: Si
         assert siegfried.identify(output_files[0]).files[0].best_match().mime == MIMETYPES[output]
 
 
+# noinspection DuplicatedCode
+@pytest.mark.skipif(not which("vips"), reason="vips is not installed")
+def test_img_to_img_vips(test_files: dict[str, Path], output_dir: Path, siegfried: Siegfried):
+    file = dummy_base_file(test_files["img-to-img.webp"], test_files["img-to-img.webp"].parent)
+    converter = ConverterImage(file, options={"engine": "vips"})
+
+    for output in converter.outputs:
+        print(output)
+        output = converter.output(output)
+        dest_file: Path = output_dir.joinpath("vips", f"img-to-img.{output}")
+        command = converter.vips_command(file.get_absolute_path(), output, dest_file, output_dir)
+        assert (command is not None) == (output in converter.vips_outputs)
+        output_files = converter.convert(output_dir / "vips", output)
+        assert len(output_files) == 1
+        assert siegfried.identify(output_files[0]).files[0].best_match().mime == MIMETYPES[output]
+
+    # Small images are converted with ImageMagick unless vips is requested
+    converter = ConverterImage(file)
+    assert converter.vips_command(file.get_absolute_path(), "png", output_dir / "img-to-img.png", output_dir) is None
+
+
+@pytest.mark.skipif(not which("vips"), reason="vips is not installed")
+def test_img_to_jp2_vips_lossless(test_files: dict[str, Path], output_dir: Path):
+    file = dummy_base_file(test_files["img-to-img.webp"], test_files["img-to-img.webp"].parent)
+    converter = ConverterImage(file, options={"engine": "vips"})
+
+    command = converter.vips_command(file.get_absolute_path(), "jp2", output_dir / "img-to-img.jp2", output_dir)
+    assert command is not None
+    assert command[-1].endswith("[lossless]")
+
+    output_file = converter.convert(output_dir, "jp2")[0]
+    run(["vips", "subtract", file.get_absolute_path(), output_file, output_dir / "diff.v"], check=True)
+    run(["vips", "abs", output_dir / "diff.v", output_dir / "abs.v"], check=True)
+    assert float(run(["vips", "max", output_dir / "abs.v"], capture_output=True, text=True, check=True).stdout) == 0
+
+
 # noinspection DuplicatedCode
 def test_pdf_to_img(test_files: dict[str, Path], output_dir: Path, siegfried: Siegfried):
     file = dummy_base_file(test_files["pdf-to-img.pdf"], test_files["pdf-to-img.pdf"].parent)
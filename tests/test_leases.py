@@ -0,0 +1,72 @@
+from pathlib import Path
+from time import sleep
+
+from acacore.database import FilesDB
+
+from convertool.journal import RunJournal
+from convertool.leases import RowLeases
+from convertool.util import AVID
+
+
+def test_row_leases(avid_dir_copy: Path):
+    avid = AVID(avid_dir_copy)
+    leases_path = avid.metadata_dir.joinpath("convertool-leases.db")
+
+    with FilesDB(avid.database_path) as db:
+        # noinspection SqlWithoutWhere
+        db.execute(f"update {db.original_files.name} set processed = false")
+        db.commit()
+        file, processed_file = db.original_files.select(limit=2).fetchall()
+        processed_file.processed = True
+        db.original_files.update(processed_file)
+        db.commit()
+
+        is_processed = lambda f: f.processed  # noqa: E731
+
+        with (
+            RowLeases(leases_path, "original:master", 60) as leases_a,
+            RowLeases(leases_path, "original:master", 60) as leases_b,
+            RowLeases(leases_path, "master:access", 60) as leases_c,
+        ):
+            assert leases_a.claim(file, db.original_files, is_processed)
+            assert leases_a.claim(file, db.original_files, is_processed)
+            assert not leases_b.claim(file, db.original_files, is_processed)
+            assert leases_c.claim(file, db.original_files, is_processed)
+            assert not leases_a.claim(processed_file, db.original_files, is_processed)
+            assert leases_b.claim(
+                processed_file.model_copy(update={"processed": False}), db.original_files, lambda _: False
+            )
+
+        with RowLeases(leases_path, "original:master", 0.3) as leases_a:
+            assert leases_a.claim(file, db.original_files, is_processed)
+
+            with RowLeases(leases_path, "original:master", 60) as leases_b:
+                assert not leases_b.claim(file, db.original_files, is_processed)
+                # Stop renewing the leases of the first run to simulate a crash
+                leases_a._stop.set()
+                leases_a._heartbeat.join()
+                sleep(0.5)
+                assert leases_b.claim(file, db.original_files, is_processed)
+
+
+def test_row_leases_journals(tmp_path: Path):
+    leases_path = tmp_path.joinpath("convertool-leases.db")
+
+    with RowLeases(leases_path, "original:master", 60) as leases_a:
+        leases_b = RowLeases(leases_path, "original:master", 60)
+        with leases_b:
+            assert leases_b.active_owners() == {leases_a.owner, leases_b.owner}
+        assert leases_a.active_owners() == {leases_a.owner}
+
+        journal_a = RunJournal.for_run(tmp_path, "original:master", leases_a.owner)
+        journal_b = RunJournal.for_run(tmp_path, "original:master", leases_b.owner)
+        journal_single = RunJournal.for_run(tmp_path, "original:master")
+        journal_other = RunJournal.for_run(tmp_path, "master:access", leases_b.owner)
+        for journal in (journal_a, journal_b, journal_single, journal_other):
+            journal.path.touch()
+
+        assert len({j.path for j in (journal_a, journal_b, journal_single, journal_other)}) == 4
+        assert {j.path for j in RunJournal.orphans(tmp_path, "original:master", leases_a.active_owners)} == {
+            journal_b.path,
+            journal_single.path,
+        }
@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from convertool import converters
+from convertool.converters import ConverterABC
+from convertool.converters.base import dummy_base_file
+from convertool.util import TempDir
+
+PARALLEL_CONVERSIONS: list[tuple[type[ConverterABC], str, str]] = [
+    (converters.ConverterAudio, "audio.m4a", "mp3"),
+    (converters.ConverterCopy, "random", "copy"),
+    (converters.ConverterDocument, "document.docx", "pdf"),
+    (converters.ConverterDocumentToImage, "document.docx", "png"),
+    (converters.ConverterGIS, "gis.tab", "gml"),
+    (converters.ConverterHTML, "html.html", "pdf"),
+    (converters.ConverterHTMLToImage, "html.html", "jpg"),
+    (converters.ConverterImage, "img-to-img.webp", "tif"),
+    (converters.ConverterMSG, "message.msg", "html"),
+    (converters.ConverterMSGToPDF, "message.msg", "pdf"),
+    (converters.ConverterMSGToImage, "message.msg", "png"),
+    (converters.ConverterMedCom, "medcom.xml", "html"),
+    (converters.ConverterMedComToPDF, "medcom.xml", "pdf"),
+    (converters.ConverterMedComToImage, "medcom.xml", "jpg"),
+    (converters.ConverterPDF, "pdf-to-img.pdf", "pdfa-2"),
+    (converters.ConverterPDFToImage, "pdf-to-img.pdf", "jpg"),
+    (converters.ConverterPDFLargeToImage, "pdf-to-img.pdf", "tif"),
+    (converters.ConverterPresentation, "presentation.pptx", "pdf"),
+    (converters.ConverterSAS, "sas.sas7bdat", "csv"),
+    (converters.ConverterSpreadsheet, "spreadsheet.xlsx", "pdf"),
+    (converters.ConverterTNEF, "winmail.dat", "html"),
+    (converters.ConverterTextToImage, "text_to_img.txt", "png"),
+    (converters.ConverterVideo, "video.webm", "h264"),
+    (converters.ConverterXSL, "medcom.xml", "html"),
+    (converters.ConverterXSLToPDF, "medcom.xml", "pdf"),
+    (converters.ConverterXSLToImage, "medcom.xml", "jpg"),
+]
+
+
+@pytest.mark.parametrize(("converter_cls", "filename", "output"), PARALLEL_CONVERSIONS)
+def test_parallel(
+    test_files: dict[str, Path],
+    output_dir: Path,
+    converter_cls: type[ConverterABC],
+    filename: str,
+    output: str,
+):
+    assert converter_cls.multithreading
+
+    file = dummy_base_file(test_files[filename], test_files[filename].parent)
+    output_dirs: list[Path] = [output_dir.joinpath("1"), output_dir.joinpath("2")]
+
+    with ThreadPoolExecutor(len(output_dirs)) as executor:
+        results = list(executor.map(lambda d: converter_cls(file).convert(d, output), output_dirs))
+
+    for dest_dir, output_files in zip(output_dirs, results, strict=True):
+        assert len(output_files) >= 1
+        assert all(f.is_file() and f.is_relative_to(dest_dir) for f in output_files)
+
+    assert [f.name for f in results[0]] == [f.name for f in results[1]]
+    assert not [f for d in output_dirs for f in d.rglob(f"{TempDir.prefix}*")]
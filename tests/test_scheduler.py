@@ -0,0 +1,124 @@
+from collections import Counter
+from pathlib import Path
+from time import sleep
+from time import time
+from typing import ClassVar
+
+import pytest
+import structlog
+
+from convertool.convert import ConvertInstructions
+from convertool.converters import ConverterABC
+from convertool.converters import ConverterDocument
+from convertool.converters import ConverterTextToImage
+from convertool.converters.base import dummy_base_file
+from convertool.scheduler import batch_instructions
+from convertool.scheduler import convert_instructions
+from convertool.scheduler import ConvertPool
+
+
+class ConverterSleepA(ConverterABC):
+    tool_names: ClassVar[list[str]] = ["a"]
+    outputs: ClassVar[list[str]] = ["out"]
+    dependencies: ClassVar[dict[str, list[str]]] = {"a": ["sleep"]}
+    multithreading: ClassVar[bool] = True
+
+    def convert(self, output_dir: Path, output: str, *, keep_relative_path: bool = True) -> list[Path]:  # noqa: ARG002
+        start: float = time()
+        sleep(0.2)
+        output_dir.joinpath("intervals").mkdir(parents=True, exist_ok=True)
+        output_dir.joinpath("intervals", self.file.name).write_text(f"{self.tool_names[0]} {start} {time()}")
+        return []
+
+
+class ConverterSleepB(ConverterSleepA):
+    tool_names: ClassVar[list[str]] = ["b"]
+    dependencies: ClassVar[dict[str, list[str]]] = {"b": ["sleep"]}
+
+
+def instructions(name: str, converter_cls: type, tool: str, output: str) -> ConvertInstructions:
+    return ConvertInstructions(dummy_base_file(name), "original", "master", converter_cls, tool, output, None, None)
+
+
+def test_batch_instructions():
+    d1 = instructions("d1.docx", ConverterDocument, "document", "pdf")
+    d2 = instructions("d2.docx", ConverterDocument, "document", "pdf")
+    d3 = instructions("d3.docx", ConverterDocument, "document", "pdf")
+    d4 = instructions("d4.docx", ConverterDocument, "document", "pdf")
+    odt = instructions("d5.docx", ConverterDocument, "document", "odt")
+    html1 = instructions("d6.docx", ConverterDocument, "document", "html")
+    html2 = instructions("d7.docx", ConverterDocument, "document", "html")
+    text = instructions("t.txt", ConverterTextToImage, "text", "png")
+
+    assert list(batch_instructions([d1, odt, html1, d2, text, d3, html2, d4], 3)) == [
+        html1,
+        text,
+        [d1, d2, d3],
+        html2,
+        odt,
+        d4,
+    ]
+    assert list(batch_instructions([d1, d2, text], 0)) == [d1, d2, text]
+
+
+def test_batch_instructions_timeouts():
+    d1 = instructions("d1.docx", ConverterDocument, "document", "pdf")._replace(timeout=30.0)
+    d2 = instructions("d2.docx", ConverterDocument, "document", "pdf")._replace(timeout=45.5)
+    d3 = instructions("d3.docx", ConverterDocument, "document", "pdf")
+
+    assert list(batch_instructions([d1, d2, d3], 3)) == [[d1, d2, d3]]
+
+
+def test_convert_pool_quotas(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    quotas: dict[str, int] = {"a": 1, "b": 2}
+    usage: list[Counter[str]] = []
+    submit = ConvertPool.submit
+
+    def record_submit(pool: ConvertPool, job: ConvertInstructions):
+        submit(pool, job)
+        usage.append(pool.usage.copy())
+
+    monkeypatch.setattr(ConvertPool, "submit", record_submit)
+
+    jobs: list[ConvertInstructions] = []
+    for n in range(12):
+        converter_cls = ConverterSleepA if n % 2 else ConverterSleepB
+        tmp_path.joinpath(f"{n}.txt").write_text(str(n))
+        file = dummy_base_file(tmp_path / f"{n}.txt", tmp_path)
+        jobs.append(
+            ConvertInstructions(
+                file, "original", "master", converter_cls, converter_cls.tool_names[0], "out", None, None
+            )
+        )
+
+    results = list(
+        convert_instructions(
+            "convertool.test",
+            None,
+            tmp_path / "out",
+            tmp_path,
+            tmp_path,
+            jobs,
+            4,
+            False,
+            True,
+            None,
+            structlog.stdlib.get_logger(),
+            quotas,
+        )
+    )
+
+    assert len(results) == len(jobs)
+    assert all(r.error is None for r in results)
+    assert len(usage) == len(jobs)
+
+    for dep, quota in quotas.items():
+        assert max(u[dep] for u in usage) == quota
+
+        # Count the conversions that were actually running at the same time in the worker processes
+        intervals: list[tuple[float, float]] = [
+            (float(start), float(end))
+            for tool, start, end in (f.read_text().split() for f in tmp_path.joinpath("out", "intervals").iterdir())
+            if tool == dep
+        ]
+        assert max(sum(s <= start < e for s, e in intervals) for start, _ in intervals) <= quota
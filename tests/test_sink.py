@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import pytest
+from acacore.database import FilesDB
+from acacore.models.event import Event
+
+from convertool.sink import ResultSink
+from convertool.util import AVID
+
+
+def test_result_sink(avid_dir_copy: Path):
+    avid = AVID(avid_dir_copy)
+
+    with FilesDB(avid.database_path) as db:
+        db.log.delete("operation like 'convertool.test%'")
+        db.commit()
+        files = db.original_files.select(limit=10).fetchall()
+        original_files, log = db.original_files, db.log
+
+    assert files
+
+    with ResultSink(avid.database_path, batch_size=3) as sink:
+        for file in files:
+            file.processed = not file.processed
+            sink.update(original_files, file)
+            sink.insert(log, Event.from_command("convertool.test", "sink", file))
+
+    with FilesDB(avid.database_path) as db:
+        for file in files:
+            assert db.original_files.select({"uuid": str(file.uuid)}).fetchone().processed == file.processed
+        assert len(db.log.select("operation = 'convertool.test:sink'").fetchall()) == len(files)
+
+    with pytest.raises(KeyboardInterrupt), ResultSink(avid.database_path) as sink:
+        sink.insert(log, Event.from_command("convertool.test", "committed", files[0]))
+        sink.commit()
+        sink.insert(log, Event.from_command("convertool.test", "uncommitted", files[0]))
+        raise KeyboardInterrupt
+
+    with FilesDB(avid.database_path) as db:
+        assert db.log.select("operation = 'convertool.test:committed'").fetchone() is not None
+        assert db.log.select("operation = 'convertool.test:uncommitted'").fetchone() is None
@@ -1,10 +1,16 @@
+from asyncio import run
+from os import urandom
+from os import utime
 from pathlib import Path
 from subprocess import CalledProcessError
 from subprocess import TimeoutExpired
 
 import pytest
 
+from convertool.util import fast_copy
+from convertool.util import ProcessStalled
 from convertool.util import run_process
+from convertool.util import run_process_async
 from convertool.util import TempDir
 
 
@@ -29,8 +35,64 @@ def test_run_process(output_dir: Path):
         run_process("sleep", 1, timeout=0.1)
 
 
+def test_run_process_async(output_dir: Path):
+    out, err = run(run_process_async("echo", "hello"))
+    assert out == "hello\n"
+    assert err == ""
+
+    out, err = run(run_process_async("pwd", cwd=output_dir))
+    assert out == f"{output_dir}\n"
+    assert err == ""
+
+    with pytest.raises(CalledProcessError) as exception:
+        run(run_process_async("stat", output_dir / "__nonexisting_file"))
+    assert exception.value.stderr.startswith("stat: ")
+
+    with pytest.raises(CalledProcessError) as exception:
+        run(run_process_async("__nonexisting_command", env=False))
+    assert exception.value.stderr.lower() == "command not found __nonexisting_command"
+
+    with pytest.raises(TimeoutExpired):
+        run(run_process_async("sleep", 1, timeout=0.1))
+
+
+def test_run_process_stalled(output_dir: Path):
+    with pytest.raises(ProcessStalled):
+        run_process("sleep", 10, stall_timeout=0.5)
+
+    with pytest.raises(ProcessStalled):
+        run(run_process_async("sleep", 10, stall_timeout=0.5))
+
+    # Growing output counts as progress
+    out, _ = run_process(
+        "sh", "-c", "for i in 1 2 3; do sleep 0.3; echo >> out; done; echo done", cwd=output_dir, stall_timeout=0.5
+    )
+    assert out == "done\n"
+
+    # Busy processes are only stopped by the timeout
+    with pytest.raises(TimeoutExpired) as exception:
+        run_process("sh", "-c", "while :; do :; done", timeout=1, stall_timeout=0.5)
+    assert not isinstance(exception.value, ProcessStalled)
+
+
 def test_temporary_directory(output_dir: Path):
     with TempDir(output_dir) as temp_dir:
         assert temp_dir.is_dir()
         assert temp_dir.name.startswith(TempDir.prefix)
     assert not temp_dir.is_dir()
+
+
+def test_fast_copy(output_dir: Path):
+    src: Path = output_dir.joinpath("fast_copy_src.bin")
+    dst: Path = output_dir.joinpath("fast_copy_dst.bin")
+    src.write_bytes(urandom(10_000_000))
+    utime(src, (0, 1_000_000))
+
+    fast_copy(src, dst)
+    assert dst.read_bytes() == src.read_bytes()
+    assert dst.stat().st_mtime == src.stat().st_mtime
+
+    # The destination is truncated
+    src.write_bytes(b"")
+    fast_copy(src, dst)
+    assert dst.read_bytes() == b""
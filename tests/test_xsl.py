@@ -1,5 +1,7 @@
 from pathlib import Path
+from shutil import which
 
+import pytest
 from acacore.siegfried import Siegfried
 
 from convertool.converters import ConverterMedCom
@@ -9,6 +11,9 @@ from convertool.converters import ConverterXSL
 from convertool.converters import ConverterXSLToImage
 from convertool.converters import ConverterXSLToPDF
 from convertool.converters.base import dummy_base_file
+from convertool.converters.converter_xsl import compiled_stylesheet
+from convertool.converters.converter_xsl import trusted_stylesheet
+from convertool.converters.resources import medcom
 
 from .test_image import MIMETYPES
 
@@ -77,3 +82,26 @@ def test_medcom_to_image(test_files: dict[str, Path], output_dir: Path, siegfrie
         assert len(output_files) >= 1
         assert all(f.is_file() for f in output_files)
         assert all(f.best_match().mime == MIMETYPES[output] for f in siegfried.identify(*output_files).files)
+
+
+def test_compiled_stylesheet():
+    xsl: Path = medcom.joinpath("viewEmessage.xslt")
+    assert compiled_stylesheet(xsl) is compiled_stylesheet(xsl)
+    assert compiled_stylesheet(None) is compiled_stylesheet(None)
+
+
+def test_trusted_stylesheet(tmp_path: Path):
+    assert trusted_stylesheet(None)
+    assert trusted_stylesheet(medcom.joinpath("viewEmessage.xslt"))
+    assert not trusted_stylesheet(tmp_path / "linked.xsl")
+    assert not trusted_stylesheet(medcom.joinpath("..", "..", "..", "..", "linked.xsl"))
+
+
+@pytest.mark.skipif(not which("xmlstarlet"), reason="xmlstarlet is not installed")
+def test_xsl_engines(test_files: dict[str, Path], output_dir: Path):
+    file = dummy_base_file(test_files["medcom.xml"], test_files["medcom.xml"].parent)
+
+    for cls in (ConverterXSL, ConverterMedCom):
+        lxml_file = cls(file, options={"engine": "lxml"}).convert(output_dir / "lxml", "html")[0]
+        xmlstarlet_file = cls(file, options={"engine": "xmlstarlet"}).convert(output_dir / "xmlstarlet", "html")[0]
+        assert lxml_file.read_bytes() == xmlstarlet_file.read_bytes()